@@ -0,0 +1,42 @@
+"""
+Crawl a generated tree of small files twice: the first run hashes every file, the second only checks the index.
+
+Run from the repository root: python benchmarks/bench_crawler.py
+FILES can be set in the environment.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from polyswarm_api import crawler
+
+FILES = int(os.environ.get('FILES', 100000))
+PER_DIRECTORY = 1000
+
+
+def main():
+    root = tempfile.mkdtemp()
+    index_dir = tempfile.mkdtemp()
+    try:
+        for i in range(FILES):
+            directory = os.path.join(root, str(i // PER_DIRECTORY))
+            if i % PER_DIRECTORY == 0:
+                os.makedirs(directory)
+            with open(os.path.join(directory, str(i)), 'wb') as f:
+                f.write(str(i).encode('utf-8'))
+        with crawler.HashIndex(os.path.join(index_dir, 'index.sqlite3')) as index:
+            print('{:<16} {:>10} {:>10} {:>14}'.format('{} files'.format(FILES), 'seconds', 'files/s', 's/1M files'))
+            for run in ['first run', 'unchanged']:
+                start = time.time()
+                count = sum(1 for _ in crawler.crawl(root, index))
+                seconds = time.time() - start
+                assert count == FILES
+                print('{:<16} {:>10.2f} {:>10.0f} {:>14.1f}'.format(run, seconds, count / seconds,
+                                                                    1e6 * seconds / count))
+    finally:
+        shutil.rmtree(root)
+        shutil.rmtree(index_dir)
+
+if __name__ == '__main__':
+    main()
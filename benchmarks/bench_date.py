@@ -0,0 +1,38 @@
+"""
+Compare date.parse_isoformat against dateutil's isoparse, the previous implementation.
+
+Run from the repository root: python benchmarks/bench_date.py
+"""
+import timeit
+
+from dateutil import parser
+
+from polyswarm_api.types import date
+
+DATES = ['2019-12-03T14:53:46.097963', '2020-01-14T17:48:55.854940+00:00', '2019-11-01T21:27:47.109Z']
+NUMBER = 20000
+
+
+def unique_dates():
+    # distinct strings every call, so the cache never hits
+    for i in range(NUMBER):
+        yield '2019-12-03T14:{:02d}:{:02d}.{:06d}'.format(i // 60 % 60, i % 60, i)
+
+
+def main():
+    print('{:<34} {:<26} {:>12}'.format('date', 'parser', 'us/parse'))
+    for date_string in DATES:
+        for name, parse in (('dateutil.parser.isoparse', parser.isoparse),
+                            ('fast path, uncached', date._parse_api_format),
+                            ('parse_isoformat, cached', date.parse_isoformat)):
+            seconds = timeit.timeit(lambda: parse(date_string), number=NUMBER)
+            print('{:<34} {:<26} {:>12.2f}'.format(date_string, name, seconds / NUMBER * 1e6))
+    for name, parse in (('dateutil.parser.isoparse', parser.isoparse),
+                        ('parse_isoformat', date.parse_isoformat)):
+        strings = list(unique_dates())
+        seconds = timeit.timeit(lambda: [parse(s) for s in strings], number=1)
+        print('{:<34} {:<26} {:>12.2f}'.format('distinct strings', name, seconds / NUMBER * 1e6))
+
+
+if __name__ == '__main__':
+    main()
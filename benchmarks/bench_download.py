@@ -0,0 +1,43 @@
+"""
+Download an archive from a local range-serving stand-in for S3 with an increasing number of segments.
+
+Each connection of the stand-in is capped at RATE bytes per second, like a single TCP stream far from the
+bucket, so the throughput shows how much segmenting recovers. RATE=0 measures the uncapped loopback.
+
+Run from the repository root: python benchmarks/bench_download.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from polyswarm_api.api import PolyswarmAPI  # noqa: E402
+
+from test.utils.http_server import StandInServer  # noqa: E402
+
+SIZE = 64 * 1024 * 1024
+RATE = int(os.environ.get('RATE', 16 * 1024 * 1024))
+SEGMENTS = [1, 2, 4, 8, 16]
+
+
+def main():
+    out_dir = tempfile.mkdtemp()
+    try:
+        with StandInServer(SIZE, etag=True, rate=RATE) as server:
+            api = PolyswarmAPI('11111111111111111111111111111111', uri=server.url + '/v2', community='gamma')
+            print('{:>8} {:>10} {:>10}'.format('segments', 'seconds', 'MB/s'))
+            for segments in SEGMENTS:
+                start = time.time()
+                api.download_archive(out_dir, '{}/{}.zip'.format(server.url, segments), segments=segments)
+                seconds = time.time() - start
+                print('{:>8} {:>10.2f} {:>10.1f}'.format(segments, seconds, SIZE / seconds / 1e6))
+                os.remove(os.path.join(out_dir, '{}.zip'.format(segments)))
+    finally:
+        shutil.rmtree(out_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Hash a large sample and a directory of samples, comparing all_hashes to the 8KB sequential reads it used to do.
+
+Run from the repository root: python benchmarks/bench_hashing.py
+SIZE (MB) and FILES can be set in the environment.
+"""
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from polyswarm_api.types import resources
+
+SIZE = int(os.environ.get('SIZE', 512)) * 1024 * 1024
+FILES = int(os.environ.get('FILES', 64))
+
+
+def previous_all_hashes(file_handle, algorithms=(resources._sha256, resources._sha1, resources._md5)):
+    hashers = [alg() for alg in algorithms]
+    for data in iter(lambda: file_handle.read(8192), b''):
+        [h.update(data) for h in hashers]
+    return [resources.Hash(h.hexdigest()) for h in hashers]
+
+
+def write_sample(path, size):
+    with open(path, 'wb') as f:
+        for _ in range(0, size, 64 * 1024 * 1024):
+            f.write(os.urandom(min(64 * 1024 * 1024, size)))
+
+
+def measure(name, size, func):
+    start = time.time()
+    result = func()
+    seconds = time.time() - start
+    print('{:<36} {:>10.2f} {:>10.1f}'.format(name, seconds, size / seconds / 1e6))
+    return result
+
+
+def measure_in_memory(path, name, size):
+    # the content is only held while measured, python 2 cannot del a variable a lambda refers to
+    with open(path, 'rb') as f:
+        content = f.read()
+    return measure(name, size, lambda: resources.all_hashes(io.BytesIO(content)))
+
+
+def hash_path(path, func, **kwargs):
+    with open(path, 'rb') as f:
+        return func(f, **kwargs)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        sample = os.path.join(directory, 'sample')
+        write_sample(sample, SIZE)
+        print('{:<36} {:>10} {:>10}'.format('{}MB sample'.format(SIZE // 1024 // 1024), 'seconds', 'MB/s'))
+        expected = measure('previous 8KB reads', SIZE, lambda: hash_path(sample, previous_all_hashes))
+        assert measure('all_hashes mmap, one thread', SIZE,
+                       lambda: hash_path(sample, resources.all_hashes, parallel=False)) == expected
+        assert measure('all_hashes mmap, parallel', SIZE,
+                       lambda: hash_path(sample, resources.all_hashes)) == expected
+        assert measure_in_memory(sample, 'all_hashes BytesIO, parallel', SIZE) == expected
+
+        size = SIZE // FILES
+        paths = [os.path.join(directory, 'file{}'.format(i)) for i in range(FILES)]
+        for path in paths:
+            write_sample(path, size)
+        print('{:<36} {:>10} {:>10}'.format('{} files of {}KB'.format(FILES, size // 1024), 'seconds', 'MB/s'))
+        measure('previous 8KB reads, one by one', size * FILES,
+                lambda: [hash_path(path, previous_all_hashes) for path in paths])
+        measure('hash_files', size * FILES, lambda: list(resources.hash_files(paths)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
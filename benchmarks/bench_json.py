@@ -0,0 +1,46 @@
+"""
+Decode recorded search and hunt result pages with each json backend installed.
+
+requests.Response.json() is what response bodies went through before the decoder hook: it guesses
+the encoding, decodes the body to str and hands it to the standard library.
+
+Run from the repository root: python benchmarks/bench_json.py
+"""
+import os
+import timeit
+
+import requests
+
+from polyswarm_api import http
+
+RESOURCES = os.path.join(os.path.dirname(__file__), '..', 'test', 'resources')
+PAGES = ['search_hash_page.json', 'hunt_results_page.json', 'metadata_page.json']
+NUMBER = 50
+
+
+def response(content):
+    result = requests.Response()
+    result.status_code = 200
+    result._content = content
+    return result
+
+
+def main():
+    decoders = [('requests Response.json()', lambda content: response(content).json()),
+                ('stdlib from bytes', http._stdlib_loads)]
+    if http.ujson is not None:
+        decoders.append(('ujson', http.ujson.loads))
+    if http.orjson is not None:
+        decoders.append(('orjson', http.orjson.loads))
+    print('{:<24} {:<26} {:>10} {:>10}'.format('page', 'decoder', 'ms/page', 'MB/s'))
+    for name in PAGES:
+        with open(os.path.join(RESOURCES, name), 'rb') as f:
+            content = f.read()
+        for decoder_name, decoder in decoders:
+            seconds = timeit.timeit(lambda: decoder(content), number=NUMBER) / NUMBER
+            print('{:<24} {:<26} {:>10.2f} {:>10.1f}'.format(name, decoder_name, seconds * 1e3,
+                                                              len(content) / seconds / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare poll policies against a mocked slow server.
+
+Every scan closes its assertion window a few seconds after it is created and every lookup takes
+LATENCY seconds. For each policy we report the number of lookups per finished scan and how long
+after the window closed the result was seen.
+
+Run from the repository root: python benchmarks/bench_polling.py
+"""
+import json
+import random
+import re
+import threading
+import time
+
+import responses
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import polling
+
+SCANS = 50
+WINDOW = 3.0
+LATENCY = 0.05
+URI = 'http://localhost:9696/v2'
+
+
+def artifact_instance(scan, window_closed):
+    return {'artifact_id': '1', 'assertions': [], 'community': 'gamma', 'country': '',
+            'created': '2019-12-03T14:53:46.097963', 'extended_type': 'EICAR virus test files', 'failed': False,
+            'filename': 'malicious', 'first_seen': '2019-12-02T23:44:14.864399', 'id': scan,
+            'last_seen': '2019-12-03T14:53:46.097963', 'md5': '44d88612fea8a8f36de82e1278abb02f', 'metadata': [],
+            'mimetype': 'text/plain', 'polyscore': None, 'result': None,
+            'sha1': '3395856ce81f2b7382dee72602f798b642f14140',
+            'sha256': '275a021bbfb6489e54d471899f7db9d1663fc695ec2fe2a2c4538aabf651fd0f',
+            'size': 68, 'type': 'FILE', 'votes': [], 'window_closed': window_closed}
+
+
+def run(policy):
+    # windows close between 0.8 and 1.3 times the expected window
+    closes = {scan: time.time() + WINDOW * random.uniform(0.8, 1.3) for scan in range(SCANS)}
+    lookups = {scan: 0 for scan in closes}
+    lock = threading.Lock()
+
+    def callback(request):
+        time.sleep(LATENCY)
+        scan = int(request.url.rsplit('/', 1)[1])
+        with lock:
+            lookups[scan] += 1
+        body = {'result': artifact_instance(scan, time.time() >= closes[scan]), 'status': 'OK'}
+        return 200, {}, json.dumps(body)
+
+    with responses.RequestsMock() as mock:
+        mock.add_callback(responses.GET, re.compile(URI + r'/consumer/submission/gamma/\d+'), callback=callback)
+        api = PolyswarmAPI('key', uri=URI, community='gamma', poll_policy=policy)
+        latencies = []
+        for scan, _ in api.wait_for_many(closes, workers=SCANS):
+            latencies.append(time.time() - closes[scan])
+    return sum(lookups.values()) / float(SCANS), sum(latencies) / len(latencies), max(latencies)
+
+
+def main():
+    policies = [
+        ('fixed 1s (default)', polling.FixedPollPolicy(1)),
+        ('fixed 0.25s', polling.FixedPollPolicy(0.25)),
+        ('adaptive', polling.AdaptivePollPolicy(window=WINDOW, near_delay=0.25, max_delay=5)),
+    ]
+    print('{:<20} {:>16} {:>22} {:>20}'.format('policy', 'lookups/scan', 'mean latency after', 'max latency after'))
+    for name, policy in policies:
+        lookups, mean_latency, max_latency = run(policy)
+        print('{:<20} {:>16.2f} {:>21.3f}s {:>19.3f}s'.format(name, lookups, mean_latency, max_latency))
+
+
+if __name__ == '__main__':
+    main()
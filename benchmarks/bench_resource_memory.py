@@ -0,0 +1,62 @@
+"""
+Measure the memory retained per parsed resource, with and without the raw json.
+
+Every page is decoded again for each copy, so the measured memory includes the json dicts
+kept alive by the resources, as it would when holding results fetched from the API.
+
+Run from the repository root: python benchmarks/bench_resource_memory.py
+"""
+import json
+import os
+import sys
+import tracemalloc
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api.types import resources
+
+RESOURCES = os.path.join(os.path.dirname(__file__), '..', 'test', 'resources')
+COPIES = 40
+
+
+def shallow_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def retained(parser, text, api):
+    tracemalloc.start()
+    results = [parser.parse_result_list(api, json.loads(text)['result']) for _ in range(COPIES)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = sum(len(page) for page in results)
+    return current / float(count), results[0]
+
+
+def main():
+    with open(os.path.join(RESOURCES, 'hunt_results_page.json')) as f:
+        hunt_page = f.read()
+    with open(os.path.join(RESOURCES, 'search_hash_page.json')) as f:
+        search_page = f.read()
+
+    print('{:<18} {:<16} {:>22}'.format('resource', 'mode', 'retained bytes/result'))
+    for name, parser, text in (('HuntResult', resources.HuntResult, hunt_page),
+                               ('ArtifactInstance', resources.ArtifactInstance, search_page)):
+        for mode, kwargs in (('keep json', {}), ('discard json', {'keep_json': False})):
+            per_result, _ = retained(parser, text, PolyswarmAPI('key', **kwargs))
+            print('{:<18} {:<16} {:>22,.0f}'.format(name, mode, per_result))
+
+    _, hunt_results = retained(resources.HuntResult, hunt_page, PolyswarmAPI('key'))
+    artifact = hunt_results[0].artifact
+    objects = [('HuntResult', hunt_results[0]), ('Assertion', artifact.assertions[0]),
+               ('Engine', resources.Engine({'address': '0x05328f171b8c1463eaFDACCA478D9EE6a1d923F8', 'name': 'eicar'})),
+               ('Vote', resources.Vote(artifact, {'arbiter': '0x0', 'vote': True})),
+               ('TagLink', resources.TagLink({'id': 1, 'sha256': artifact.sha256, 'tags': [], 'families': []}))]
+    print('\n{:<18} {:>22}'.format('object', 'shallow bytes/object'))
+    for name, obj in objects:
+        print('{:<18} {:>22}'.format(name, shallow_size(obj)))
+
+
+if __name__ == '__main__':
+    main()
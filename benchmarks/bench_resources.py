@@ -0,0 +1,54 @@
+"""
+Parse 100k results from recorded pages, eagerly and lazily.
+
+Run from the repository root: python benchmarks/bench_resources.py
+"""
+import json
+import os
+import time
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api.types import resources
+
+RESOURCES = os.path.join(os.path.dirname(__file__), '..', 'test', 'resources')
+RESULTS = 100000
+
+
+def recorded_page(name):
+    with open(os.path.join(RESOURCES, name)) as f:
+        return json.load(f)['result']
+
+
+def run(parser, page, api, read):
+    pages = RESULTS // len(page)
+    start = time.time()
+    for _ in range(pages):
+        for result in parser.parse_result_list(api, page):
+            read(result)
+    return pages * len(page) / (time.time() - start)
+
+
+def main():
+    def sha256_and_polyscore(result):
+        return result.sha256, result.polyscore
+
+    def hunt_sha256_and_polyscore(result):
+        return result.sha256, result.artifact.polyscore
+
+    def everything(result):
+        result.materialize()
+
+    cases = [
+        ('ArtifactInstance', resources.ArtifactInstance, recorded_page('search_hash_page.json'), sha256_and_polyscore),
+        ('HuntResult', resources.HuntResult, recorded_page('hunt_results_page.json'), hunt_sha256_and_polyscore),
+    ]
+    print('{:<18} {:<8} {:<24} {:>14}'.format('resource', 'mode', 'fields read', 'results/s'))
+    for name, parser, page, few_fields in cases:
+        for mode, api in (('eager', PolyswarmAPI('key')), ('lazy', PolyswarmAPI('key', lazy=True))):
+            for read_name, read in (('sha256 and polyscore', few_fields), ('all top-level', everything)):
+                rate = run(parser, page, api, read)
+                print('{:<18} {:<8} {:<24} {:>14,.0f}'.format(name, mode, read_name, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -25,7 +25,11 @@ setup(
         'future~=0.18.2',
         'python-dateutil~=2.8.1',
     ],
-    extras_require={':python_version < "3.0"': ['futures==3.3.0', 'enum34==1.1.6']},
+    extras_require={
+        ':python_version < "3.0"': ['futures==3.3.0', 'enum34==1.1.6'],
+        'async': ['aiohttp~=3.6.2; python_version >= "3.6"'],
+        'json': ['orjson>=3.0; python_version >= "3.6"'],
+    },
     include_package_data=True,
     packages=find_packages('src'),
     package_dir={'': 'src'},
@@ -0,0 +1,851 @@
+"""
+Asyncio interface to the PolySwarm APIs.
+
+Requires python 3.6 or greater and aiohttp, which can be installed with `pip install polyswarm-api[async]`.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from . import api
+from . import cache
+from . import const
+from . import endpoint
+from . import exceptions
+from . import http
+from . import polling
+from .types import base, resources
+
+
+logger = logging.getLogger(__name__)
+
+# errors after which a download is resumed instead of failed
+_INTERRUPTED_DOWNLOAD_ERRORS = (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError,
+                                asyncio.TimeoutError) if aiohttp is not None else ()
+
+
+async def _as_completed(func, items, workers):
+    """
+    Await func over items with at most `workers` calls pending and yield (item, result) tuples as calls finish.
+
+    The asyncio counterpart of utils.as_completed, an exception raised by func is yielded as the result of its item.
+    """
+    items = iter(items)
+    pending = {}
+
+    def schedule(item):
+        pending[asyncio.ensure_future(func(item))] = item
+
+    for item in itertools.islice(items, workers):
+        schedule(item)
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                item = pending.pop(task)
+                for next_item in itertools.islice(items, 1):
+                    schedule(next_item)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    result = e
+                yield item, result
+    finally:
+        # the consumer stopped early
+        for task in pending:
+            task.cancel()
+
+
+def _encode_params(params):
+    """Drop None values and stringify the rest of the query parameters, as requests does."""
+    if not params:
+        return None
+    encoded = []
+    for key, value in (params.items() if isinstance(params, dict) else params):
+        values = value if isinstance(value, (list, tuple)) else [value]
+        encoded.extend((key, str(v)) for v in values if v is not None)
+    return encoded
+
+
+class AsyncPolyswarmHTTP(object):
+    """Executes the requests-compatible dictionaries built by PolyswarmRequestGenerator on aiohttp."""
+    def __init__(self, key, user_agent=const.DEFAULT_USER_AGENT, connections=const.DEFAULT_ASYNC_CONNECTIONS):
+        logger.debug('Creating AsyncPolyswarmHTTP instance')
+        self.headers = {}
+        if key:
+            self.headers['Authorization'] = key
+        if user_agent:
+            self.headers['User-Agent'] = user_agent
+        self.connections = connections
+        self._session = None
+
+    @property
+    def session(self):
+        # aiohttp sessions must be created from within the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.connections))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def request(self, method, url, params=None, data=None, files=None, json=None, headers=None, timeout=None,
+                stream=None):
+        headers_ = dict(self.headers)
+        for name, value in (headers or {}).items():
+            # as in requests, a None value removes the session level header
+            if value is None:
+                headers_.pop(name, None)
+            else:
+                headers_[name] = value
+        if files:
+            form = aiohttp.FormData()
+            for name, value in (data or {}).items():
+                form.add_field(name, str(value))
+            for name, (file_name, handle) in files.items():
+                form.add_field(name, getattr(handle, 'handle', handle), filename=file_name)
+            data = form
+        kwargs = {}
+        if timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+        return self.session.request(method, url, params=_encode_params(params), data=data, json=json,
+                                    headers=headers_, **kwargs)
+
+
+class AsyncPolyswarmRequest(endpoint.PolyswarmRequest):
+    """A PolyswarmRequest executed on the event loop. Responses are parsed exactly as in PolyswarmRequest."""
+    async def execute(self):
+        logger.debug('Executing request.')
+        self.request_parameters.setdefault('timeout', self.timeout)
+        cache_key = self._cache_key()
+        self.raw_result = self.api_instance.response_cache.get(cache_key) if cache_key else None
+        if self.raw_result is None:
+            rate_limiter = self.api_instance.rate_limiter
+            retries = rate_limiter.retries if rate_limiter is not None else 0
+            positions = self._file_positions()
+            for attempt in range(retries + 1):
+                if attempt:
+                    self._rewind_files(positions)
+                if rate_limiter is not None:
+                    await asyncio.sleep(rate_limiter.reserve(self._path()))
+                async with self.session.request(**self.request_parameters) as response:
+                    status = response.status
+                    if rate_limiter is not None and \
+                            rate_limiter.update(self._path(), status, response.headers) and attempt < retries:
+                        logger.debug('Request to %s rate limited, sending it again', self._path())
+                        continue
+                    if not self.json_response and status // 100 == 2 and status != 204 and \
+                            self.result_parser is not None:
+                        # stream the body into the handle instead of buffering it
+                        self.status_code = status
+                        # the headers are checked when resuming a download
+                        self.raw_result = http.BufferedResponse(status, b'', response.headers, str(response.url))
+                        self.result = self.result_parser.parse_result(self.api_instance, (), **self.parser_kwargs)
+                        loop = asyncio.get_event_loop()
+                        async for chunk in response.content.iter_chunked(const.DOWNLOAD_CHUNK_SIZE):
+                            # writing and hashing the chunk would block every other task
+                            await loop.run_in_executor(None, self.result.write, chunk)
+                        return self
+                    self.raw_result = http.BufferedResponse(status, await response.read(), response.headers,
+                                                            str(response.url))
+                    break
+            self._cache_response(cache_key)
+        logger.debug('Request returned code %s', self.raw_result.status_code)
+        if self.result_parser is not None:
+            self.parse_result(self.raw_result)
+        return self
+
+    def __aiter__(self):
+        return self.consume_results()
+
+    async def consume_results(self):
+        request = self
+        while True:
+            try:
+                results = iter(request.result)
+            except TypeError:
+                yield request.result
+                # if the result is not a list, there is not next page
+                return
+            for result in results:
+                yield result
+            # if the server indicates that there are no more results, return
+            if not request.has_more:
+                return
+            request = await request.next_page().execute()
+
+
+class AsyncPolyswarmAPI(object):
+    """
+    An asyncio interface to the public and private PolySwarm APIs.
+
+    It has the methods of PolyswarmAPI, as coroutines or async generators, except for wait_for_many
+    (gather wait_for instead), download_archive, submit_directory and rerun_metadata. Result pages are
+    fetched one after another, without prefetch, concurrent pages or stream_results.
+    """
+
+    def __init__(self, key, uri=None, community=None, validate_schemas=False, timeout=None, poll_policy=None,
+                 lazy=False, keep_json=True, connections=const.DEFAULT_ASYNC_CONNECTIONS, validate_sample=1,
+                 json_decoder=None, engine_cache=None, response_cache=None, rate_limiter=None):
+        """
+        :param key: PolySwarm API key
+        :param uri: PolySwarm API URI
+        :param community: Community to scan against.
+        :param validate_schemas: Validate JSON objects when creating response objects. Will impact performance.
+        :param timeout: Maximum time to wait for an http response on every request.
+        :param poll_policy: PollPolicy used when waiting for scans. Polls every POLL_FREQUENCY seconds by default.
+        :param lazy: Build dates and nested objects of large resources on first access instead of when parsing.
+        :param keep_json: Keep the raw json in parsed resources. If False it is dropped once every field is parsed.
+        :param connections: Maximum number of simultaneous connections.
+        :param validate_sample: Only validate one in every validate_sample objects when validate_schemas is set.
+        :param json_decoder: Callable decoding response bodies from bytes. Defaults to the fastest json library
+            installed (orjson, ujson) or the standard library.
+        :param engine_cache: cache.EngineCache storing the engine list on disk for every process on the host.
+            By default the list is fetched once by each instance.
+        :param response_cache: cache.ResponseCache answering repeated searches, tag link and family lookups
+            without going to the network. Not used by default.
+        :param rate_limiter: ratelimit.RateLimiter pacing the requests of every endpoint family and sending
+            again those answered with 429. By default requests are sent as they come and a 429 raises
+            UsageLimitsExceededException.
+        """
+        if aiohttp is None:
+            raise exceptions.NotImportedException('AsyncPolyswarmAPI requires aiohttp, '
+                                                  'install it with "pip install polyswarm-api[async]"')
+        logger.info('Creating AsyncPolyswarmAPI instance: api_key: %s, api_uri: %s, community: %s',
+                    key, uri, community)
+        self.uri = uri or const.DEFAULT_GLOBAL_API
+        self.community = community or const.DEFAULT_COMMUNITY
+        self.timeout = timeout or const.DEFAULT_HTTP_TIMEOUT
+        self.session = AsyncPolyswarmHTTP(key, connections=connections)
+        self.generator = endpoint.PolyswarmRequestGenerator(self, request_class=AsyncPolyswarmRequest)
+        self.validate = validate_schemas
+        self.validate_sample = validate_sample
+        self.json_decoder = json_decoder or http.default_json_decoder()
+        # responses are read whole before parsing, streaming them is only supported by PolyswarmAPI
+        self.stream_results = False
+        self.poll_policy = poll_policy or polling.FixedPollPolicy()
+        self.lazy = lazy
+        self.keep_json = keep_json
+        self.engine_cache = engine_cache
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+        self._engines = None
+        self._engine_names = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        await self.session.close()
+
+    async def _consume(self, request):
+        request = await request.execute()
+        async for result in request.consume_results():
+            yield result
+
+    async def engines(self):
+        if not self._engines:
+            self._engines = {e.address: e for e in await self._fetch_engines()}
+        return self._engines
+
+    async def _fetch_engines(self):
+        if self.engine_cache is None:
+            return (await self.generator.get_engines().execute()).result
+        entry = self.engine_cache.load(self.uri)
+        if self.engine_cache.fresh(entry):
+            return resources.Engine.parse_result_list(self, entry['engines'])
+        # a single process refreshes the list, the others use their stale copy meanwhile. Waiting for the
+        # lock would block the event loop, so without a copy the list is fetched anyway
+        with self.engine_cache.lock(self.uri, blocking=False) as locked:
+            if locked:
+                # it may have just been refreshed by the process holding the lock before
+                entry = self.engine_cache.load(self.uri) or entry
+            if (locked or entry is None) and not self.engine_cache.fresh(entry):
+                request = self.generator.get_engines(etag=entry and entry['etag'])
+                try:
+                    await request.execute()
+                    etag = request.raw_result.headers.get('ETag')
+                    entry = self.engine_cache.store(self.uri, request.json['result'], etag)
+                except exceptions.NotModifiedException:
+                    entry = self.engine_cache.store(self.uri, entry['engines'], entry['etag'])
+        return resources.Engine.parse_result_list(self, entry['engines'])
+
+    async def resolve_engine_name(self, eth_pub):
+        engine_name = self._engine_names.get(eth_pub)
+        if engine_name is None:
+            engine = (await self.engines()).get(eth_pub.lower())
+            engine_name = base.intern_string((engine.name if engine else eth_pub).lower())
+            self._engine_names[eth_pub] = engine_name
+        return engine_name
+
+    async def wait_for(self, scan, timeout=const.DEFAULT_SCAN_TIMEOUT, deadline=None, poll_policy=None):
+        """
+        Wait for a Scan to scan successfully
+
+        :param scan: Scan id to wait for
+        :param timeout: Maximum time in seconds to wait before raising a TimeoutException
+        :param deadline: Absolute time (as returned by time.time()) after which a TimeoutException is raised
+        :param poll_policy: PollPolicy deciding the delay between lookups, defaults to the instance poll_policy
+        :return: The ArtifactInstance resource waited on
+        """
+        logger.info('Waiting for %s', int(scan))
+        poll_policy = poll_policy or self.poll_policy
+        start = time.time()
+        deadline = api.PolyswarmAPI._deadline(start, timeout, deadline)
+        attempt = 0
+        while True:
+            scan_result = await self.lookup(scan)
+            attempt += 1
+            now = time.time()
+            if scan_result.failed or scan_result.window_closed:
+                return scan_result
+            elif deadline is not None and now > deadline:
+                raise exceptions.TimeoutException('Timed out waiting for scan {} to finish. Please try again.'
+                                                  .format(scan))
+            else:
+                delay = poll_policy.delay(attempt, now - start)
+                await asyncio.sleep(min(delay, deadline - now) if deadline is not None else delay)
+
+    def search(self, hash_, hash_type=None):
+        """
+        Search for the latest scans matching the given hash and hash_type.
+
+        :param hash_: A Hashable object (Artifact, local.LocalArtifact, Hash) or hex-encoded SHA256/SHA1/MD5
+        :param hash_type: Hash type of the provided hash_. Will attempt to auto-detect if not explicitly provided.
+        :return: Async generator of ArtifactInstance resources
+        """
+        logger.info('Searching for hash %s', hash_)
+        hash_ = resources.Hash.from_hashable(hash_, hash_type=hash_type)
+        return self._consume(self.generator.search_hash(hash_.hash, hash_.hash_type))
+
+    async def search_hashes(self, hashes, hash_type=None, workers=const.DEFAULT_WORKER_COUNT):
+        """
+        Search for the latest scans matching each of the given hashes concurrently.
+
+        Hashes are normalized with Hash.from_hashable and duplicates are only searched once.
+
+        :param hashes: An iterable of Hashable objects (Artifact, local.LocalArtifact, Hash) or hex-encoded hashes
+        :param hash_type: Hash type of the provided hashes. Will attempt to auto-detect if not explicitly provided.
+        :param workers: Maximum number of searches in flight at the same time
+        :return: Async generator of (Hash, result) tuples in completion order, where result is either the list of
+            ArtifactInstance resources found or the exception raised by the search (NotFoundException if unknown).
+            Malformed hashes are yielded as they are given, with the InvalidValueException raised parsing them.
+        """
+        logger.info('Searching for hashes with %s workers', workers)
+        invalid = deque()
+
+        async def search(hash_):
+            return [result async for result in self.search(hash_)]
+
+        async for result in _as_completed(search, api._unique_hashes(self, hashes, hash_type, invalid), workers):
+            while invalid:
+                yield invalid.popleft()
+            yield result
+        while invalid:
+            yield invalid.popleft()
+
+    def search_url(self, url):
+        """
+        Search for the latest scan matching the given url.
+
+        :param url: A url to be searched by exact match
+        :return: Async generator of ArtifactInstance resources
+        """
+        logger.info('Searching for url %s', url)
+        return self._consume(self.generator.search_url(url))
+
+    def search_scans(self, hash_):
+        """
+        Search for all scans ever made matching the given sha256.
+
+        :param hash_: A Hashable object (Artifact, local.LocalArtifact, Hash) or hex-encoded SHA256
+        :return: Async generator of ArtifactInstance resources
+        """
+        logger.info('Searching for scans %s', hash_)
+        hash_ = resources.Hash.from_hashable(hash_, hash_type='sha256')
+        return self._consume(self.generator.list_scans(hash_.hash))
+
+    def search_by_metadata(self, query):
+        """
+        Search artifacts by metadata
+
+        :param query: A query string
+        :return: Async generator of ArtifactInstance resources
+        """
+        logger.info('Searching for metadata %s', query)
+        return self._consume(self.generator.search_metadata(query))
+
+    async def submit(self, artifact, artifact_type=resources.ArtifactType.FILE, dedup=False):
+        """
+        Submit artifacts to polyswarm and return UUIDs
+
+        :param artifact: A file-like, path to file, url or LocalArtifact instance
+        :param artifact_type: The ArtifactType or strings containing "file" or "url"
+        :param dedup: Hash the file locally first, and rescan it instead of uploading it if PolySwarm already has it
+        :return: An ArtifactInstance resource
+        """
+        logger.info('Submitting artifact of type %s', artifact_type)
+        artifact, opened = api._parse_artifact(self, artifact, artifact_type)
+        try:
+            if dedup and await self._known(artifact):
+                return await self.rescan(artifact.sha256)
+            request = self.generator.submit(artifact, artifact.artifact_name, artifact.artifact_type.name)
+            return (await request.execute()).result
+        finally:
+            # only close the handles we opened ourselves
+            if opened:
+                artifact.handle.close()
+
+    async def submit_many(self, artifacts, artifact_type=resources.ArtifactType.FILE,
+                          workers=const.DEFAULT_WORKER_COUNT, dedup=False):
+        """
+        Submit many artifacts concurrently.
+
+        Files given as paths are only opened when their upload starts, so at most `workers`
+        handles are open at the same time. A failed submission does not abort the batch.
+
+        :param artifacts: An iterable of file-likes, paths to files, urls or LocalArtifact instances
+        :param artifact_type: The ArtifactType or strings containing "file" or "url"
+        :param workers: Maximum number of submissions in flight at the same time
+        :param dedup: Rescan instead of uploading the files PolySwarm already has
+        :return: Async generator of (artifact, result) tuples in completion order, where result is either
+            the ArtifactInstance resource or the exception raised while submitting that artifact
+        """
+        logger.info('Submitting artifacts of type %s with %s workers', artifact_type, workers)
+        artifact_type = resources.ArtifactType.parse(artifact_type)
+        async for result in _as_completed(lambda artifact: self.submit(artifact, artifact_type, dedup=dedup),
+                                          artifacts, workers):
+            yield result
+
+    async def _known(self, artifact):
+        """Hash the LocalArtifact and tell whether PolySwarm already has a file with its sha256."""
+        if artifact.artifact_type != resources.ArtifactType.FILE:
+            return False
+        # hashing reads the whole file, which would block the event loop
+        await asyncio.get_event_loop().run_in_executor(None, artifact.analyze_artifact)
+        results = self.search(artifact.sha256)
+        try:
+            async for _ in results:
+                return True
+        except (exceptions.NotFoundException, exceptions.NoResultsException):
+            pass
+        finally:
+            await results.aclose()
+        return False
+
+    async def lookup(self, scan):
+        """
+        Lookup a scan by Scan id.
+
+        :param scan: The Scan UUID to lookup
+        :return: An ArtifactInstance resource
+        """
+        logger.info('Lookup scan %s', int(scan))
+        return (await self.generator.lookup_uuid(scan).execute()).result
+
+    async def rescan(self, hash_, hash_type=None):
+        """
+        Rescan a file based on and existing hash in the Polyswarm platform
+
+        :param hash_: Hashable object (Artifact, local.LocalArtifact, or Hash) or hex-encoded SHA256/SHA1/MD5
+        :param hash_type: Hash type of the provided hash_. Will attempt to auto-detect if not explicitly provided.
+        :return: A ArtifactInstance resources
+        """
+        logger.info('Rescan hash %s', hash_)
+        hash_ = resources.Hash.from_hashable(hash_, hash_type=hash_type)
+        return (await self.generator.rescan(hash_.hash, hash_.hash_type).execute()).result
+
+    async def rescan_id(self, scan):
+        """
+        Re-execute a new scan based on an existing scan.
+
+        :param scan: Id of the existing scan
+        :return: A ArtifactInstance resource
+        """
+        logger.info('Rescan id %s', int(scan))
+        return (await self.generator.rescanid(scan).execute()).result
+
+    async def live_create(self, rule, active=True, ruleset_name=None):
+        """
+        Create a new live hunt_id, and replace the currently running YARA rules.
+
+        :param rule: YaraRuleset object or string containing YARA rules to install
+        :param active: Set the live hunt to active upon creation if True.
+        :param ruleset_name: Name of the ruleset.
+        :return: The created Hunt resource
+        """
+        logger.info('Create live hunt %s', rule)
+        rule, rule_id = api.PolyswarmAPI._parse_rule(self, rule)
+        request = self.generator.create_live_hunt(rule=rule.yara if rule else None, rule_id=rule_id,
+                                                  active=active, ruleset_name=ruleset_name)
+        return (await request.execute()).result
+
+    async def live_get(self, hunt=None):
+        """
+        Delete a live hunt.
+
+        :param hunt: Hunt ID
+        :return: The Hunt resource
+        """
+        logger.info('Get live hunt %s', hunt)
+        return (await self.generator.get_live_hunt(hunt).execute()).result
+
+    async def live_update(self, active, hunt=None):
+        """
+        Update a live hunt.
+
+        :param hunt: Hunt ID
+        :param active: True to start the live hunt and False to stop it
+        :return: The updated Hunt resource
+        """
+        logger.info('Update live hunt %s', hunt)
+        return (await self.generator.update_live_hunt(hunt, active=active).execute()).result
+
+    async def live_delete(self, hunt=None):
+        """
+        Delete a live hunt.
+
+        :param hunt: Hunt ID
+        :return: The deleted Hunt resource
+        """
+        logger.info('Delete live hunt %s', hunt)
+        return (await self.generator.delete_live_hunt(hunt).execute()).result
+
+    def live_list(self, since=None, all_=None):
+        """
+        List all the live hunts
+
+        :return: Async generator of Hunt resources
+        """
+        logger.info('List live hunts since: %s all: %s', since, all_)
+        return self._consume(self.generator.live_list(since=since, all_=all_))
+
+    def live_results(self, hunt=None, since=None, tag=None, rule_name=None):
+        """
+        Get results from a live hunt
+
+        :param hunt: ID of the hunt (None if results for tha latest active hunt are desired)
+        :param since: Fetch results from the last "since" minutes
+        :param tag: Filter hunt results containing the provided tags (comma separated tags, exact match).
+        :param rule_name: Filter hunt results on the provided rule name (exact match).
+        :return: Async generator of HuntResult resources
+        """
+        logger.info('List live hunt results %s', hunt)
+        return self._consume(self.generator.live_hunt_results(hunt_id=hunt, since=since, tag=tag,
+                                                              rule_name=rule_name))
+
+    async def historical_create(self, rule=None, ruleset_name=None):
+        """
+        Run a new historical hunt.
+
+        :param rule: YaraRuleset object or string containing YARA rules to install
+        :param ruleset_name: Name of the ruleset.
+        :return: The created Hunt resource
+        """
+        logger.info('Create historical hunt %s', rule)
+        rule, rule_id = api.PolyswarmAPI._parse_rule(self, rule)
+        request = self.generator.create_historical_hunt(rule=rule.yara if rule else None, rule_id=rule_id,
+                                                        ruleset_name=ruleset_name)
+        return (await request.execute()).result
+
+    async def historical_get(self, hunt=None):
+        """
+        Delete a live hunt.
+
+        :param hunt: Hunt ID
+        :return: The Hunt resource
+        """
+        logger.info('Get historical hunt %s', hunt)
+        return (await self.generator.get_historical_hunt(hunt).execute()).result
+
+    async def historical_delete(self, hunt):
+        """
+        Delete a historical hunts.
+
+        :param hunt: Hunt ID
+        :return: The deleted Hunt resource
+        """
+        logger.info('Delete historical hunt %s', hunt)
+        return (await self.generator.delete_historical_hunt(hunt).execute()).result
+
+    def historical_list(self, since=None):
+        """
+        List all historical hunts
+
+        :return: Async generator of Hunt resources
+        """
+        logger.info('List historical hunts since: %s', since)
+        return self._consume(self.generator.historical_list(since=since))
+
+    def historical_results(self, hunt=None, tag=None, rule_name=None):
+        """
+        Get results from a historical hunt
+
+        :param hunt: ID of the hunt (None if latest hunt results are desired)
+        :param tag: Filter hunt results containing the provided tags (comma separated tags, exact match).
+        :param rule_name: Filter hunt results on the provided rule name (exact match).
+        :return: Async generator of HuntResult resources
+        """
+        logger.info('List historical results for hunt: %s', hunt)
+        return self._consume(self.generator.historical_hunt_results(hunt_id=hunt, tag=tag, rule_name=rule_name))
+
+    async def ruleset_create(self, name, rules, description=None):
+        """
+        Create a Yara Ruleset from the provided rules with the given name in the polyswarm platform.
+        :param name: Name of the ruleset
+        :param rules: Yara rules as a string
+        :param description: Description of the ruleset
+        :return: A YaraRuleset resource
+        """
+        logger.info('Create ruleset %s: %s', name, rules)
+        rules = resources.YaraRuleset(dict(name=name, description=description, yara=rules), polyswarm=self)
+        try:
+            rules.validate()
+        except exceptions.NotImportedException as e:
+            logger.debug('%s\nSkipping validation.', str(e))
+        request = self.generator.create_ruleset(rules.yara, rules.name, description=rules.description)
+        return (await request.execute()).result
+
+    async def ruleset_get(self, ruleset_id=None):
+        """
+        Retrieve a YaraRuleset from the polyswarm platform by its Id.
+        :param ruleset_id: Id of the ruleset
+        :return: A YaraRuleset resource
+        """
+        logger.info('Get ruleset %s', ruleset_id)
+        return (await self.generator.get_ruleset(ruleset_id).execute()).result
+
+    async def ruleset_update(self, ruleset_id, name=None, rules=None, description=None):
+        """
+        Update an existing YaraRuleset in the polyswarm platform by its Id.
+        :param ruleset_id: Id of the ruleset
+        :param name: New name of the ruleset
+        :param rules: New yara rules as a string
+        :param description: New description of the ruleset
+        :return: The updated YaraRuleset resource
+        """
+        logger.info('Update ruleset %s', ruleset_id)
+        request = self.generator.update_ruleset(ruleset_id, name=name, rules=rules, description=description)
+        return (await request.execute()).result
+
+    async def ruleset_delete(self, ruleset_id):
+        """
+        Delete a YaraRuleset from the polyswarm platform by its Id.
+        :param ruleset_id: Id of the ruleset
+        :return: A YaraRuleset resource
+        """
+        logger.info('Delete ruleset %s', ruleset_id)
+        return (await self.generator.delete_ruleset(ruleset_id).execute()).result
+
+    def ruleset_list(self):
+        """
+        List all YaraRulesets for the current account.
+        :return: Async generator of YaraRuleset resources
+        """
+        logger.info('List rulesets')
+        return self._consume(self.generator.list_ruleset())
+
+    async def tag_link_get(self, sha256):
+        """
+        Fetch the Tags and Families associated with the given sha256.
+
+        :param sha256: The sha256 of the artifact.
+        :return: A TagLink resource
+        """
+        logger.info('Get tag link %s', sha256)
+        return (await self.generator.get_tag_link(sha256).execute()).result
+
+    async def tag_link_update(self, sha256, tags=None, families=None, remove=False):
+        """
+        Update a TagLink with the given type or value by its id.
+        :param sha256: The sha256 of the artifact.
+        :param tags: A list of tags to be added or removed.
+        :param families: A list of families to be added or removed.
+        :param remove: A flag indicating if we should remove the provided tags/families.
+        :return: A TagLink resource
+        """
+        logger.info('Update tag link %s', sha256)
+        request = self.generator.update_tag_link(sha256, tags=tags, families=families, remove=remove)
+        return (await request.execute()).result
+
+    def tag_link_list(self, tags=None, families=None, or_tags=None, or_families=None):
+        """
+        Fetch all existing TagLinks for the provided tags.
+        :param tags: A list of tags that must be associated with the TagLinks listed.
+        :param families: A list of families that must be associated with the TagLinks listed.
+        :param or_tags: A list of tags where the TagLinks must be associated with at least one.
+        :param or_families: A list of families where the TagLinks must be associated with at least one.
+        :return: Async generator of TagLink resources
+        """
+        logger.info('List tag links')
+        return self._consume(self.generator.list_tag_link(tags=tags, families=families,
+                                                          or_tags=or_tags, or_families=or_families))
+
+    async def tag_create(self, name):
+        """
+        Create a Tag.
+        :param name: The tag we want to create.
+        :return: A Tag resource
+        """
+        logger.info('Create tag %s', name)
+        return (await self.generator.create_tag(name).execute()).result
+
+    async def tag_get(self, name):
+        """
+        Fetch a Tag.
+        :param name: The tag we want to fetch.
+        :return: A Tag resource
+        """
+        logger.info('Get tag %s', name)
+        return (await self.generator.get_tag(name).execute()).result
+
+    async def tag_delete(self, name):
+        """
+        Delete a Tag.
+        :param name: The tag we want to delete.
+        :return: A Tag resource
+        """
+        logger.info('Delete tag %s', name)
+        return (await self.generator.delete_tag(name).execute()).result
+
+    def tag_list(self):
+        """
+        Fetch all existing Tags.
+        :return: Async generator of Tag resources
+        """
+        logger.info('List tags')
+        return self._consume(self.generator.list_tag())
+
+    async def family_create(self, name):
+        """
+        Create a Family.
+        :param name: The family name.
+        :return: A MalwareFamily resource
+        """
+        logger.info('Creating family %s', name)
+        return (await self.generator.create_family(name).execute()).result
+
+    async def family_get(self, name):
+        """
+        Fetch a Family.
+        :param name: The family name.
+        :return: A MalwareFamily resource
+        """
+        logger.info('Getting family %s', name)
+        return (await self.generator.get_family(name).execute()).result
+
+    async def family_delete(self, name):
+        """
+        Delete a Family.
+        :param name: The family name.
+        :return: A MalwareFamily resource
+        """
+        logger.info('Deleting family %s', name)
+        return (await self.generator.delete_family(name).execute()).result
+
+    async def family_update(self, family_name, emerging=True):
+        """
+        Update the Family emerging status.
+        :param family_name: The family name.
+        :param emerging: A flag indicating if the family should be marked as emerging at this point in time.
+        :return: A MalwareFamily resource
+        """
+        logger.info('Updating family %s', family_name)
+        return (await self.generator.update_family(family_name, emerging=emerging).execute()).result
+
+    def family_list(self):
+        """
+        Fetch all existing Families
+        :return: Async generator of MalwareFamily resources
+        """
+        logger.info('Listing families')
+        return self._consume(self.generator.list_family())
+
+    async def download(self, out_dir, hash_, hash_type=None):
+        """
+        Grab the data of artifact identified by hash, and write the data to a file in the provided directory
+        under a file named after the hash_.
+        Nothing is downloaded if the directory already holds a copy matching the hash. The file only appears
+        once its content was verified against the hash, and the returned artifact is analyzed as it is written
+        or verified, without reading the file again. Interrupted downloads are resumed as in PolyswarmAPI,
+        and the file is read and written on the default executor instead of the event loop.
+        :param out_dir: Destination directory to download the file, or a cache.ArtifactStore.
+        :param hash_: The hash we should use to lookup the artifact to download.
+        :param hash_type: Hash type of the provided hash_. Will attempt to auto-detect if not explicitly provided.
+        :return: A LocalArtifact resource
+        """
+        logger.info('Downloading %s into %s', hash_, out_dir)
+        hash_ = resources.Hash.from_hashable(hash_, hash_type=hash_type)
+        store = out_dir if isinstance(out_dir, cache.ArtifactStore) else cache.ArtifactStore(out_dir)
+        analysis = resources.ContentAnalysis()
+        loop = asyncio.get_event_loop()
+        if await loop.run_in_executor(None, store.lookup, hash_, analysis) is None:
+            with store.writer(hash_) as part:
+                await self._download_resumable(lambda: self.generator.download(hash_.hash, hash_.hash_type,
+                                                                               handle=part, analysis=part.analysis),
+                                               part)
+            analysis = part.analysis
+        artifact = resources.LocalArtifact.from_path(self, store.path_for(hash_), analysis=analysis)
+        artifact.handle.close()
+        return artifact
+
+    async def _download_resumable(self, make_request, part):
+        """The asyncio counterpart of PolyswarmAPI._download_resumable."""
+        for attempt in range(const.DOWNLOAD_RESUME_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(const.DOWNLOAD_RESUME_BACKOFF * 2 ** (attempt - 1))
+            request = make_request()
+            part.resume(request)
+            try:
+                await request.execute()
+                # also checks responses without a body
+                part.start()
+            except _INTERRUPTED_DOWNLOAD_ERRORS as e:
+                logger.warning('Download of %s interrupted at byte %s: %s', part.path, part.offset, e)
+                continue
+            except exceptions.RequestException:
+                if not part.offset or request.status_code != 416:
+                    raise
+                # the part file may hold the whole body already, its content is checked by the caller
+                if part.satisfied(request):
+                    return
+                continue
+            if part.complete:
+                return
+            logger.warning('Download of %s ended at byte %s of %s', part.path, part.offset, part.total)
+        raise exceptions.RequestException(request, 'Download of {} incomplete after {} attempts, {} of {} bytes'
+                                          .format(part.path, const.DOWNLOAD_RESUME_ATTEMPTS, part.offset, part.total))
+
+    async def download_to_handle(self, hash_, fh, hash_type=None):
+        """
+        Grab the data of artifact identified by hash, and write the data to a file handle
+        :param hash_: The hash we should use to lookup the artifact to download.
+        :param fh: A file-like object which we are going to write the contents of the artifact to.
+        :param hash_type: Hash type of the provided hash_. Will attempt to auto-detect if not explicitly provided.
+        :return: A LocalHandle resource
+        """
+        logger.info('Downloading %s into handle', hash_)
+        hash_ = resources.Hash.from_hashable(hash_, hash_type=hash_type)
+        return (await self.generator.download(hash_.hash, hash_.hash_type, handle=fh).execute()).result
+
+    def stream(self, since=const.MAX_SINCE_TIME_STREAM):
+        """
+        Access the stream of artifacts (ask info@polyswarm.io about access)
+
+        :param since: Fetch results from the last "since" minutes (up to 2 days)
+        :return: Async generator of ArtifactArchive resources
+        """
+        logger.info('Streaming since %s', since)
+        return self._consume(self.generator.stream(since=since))
@@ -1,34 +1,132 @@
+import heapq
 import logging
 import time
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 try:
     from urllib.parse import urlparse
 except ImportError:
     from urlparse import urlparse
 
+import requests
 from future.utils import string_types
 
+from . import cache
 from . import exceptions
 from . import const
+from . import crawler
 from . import endpoint
 from . import http
-from .types import resources
+from . import polling
+from .types import base, resources
+from .utils import as_completed
 
 
 logger = logging.getLogger(__name__)
 
 
+# errors after which a download is resumed instead of failed
+_INTERRUPTED_DOWNLOAD_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                                requests.exceptions.Timeout)
+# lookup errors after which wait_for_many polls the scan again instead of giving up on it
+_TRANSIENT_LOOKUP_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                            exceptions.UsageLimitsExceededException)
+
+
+def _unique_hashes(polyswarm, hashes, hash_type, invalid):
+    """
+    Yield each distinct hash of hashes once, as a Hash.
+
+    Malformed hashes, and values that are not a hash at all such as None, are appended to invalid
+    as (hash, InvalidValueException) tuples instead.
+    """
+    seen = set()
+    for hash_ in hashes:
+        try:
+            parsed = resources.Hash.from_hashable(hash_, polyswarm=polyswarm, hash_type=hash_type)
+        except exceptions.InvalidValueException as e:
+            invalid.append((hash_, e))
+            continue
+        except (AttributeError, TypeError):
+            invalid.append((hash_, exceptions.InvalidValueException('Invalid hash provided: {!r}'.format(hash_))))
+            continue
+        key = parsed.hash.lower()
+        if key not in seen:
+            seen.add(key)
+            yield parsed
+
+
+def _parse_artifact(polyswarm, artifact, artifact_type):
+    """
+    Coerce the artifact given to submit into a LocalArtifact.
+
+    :return: A (LocalArtifact, opened) tuple, opened being True if we opened a file handle the caller has to close
+    """
+    artifact_type = resources.ArtifactType.parse(artifact_type)
+    opened = False
+    # TODO This is a python 2.7 check if artifact is a file-like instance, consider changing
+    #  to isinstance(artifact, io.IOBase) when deprecating 2.7 and implementing making LocalHandle
+    #  inherit io.IOBase, although this will change the method delegation logic in the resource
+    if hasattr(artifact, 'read') and hasattr(artifact.read, '__call__'):
+        artifact = resources.LocalArtifact(artifact, artifact_type=artifact_type, polyswarm=polyswarm, analyze=False)
+    elif isinstance(artifact, string_types):
+        if artifact_type == resources.ArtifactType.FILE:
+            artifact = resources.LocalArtifact.from_path(polyswarm, artifact, artifact_type=artifact_type)
+            opened = True
+        elif artifact_type == resources.ArtifactType.URL:
+            artifact = resources.LocalArtifact.from_content(polyswarm, artifact, artifact_name=artifact,
+                                                            artifact_type=artifact_type)
+    if not isinstance(artifact, resources.LocalArtifact):
+        raise exceptions.InvalidValueException('Artifacts should be a path to a file or a LocalArtifact instance')
+    return artifact, opened
+
+
+class SubmissionStats(object):
+    """Totals of a submit_many batch with dedup, updated as its results are yielded."""
+    def __init__(self):
+        self.uploaded = 0
+        self.rescanned = 0
+        self.failed = 0
+        self.bytes_uploaded = 0
+        # bytes of the artifacts PolySwarm already had, rescanned instead of uploaded
+        self.bytes_saved = 0
+
+    def __repr__(self):
+        return 'SubmissionStats(uploaded={}, rescanned={}, failed={}, bytes_uploaded={}, bytes_saved={})'.format(
+            self.uploaded, self.rescanned, self.failed, self.bytes_uploaded, self.bytes_saved)
+
+
 class PolyswarmAPI(object):
     """A synchronous interface to the public and private PolySwarm APIs."""
 
-    def __init__(self, key, uri=None, community=None, validate_schemas=False, timeout=None):
+    def __init__(self, key, uri=None, community=None, validate_schemas=False, timeout=None, poll_policy=None,
+                 prefetch=0, lazy=False, keep_json=True, validate_sample=1, json_decoder=None,
+                 stream_results=False, engine_cache=None, response_cache=None, rate_limiter=None):
         """
         :param key: PolySwarm API key
         :param uri: PolySwarm API URI
         :param community: Community to scan against.
         :param validate_schemas: Validate JSON objects when creating response objects. Will impact performance.
         :param timeout: Maximum time to wait for an http response on every request.
+        :param poll_policy: PollPolicy used when waiting for scans. Polls every POLL_FREQUENCY seconds by default.
+        :param prefetch: Number of result pages to fetch ahead in the background while iterating over results.
+        :param lazy: Build dates and nested objects of large resources on first access instead of when parsing.
+        :param keep_json: Keep the raw json in parsed resources. If False it is dropped once every field is parsed.
+        :param validate_sample: Only validate one in every validate_sample objects when validate_schemas is set.
+        :param json_decoder: Callable decoding response bodies from bytes. Defaults to the fastest json library
+            installed (orjson, ujson) or the standard library.
+        :param stream_results: Parse search and hunt results one at a time straight from the response stream
+            instead of decoding whole pages, keeping memory usage near a single result. Pages are then always
+            fetched one after another.
+        :param engine_cache: cache.EngineCache storing the engine list on disk for every process on the host.
+            By default the list is fetched once by each instance.
+        :param response_cache: cache.ResponseCache answering repeated searches, tag link and family lookups
+            without going to the network. Not used by default.
+        :param rate_limiter: ratelimit.RateLimiter pacing the requests of every endpoint family and sending
+            again those answered with 429. By default requests are sent as they come and a 429 raises
+            UsageLimitsExceededException.
         """
         logger.info('Creating PolyswarmAPI instance: api_key: %s, api_uri: %s, community: %s', key, uri, community)
         self.uri = uri or const.DEFAULT_GLOBAL_API
@@ -37,39 +135,152 @@ class PolyswarmAPI(object):
         self.session = http.PolyswarmHTTP(key, retries=const.DEFAULT_RETRIES)
         self.generator = endpoint.PolyswarmRequestGenerator(self)
         self.validate = validate_schemas
+        self.validate_sample = validate_sample
+        self.json_decoder = json_decoder or http.default_json_decoder()
+        self.stream_results = stream_results
+        self.poll_policy = poll_policy or polling.FixedPollPolicy()
+        self.prefetch = prefetch
+        self.lazy = lazy
+        self.keep_json = keep_json
+        self.engine_cache = engine_cache
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
         self._engines = None
+        self._engine_names = {}
 
     @property
     def engines(self):
         if not self._engines:
-            self._engines = self.generator.get_engines().execute().result
-            self._engines = {e.address.lower(): e for e in self._engines}
+            self._engines = {e.address: e for e in self._fetch_engines()}
         return self._engines
 
-    def resolve_engine_name(self, eth_pub):
-        engine = self.engines.get(eth_pub.lower())
-        engine_name = engine.name if engine else eth_pub
-        return engine_name.lower()
+    def _fetch_engines(self):
+        if self.engine_cache is None:
+            return self.generator.get_engines().execute().result
+        entry = self.engine_cache.load(self.uri)
+        if self.engine_cache.fresh(entry):
+            return resources.Engine.parse_result_list(self, entry['engines'])
+        # a single process refreshes the list, the others use their stale copy meanwhile, or wait
+        # for it when they have none
+        with self.engine_cache.lock(self.uri, blocking=entry is None) as locked:
+            if locked:
+                # it may have just been refreshed by the process holding the lock before
+                entry = self.engine_cache.load(self.uri) or entry
+            if (locked or entry is None) and not self.engine_cache.fresh(entry):
+                request = self.generator.get_engines(etag=entry and entry['etag'])
+                try:
+                    request.execute()
+                    etag = request.raw_result.headers.get('ETag')
+                    entry = self.engine_cache.store(self.uri, request.json['result'], etag)
+                except exceptions.NotModifiedException:
+                    entry = self.engine_cache.store(self.uri, entry['engines'], entry['etag'])
+        return resources.Engine.parse_result_list(self, entry['engines'])
 
-    def wait_for(self, scan, timeout=const.DEFAULT_SCAN_TIMEOUT):
+    def resolve_engine_name(self, eth_pub):
+        # names are resolved once per address and shared, instead of lowercased on every call
+        engine_name = self._engine_names.get(eth_pub)
+        if engine_name is None:
+            engine = self.engines.get(eth_pub.lower())
+            engine_name = base.intern_string((engine.name if engine else eth_pub).lower())
+            self._engine_names[eth_pub] = engine_name
+        return engine_name
+
+    @staticmethod
+    def _deadline(start, timeout, deadline):
+        if timeout is not None and timeout > -1:
+            deadline = min(deadline, start + timeout) if deadline is not None else start + timeout
+        return deadline
+
+    def wait_for(self, scan, timeout=const.DEFAULT_SCAN_TIMEOUT, deadline=None, poll_policy=None):
         """
         Wait for a Scan to scan successfully
 
         :param scan: Scan id to wait for
         :param timeout: Maximum time in seconds to wait before raising a TimeoutException
+        :param deadline: Absolute time (as returned by time.time()) after which a TimeoutException is raised
+        :param poll_policy: PollPolicy deciding the delay between lookups, defaults to the instance poll_policy
         :return: The ArtifactInstance resource waited on
         """
         logger.info('Waiting for %s', int(scan))
+        poll_policy = poll_policy or self.poll_policy
         start = time.time()
+        deadline = self._deadline(start, timeout, deadline)
+        attempt = 0
         while True:
             scan_result = self.lookup(scan)
+            attempt += 1
+            now = time.time()
             if scan_result.failed or scan_result.window_closed:
                 return scan_result
-            elif -1 < timeout < time.time() - start:
+            elif deadline is not None and now > deadline:
                 raise exceptions.TimeoutException('Timed out waiting for scan {} to finish. Please try again.'
                                                   .format(scan))
             else:
-                time.sleep(const.POLL_FREQUENCY)
+                delay = poll_policy.delay(attempt, now - start)
+                time.sleep(min(delay, deadline - now) if deadline is not None else delay)
+
+    def wait_for_many(self, scans, timeout=const.DEFAULT_SCAN_TIMEOUT, deadline=None, poll_policy=None,
+                      workers=const.DEFAULT_WORKER_COUNT):
+        """
+        Wait for many Scans to finish, polling them from a single scheduler.
+
+        Pending scan ids are kept in one queue ordered by their next poll time, and at most
+        `workers` lookups are in flight at any time.
+
+        :param scans: An iterable of Scan ids to wait for
+        :param timeout: Maximum time in seconds to wait for all scans before raising a TimeoutException
+        :param deadline: Absolute time (as returned by time.time()) after which a TimeoutException is raised
+        :param poll_policy: PollPolicy deciding the delay between lookups, defaults to the instance poll_policy
+        :param workers: Maximum number of concurrent lookups
+        :return: Generator of (scan id, result) tuples in the order the scans finish, where result is either
+            the ArtifactInstance or the exception raised looking the scan up. Lookups that fail on a dropped
+            connection, a timeout or a 429 are polled again later. Any other error, such as NotFoundException
+            for an unknown scan, is yielded as the result of that scan.
+        """
+        poll_policy = poll_policy or self.poll_policy
+        start = time.time()
+        deadline = self._deadline(start, timeout, deadline)
+        # entries are (next poll time, scan id, lookups made so far)
+        scheduled = [(start, int(scan), 0) for scan in scans]
+        heapq.heapify(scheduled)
+        logger.info('Waiting for %s scans', len(scheduled))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = {}
+            while scheduled or in_flight:
+                now = time.time()
+                if deadline is not None and now > deadline:
+                    pending = sorted([scan for _, scan, _ in scheduled] + [scan for scan, _ in in_flight.values()])
+                    raise exceptions.TimeoutException('Timed out waiting for scans {} to finish. Please try again.'
+                                                      .format(', '.join(str(scan) for scan in pending)))
+                while scheduled and scheduled[0][0] <= now and len(in_flight) < workers:
+                    _, scan, attempt = heapq.heappop(scheduled)
+                    in_flight[executor.submit(self.lookup, scan)] = (scan, attempt)
+                # sleep until the next lookup finishes, the next scan is due or the deadline is reached
+                wake_up = deadline
+                if scheduled and len(in_flight) < workers:
+                    wake_up = min(wake_up, scheduled[0][0]) if wake_up is not None else scheduled[0][0]
+                delay = max(wake_up - now, 0) if wake_up is not None else None
+                if not in_flight:
+                    time.sleep(delay)
+                    continue
+                done, _ = wait(in_flight, timeout=delay, return_when=FIRST_COMPLETED)
+                for future in done:
+                    scan, attempt = in_flight.pop(future)
+                    try:
+                        scan_result = future.result()
+                    except _TRANSIENT_LOOKUP_ERRORS as e:
+                        logger.warning('Lookup of scan %s failed, polling it again: %s', scan, e)
+                        scan_result = None
+                    except Exception as e:
+                        # the other scans are still waited for
+                        yield scan, e
+                        continue
+                    if scan_result is not None and (scan_result.failed or scan_result.window_closed):
+                        yield scan, scan_result
+                    else:
+                        now = time.time()
+                        delay = poll_policy.delay(attempt + 1, now - start)
+                        heapq.heappush(scheduled, (now + delay, scan, attempt + 1))
 
     def search(self, hash_, hash_type=None):
         """
@@ -83,6 +294,33 @@ class PolyswarmAPI(object):
         hash_ = resources.Hash.from_hashable(hash_, hash_type=hash_type)
         return self.generator.search_hash(hash_.hash, hash_.hash_type).execute().consume_results()
 
+    def search_hashes(self, hashes, hash_type=None, workers=const.DEFAULT_WORKER_COUNT):
+        """
+        Search for the latest scans matching each of the given hashes concurrently.
+
+        Hashes are normalized with Hash.from_hashable and duplicates are only searched once.
+
+        :param hashes: An iterable of Hashable objects (Artifact, local.LocalArtifact, Hash) or hex-encoded hashes
+        :param hash_type: Hash type of the provided hashes. Will attempt to auto-detect if not explicitly provided.
+        :param workers: Maximum number of searches in flight at the same time
+        :return: Generator of (Hash, result) tuples in completion order, where result is either the list of
+            ArtifactInstance resources found or the exception raised by the search (NotFoundException if unknown).
+            Malformed hashes, and values that are not hashes at all, are yielded as they are given, with an
+            InvalidValueException.
+        """
+        logger.info('Searching for hashes with %s workers', workers)
+        invalid = deque()
+
+        def search(hash_):
+            return list(self.generator.search_hash(hash_.hash, hash_.hash_type).execute().consume_results())
+
+        for result in as_completed(search, _unique_hashes(self, hashes, hash_type, invalid), workers):
+            while invalid:
+                yield invalid.popleft()
+            yield result
+        while invalid:
+            yield invalid.popleft()
+
     def search_url(self, url):
         """
         Search for the latest scan matching the given url.
@@ -114,31 +352,137 @@ class PolyswarmAPI(object):
         logger.info('Searching for metadata %s', query)
         return self.generator.search_metadata(query).execute().consume_results()
 
-    def submit(self, artifact, artifact_type=resources.ArtifactType.FILE):
+    def submit(self, artifact, artifact_type=resources.ArtifactType.FILE, progress=None, dedup=False):
         """
         Submit artifacts to polyswarm and return UUIDs
 
+        The artifact is read as it is uploaded. Artifacts held in memory, including the ones wrapping
+        a BytesIO or an mmap, are sent without being copied.
+
         :param artifact: A file-like, path to file, url or LocalArtifact instance
         :param artifact_type: The ArtifactType or strings containing "file" or "url"
+        :param progress: Callable called with (bytes sent, total bytes) as the upload goes
+        :param dedup: Hash the file locally first, and rescan it instead of uploading it if PolySwarm already has it
         :return: An ArtifactInstance resource
         """
         logger.info('Submitting artifact of type %s', artifact_type)
+        artifact, opened = _parse_artifact(self, artifact, artifact_type)
+        try:
+            if dedup and self._known(artifact):
+                return self.rescan(artifact.sha256)
+            request = self.generator.submit(artifact, artifact.artifact_name, artifact.artifact_type.name,
+                                            progress=progress)
+            return request.execute().result
+        finally:
+            # only close the handles we opened ourselves
+            if opened:
+                artifact.handle.close()
+
+    def submit_many(self, artifacts, artifact_type=resources.ArtifactType.FILE, workers=const.DEFAULT_WORKER_COUNT,
+                    dedup=False, stats=None):
+        """
+        Submit many artifacts concurrently over the shared http session.
+
+        Files given as paths are only opened when their upload starts, so at most `workers`
+        handles are open at the same time. A failed submission does not abort the batch.
+
+        With dedup, files are hashed and searched for first, `workers` at a time. The ones PolySwarm
+        already has are rescanned and only the new ones are uploaded, on a second pool of `workers`
+        threads, so the searches go on while new files upload.
+
+        :param artifacts: An iterable of file-likes, paths to files, urls or LocalArtifact instances
+        :param artifact_type: The ArtifactType or strings containing "file" or "url"
+        :param workers: Maximum number of submissions in flight at the same time
+        :param dedup: Rescan instead of uploading the files PolySwarm already has
+        :param stats: SubmissionStats updated with the uploads and bytes saved by dedup
+        :return: Generator of (artifact, result) tuples in completion order, where result is either
+            the ArtifactInstance resource or the exception raised while submitting that artifact
+        """
+        logger.info('Submitting artifacts of type %s with %s workers', artifact_type, workers)
         artifact_type = resources.ArtifactType.parse(artifact_type)
-        # TODO This is a python 2.7 check if artifact is a file-like instance, consider changing
-        #  to isinstance(artifact, io.IOBase) when deprecating 2.7 and implementing making LocalHandle
-        #  inherit io.IOBase, although this will change the method delegation logic in the resource
-        if hasattr(artifact, 'read') and hasattr(artifact.read, '__call__'):
-            artifact = resources.LocalArtifact(artifact, artifact_type=artifact_type, polyswarm=self, analyze=False)
-        elif isinstance(artifact, string_types):
-            if artifact_type == resources.ArtifactType.FILE:
-                artifact = resources.LocalArtifact.from_path(self, artifact, artifact_type=artifact_type)
-            elif artifact_type == resources.ArtifactType.URL:
-                artifact = resources.LocalArtifact.from_content(self, artifact, artifact_name=artifact,
-                                                                artifact_type=artifact_type)
-        if isinstance(artifact, resources.LocalArtifact):
-            return self.generator.submit(artifact, artifact.artifact_name, artifact.artifact_type.name).execute().result
-        else:
-            raise exceptions.InvalidValueException('Artifacts should be a path to a file or a LocalArtifact instance')
+        if dedup:
+            return self._submit_deduplicated(artifacts, artifact_type, workers, stats or SubmissionStats())
+        return as_completed(lambda artifact: self.submit(artifact, artifact_type=artifact_type), artifacts, workers)
+
+    def submit_directory(self, root, index, workers=const.DEFAULT_WORKER_COUNT):
+        """
+        Submit the files under root that were not submitted yet.
+
+        Files are hashed through the crawler.HashIndex, so only files that are new or changed since the
+        last run are read. A file is skipped if the same content was already submitted from another path.
+        Hashing and uploads each use at most half of MAX_OPEN_FDS handles.
+
+        :param root: Directory to submit the files of.
+        :param index: crawler.HashIndex remembering the hashes and submissions of previous runs.
+        :param workers: Number of files hashed, and of files uploaded, concurrently.
+        :return: Generator of (path, result) tuples in completion order, where result is either
+            the ArtifactInstance resource or the exception raised while submitting that file
+        """
+        logger.info('Submitting new files under %s', root)
+        workers = max(1, min(workers, const.MAX_OPEN_FDS // 2))
+
+        def new_files():
+            queued = set()
+            for crawled in crawler.crawl(root, index, workers=workers):
+                if crawled.submitted or crawled.sha256 in queued:
+                    continue
+                if index.submitted(crawled.sha256):
+                    index.mark_submitted(crawled.path)
+                    continue
+                queued.add(crawled.sha256)
+                yield crawled.path
+
+        try:
+            for path, result in self.submit_many(new_files(), workers=workers):
+                if not isinstance(result, Exception):
+                    index.mark_submitted(path)
+                yield path, result
+        finally:
+            index.commit()
+
+    def _known(self, artifact):
+        """Hash the LocalArtifact and tell whether PolySwarm already has a file with its sha256."""
+        if artifact.artifact_type != resources.ArtifactType.FILE:
+            return False
+        artifact.analyze_artifact()
+        try:
+            return next(iter(self.search(artifact.sha256)), None) is not None
+        except (exceptions.NotFoundException, exceptions.NoResultsException):
+            return False
+
+    def _submit_deduplicated(self, artifacts, artifact_type, workers, stats):
+        def search(artifact):
+            local, opened = _parse_artifact(self, artifact, artifact_type)
+            try:
+                return self._known(local), local.sha256, local.size
+            finally:
+                if opened:
+                    local.handle.close()
+
+        def send(searched):
+            artifact, found = searched
+            if isinstance(found, Exception):
+                return found
+            known, sha256, _ = found
+            if known:
+                return self.rescan(sha256)
+            return self.submit(artifact, artifact_type=artifact_type)
+
+        # searches run ahead of the uploads, by a bounded number of artifacts
+        searched = as_completed(search, artifacts, workers)
+        for (artifact, found), result in as_completed(send, searched, workers,
+                                                       window=workers * const.DEDUP_SEARCH_AHEAD):
+            if isinstance(result, Exception):
+                stats.failed += 1
+            elif found[0]:
+                stats.rescanned += 1
+                stats.bytes_saved += found[2]
+            else:
+                stats.uploaded += 1
+                stats.bytes_uploaded += found[2] or 0
+            yield artifact, result
+        logger.info('Submitted %s new artifacts (%s bytes), rescanned %s known ones (%s bytes saved), %s failed',
+                    stats.uploaded, stats.bytes_uploaded, stats.rescanned, stats.bytes_saved, stats.failed)
 
     def lookup(self, scan):
         """
@@ -239,7 +583,7 @@ class PolyswarmAPI(object):
         logger.info('List live hunts since: %s all: %s', since, all_)
         return self.generator.live_list(since=since, all_=all_).execute().consume_results()
 
-    def live_results(self, hunt=None, since=None, tag=None, rule_name=None):
+    def live_results(self, hunt=None, since=None, tag=None, rule_name=None, workers=None, ordered=True):
         """
         Get results from a live hunt
 
@@ -247,11 +591,13 @@ class PolyswarmAPI(object):
         :param since: Fetch results from the last "since" minutes
         :param tag: Filter hunt results containing the provided tags (comma separated tags, exact match).
         :param rule_name: Filter hunt results on the provided rule name (exact match).
+        :param workers: Fetch the result pages concurrently with this many workers when the total is known.
+        :param ordered: When fetching pages concurrently, keep the results in order.
         :return: Generator of HuntResult resources
         """
         logger.info('List live hunt results %s', hunt)
-        return self.generator.live_hunt_results(hunt_id=hunt, since=since,
-                                                tag=tag, rule_name=rule_name).execute().consume_results()
+        return self.generator.live_hunt_results(hunt_id=hunt, since=since, tag=tag, rule_name=rule_name)\
+            .execute().consume_results(workers=workers, ordered=ordered)
 
     def historical_create(self, rule=None, ruleset_name=None):
         """
@@ -295,17 +641,20 @@ class PolyswarmAPI(object):
         logger.info('List historical hunts since: %s', since)
         return self.generator.historical_list(since=since).execute().consume_results()
 
-    def historical_results(self, hunt=None, tag=None, rule_name=None):
+    def historical_results(self, hunt=None, tag=None, rule_name=None, workers=None, ordered=True):
         """
         Get results from a historical hunt
 
         :param hunt: ID of the hunt (None if latest hunt results are desired)
         :param tag: Filter hunt results containing the provided tags (comma separated tags, exact match).
         :param rule_name: Filter hunt results on the provided rule name (exact match).
+        :param workers: Fetch the result pages concurrently with this many workers when the total is known.
+        :param ordered: When fetching pages concurrently, keep the results in order.
         :return: Generator of HuntResult resources
         """
         logger.info('List historical results for hunt: %s', hunt)
-        return self.generator.historical_hunt_results(hunt_id=hunt, tag=tag, rule_name=rule_name).execute().consume_results()
+        return self.generator.historical_hunt_results(hunt_id=hunt, tag=tag, rule_name=rule_name)\
+            .execute().consume_results(workers=workers, ordered=ordered)
 
     def ruleset_create(self, name, rules, description=None):
         """
@@ -480,34 +829,122 @@ class PolyswarmAPI(object):
         """
         Grab the data of artifact identified by hash, and write the data to a file in the provided directory
         under a file named after the hash_.
-        :param out_dir: Destination directory to download the file.
+        Nothing is downloaded if the directory already holds a copy matching the hash. The file only appears
+        once its content was verified against the hash, and the returned artifact is analyzed as it is written
+        or verified, without reading the file again.
+        :param out_dir: Destination directory to download the file, or a cache.ArtifactStore.
         :param hash_: The hash we should use to lookup the artifact to download.
         :param hash_type: Hash type of the provided hash_. Will attempt to auto-detect if not explicitly provided.
         :return: A LocalArtifact resource
         """
         logger.info('Downloading %s into %s', hash_, out_dir)
         hash_ = resources.Hash.from_hashable(hash_, hash_type=hash_type)
-        path = os.path.join(out_dir, hash_.hash)
-        artifact = resources.LocalArtifact.from_path(self, path, create=True)
-        self.generator.download(hash_.hash, hash_.hash_type, handle=artifact).execute()
+        store = out_dir if isinstance(out_dir, cache.ArtifactStore) else cache.ArtifactStore(out_dir)
+        analysis = resources.ContentAnalysis()
+        if store.lookup(hash_, analysis) is None:
+            with store.writer(hash_) as part:
+                self._download_resumable(lambda: self.generator.download(hash_.hash, hash_.hash_type, handle=part,
+                                                                         analysis=part.analysis), part)
+            analysis = part.analysis
+        artifact = resources.LocalArtifact.from_path(self, store.path_for(hash_), analysis=analysis)
         artifact.handle.close()
         return artifact
 
-    def download_archive(self, out_dir, s3_path):
+    def download_archive(self, out_dir, s3_path, segments=1):
         """
         Grab the data in the s3 path provided in the stream() method, and write the contents
         in the provided directory.
         :param out_dir: Destination directory to download the file.
         :param s3_path: Target S3 object to download.
+        :param segments: Split the object in this many byte ranges downloaded concurrently.
+            Falls back to a single request when the server does not honor Range requests.
         :return: A LocalArtifact resource
         """
         logger.info('Downloading %s into %s', s3_path, out_dir)
         path = os.path.join(out_dir, os.path.basename(urlparse(s3_path).path))
-        artifact = resources.LocalArtifact.from_path(self, path, create=True)
-        self.generator.download_archive(s3_path, handle=artifact).execute()
+        cache.makedirs(out_dir)
+        part = cache.PartialFile(path)
+        try:
+            if segments > 1:
+                self._download_segmented(s3_path, part, segments)
+            else:
+                self._download_resumable(lambda: self.generator.download_archive(s3_path, handle=part), part)
+            part.check()
+        except exceptions.ChecksumMismatchException:
+            part.discard()
+            raise
+        except BaseException:
+            part.abandon()
+            raise
+        part.commit()
+        artifact = resources.LocalArtifact.from_path(self, path)
         artifact.handle.close()
         return artifact
 
+    def _download_segmented(self, s3_path, part, segments):
+        """
+        Download s3_path into the PartialFile part with concurrent Range requests.
+
+        A first request for a single byte gives the size of the object, the rest is then split in
+        segments fetched on a thread pool, each resumed on its own when its connection drops.
+        """
+        # sent again from the start when the part file does not match the body
+        for _ in range(2):
+            request = self.generator.download_archive(s3_path, handle=part)
+            part.resume(request)
+            request.request_parameters.setdefault('headers', {})['Range'] = 'bytes={0}-{0}'.format(part.offset)
+            try:
+                request.execute()
+                part.start()
+                break
+            except exceptions.RequestException:
+                if not part.offset or request.status_code != 416:
+                    raise
+                # the part file may hold the whole body already, its content is checked by the caller
+                if part.satisfied(request):
+                    return
+        # a server ignoring the Range header sent the whole body already
+        if part.complete:
+            return
+
+        def download(segment):
+            self._download_resumable(lambda: self.generator.download_archive(s3_path, handle=segment), segment)
+        with cache.SegmentedFile(part, part.total) as segmented, ThreadPoolExecutor(max_workers=segments) as executor:
+            for _ in executor.map(download, segmented.segments(segments)):
+                pass
+
+    def _download_resumable(self, make_request, part):
+        """
+        Execute the download requests built by make_request into the PartialFile part.
+
+        When the connection drops or the body ends early, the download continues from the end of the
+        part file with a Range request, up to DOWNLOAD_RESUME_ATTEMPTS times.
+        """
+        for attempt in range(const.DOWNLOAD_RESUME_ATTEMPTS):
+            if attempt:
+                time.sleep(const.DOWNLOAD_RESUME_BACKOFF * 2 ** (attempt - 1))
+            request = make_request()
+            part.resume(request)
+            try:
+                request.execute()
+                # also checks responses without a body
+                part.start()
+            except _INTERRUPTED_DOWNLOAD_ERRORS as e:
+                logger.warning('Download of %s interrupted at byte %s: %s', part.path, part.offset, e)
+                continue
+            except exceptions.RequestException:
+                if not part.offset or request.status_code != 416:
+                    raise
+                # the part file may hold the whole body already, its content is checked by the caller
+                if part.satisfied(request):
+                    return
+                continue
+            if part.complete:
+                return
+            logger.warning('Download of %s ended at byte %s of %s', part.path, part.offset, part.total)
+        raise exceptions.RequestException(request, 'Download of {} incomplete after {} attempts, {} of {} bytes'
+                                          .format(part.path, const.DOWNLOAD_RESUME_ATTEMPTS, part.offset, part.total))
+
     def download_to_handle(self, hash_, fh, hash_type=None):
         """
         Grab the data of artifact identified by hash, and write the data to a file handle
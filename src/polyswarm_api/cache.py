@@ -0,0 +1,710 @@
+import errno
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from . import const
+from . import exceptions
+from . import http
+from .types import resources
+
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+logger = logging.getLogger(__name__)
+
+# os.rename does not replace existing files on windows, os.replace is python 3.3+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def default_cache_dir():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                        'polyswarm')
+
+
+def makedirs(directory):
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # created by someone else in the meantime
+            if not os.path.isdir(directory):
+                raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def atomic_write(path, content):
+    """Write content to path through a temporary file, so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    makedirs(directory)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        _replace(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+def lock_file(handle, blocking=True):
+    """
+    Take an exclusive lock on an open file, held until the file is closed.
+
+    Returns False if it is held by another process or file handle and blocking is False. Files are not
+    locked on platforms with neither fcntl nor msvcrt.
+    """
+    fd = handle.fileno()
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        elif msvcrt is not None:
+            # locks the first byte, whatever the size of the file
+            position = os.lseek(fd, 0, os.SEEK_CUR)
+            os.lseek(fd, 0, os.SEEK_SET)
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            finally:
+                os.lseek(fd, position, os.SEEK_SET)
+    except (IOError, OSError) as e:
+        if blocking or e.errno not in (errno.EACCES, errno.EAGAIN, errno.EWOULDBLOCK):
+            raise
+        return False
+    return True
+
+
+def _open_binary(path):
+    """Open path for reading and writing, creating it if needed, without the append mode ignoring positions."""
+    return os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666), 'rb+')
+
+
+def check_download(fd, path, total, etag=None):
+    """
+    Check the open file fd of the download of path holds total bytes and, for a plain S3 ETag, their md5.
+
+    ETags of multipart uploads are not digests of the content and are not checked, nor is the size when
+    total is None.
+    """
+    size = os.fstat(fd).st_size
+    if total is not None and size != total:
+        raise exceptions.ChecksumMismatchException(
+            'Downloaded {} bytes of {}, expected {}'.format(size, path, total))
+    etag = (etag or '').strip('"')
+    if len(etag) != 32 or resources.Hash.get_hash_type(etag) != 'md5':
+        return
+    hasher = hashlib.md5()
+    os.lseek(fd, 0, os.SEEK_SET)
+    for chunk in iter(lambda: os.read(fd, const.DOWNLOAD_CHUNK_SIZE), b''):
+        hasher.update(chunk)
+    if hasher.hexdigest() != etag.lower():
+        raise exceptions.ChecksumMismatchException(
+            'Downloaded content of {} has md5 {}, expected {}'.format(path, hasher.hexdigest(), etag))
+
+
+class EngineCache(object):
+    """
+    Engine list shared on disk by every process using the same cache directory.
+
+    Entries are stored per api uri and refreshed once older than ttl seconds. Refreshing sends the
+    ETag of the stored list, so an unchanged list is not downloaded again. Only the process holding the
+    lock of an entry refreshes it, the others keep using the stale entry meanwhile.
+    """
+    def __init__(self, path=None, ttl=const.ENGINE_CACHE_TTL):
+        """
+        :param path: Directory holding the cache files, ~/.cache/polyswarm by default.
+        :param ttl: Number of seconds a stored engine list is used without asking the server.
+        """
+        self.path = path or default_cache_dir()
+        self.ttl = ttl
+
+    def _file(self, uri):
+        key = hashlib.sha256(uri.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.path, 'engines-{}.json'.format(key))
+
+    def load(self, uri):
+        """Return the stored entry for the api uri, a dict with engines, etag and fetched keys, or None."""
+        try:
+            with open(self._file(uri), 'rb') as f:
+                entry = json.loads(f.read().decode('utf-8'))
+        except (IOError, OSError, ValueError) as e:
+            logger.debug('No usable engine cache for %s: %s', uri, e)
+            return None
+        if entry.get('uri') != uri:
+            return None
+        return entry
+
+    def fresh(self, entry):
+        return entry is not None and 0 <= time.time() - entry['fetched'] < self.ttl
+
+    @contextmanager
+    def lock(self, uri, blocking=True):
+        """
+        Hold the lock refreshing the entry of the api uri.
+
+        Yields False if another process holds it and blocking is False. An unwritable cache is not locked.
+        """
+        try:
+            makedirs(self.path)
+            handle = open(self._file(uri) + '.lock', 'ab')
+        except (IOError, OSError) as e:
+            logger.debug('Could not lock the engine cache: %s', e)
+            yield True
+            return
+        with handle:
+            yield lock_file(handle, blocking)
+
+    def store(self, uri, engines, etag=None):
+        """Store the raw json list of engines of the api uri and return the new entry."""
+        entry = {'uri': uri, 'engines': engines, 'etag': etag, 'fetched': time.time()}
+        try:
+            atomic_write(self._file(uri), json.dumps(entry).encode('utf-8'))
+        except (IOError, OSError) as e:
+            # an unwritable cache only costs a request in the next process
+            logger.warning('Could not write the engine cache: %s', e)
+        return entry
+
+
+class ResponseCache(object):
+    """
+    Cache of GET responses, kept in memory up to max_entries and optionally on disk.
+
+    Only the endpoints listed in ttls are cached, each for its own number of seconds. Any other request
+    to a cached endpoint, such as updating a tag link, drops its cached responses.
+
+    On disk the responses of each endpoint are kept in their own directory, so they are dropped without
+    listing the others. Expired responses are removed, and the ones closest to expiring beyond
+    max_disk_size, every time a tenth of max_disk_size was written.
+    """
+    def __init__(self, ttls=None, max_entries=const.RESPONSE_CACHE_SIZE, path=None,
+                 max_disk_size=const.RESPONSE_CACHE_DISK_SIZE):
+        """
+        :param ttls: Dict of endpoint path, relative to the api uri, to seconds its responses are cached.
+            Paths also match the endpoints below them. Defaults to const.RESPONSE_CACHE_TTLS.
+        :param max_entries: Maximum number of responses kept in memory, least recently used are dropped first.
+        :param path: Directory to also store responses in, so they are shared with other processes.
+        :param max_disk_size: Maximum number of bytes of responses stored in path.
+        """
+        self.ttls = const.RESPONSE_CACHE_TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        self.path = path
+        self.max_disk_size = max_disk_size
+        # bytes left to write before the next sweep, the first store sweeps what earlier processes left
+        self._unswept = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> (expiration time, response), in least recently used order
+        self._entries = OrderedDict()
+        # key prefix -> endpoint
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, path):
+        for endpoint in self.ttls:
+            if path == endpoint or path.startswith(endpoint + '/'):
+                return endpoint
+        return None
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+    def key(self, path, method, url, params=None, authorization=None):
+        """Return the key to cache the response of a request under, or None if it is not cached."""
+        endpoint = self._endpoint(path)
+        if endpoint is None or not self.ttls[endpoint]:
+            return None
+        if isinstance(params, dict):
+            params = params.items()
+        params = sorted((str(k), str(v)) for k, v in params or ())
+        # responses depend on the api key, e.g. for private communities
+        request = json.dumps([method.upper(), url, params, authorization])
+        # the endpoint is part of the key, so its responses can be dropped without reading them
+        prefix = self._digest(endpoint)[:16]
+        self._endpoints[prefix] = endpoint
+        return '{}-{}'.format(prefix, self._digest(request))
+
+    def get(self, key):
+        """Return the cached response, a http.BufferedResponse, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > now:
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+        entry = self._load(key, now) if self.path else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, entry)
+        return entry[1]
+
+    def put(self, key, response):
+        """Cache a response under a key returned by key()."""
+        expires = time.time() + self.ttls[self._endpoints[key.split('-', 1)[0]]]
+        response = http.BufferedResponse(response.status_code, response.content, dict(response.headers), response.url)
+        with self._lock:
+            self._remember(key, (expires, response))
+        if self.path:
+            self._store(key, expires, response)
+
+    def invalidate(self, path):
+        """Drop the cached responses of the endpoint at path."""
+        endpoint = self._endpoint(path)
+        if endpoint is None:
+            return
+        prefix = self._digest(endpoint)[:16]
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix + '-')]:
+                del self._entries[key]
+        if self.path and os.path.isdir(os.path.join(self.path, prefix)):
+            # moved out of the way first, so no other process reads from it while it is removed
+            doomed = None
+            try:
+                doomed = tempfile.mkdtemp(dir=self.path, prefix='.tmp-')
+                os.rename(os.path.join(self.path, prefix), os.path.join(doomed, prefix))
+            except OSError as e:
+                # removed by someone else in the meantime
+                logger.debug('Could not invalidate the response cache of %s: %s', endpoint, e)
+            if doomed is not None:
+                shutil.rmtree(doomed, ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def sweep(self):
+        """Remove the expired responses from disk, then the ones closest to expiring beyond max_disk_size."""
+        if not self.path or not os.path.isdir(self.path):
+            return
+        now = time.time()
+        files = []
+        for directory in os.listdir(self.path):
+            directory = os.path.join(self.path, directory)
+            if os.path.basename(directory).startswith('.tmp-') or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.startswith('.tmp-'):
+                    # being written
+                    continue
+                file_path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                # stored files are dated with their expiration time
+                if stat.st_mtime <= now:
+                    _remove(file_path)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, file_path))
+        files.sort(reverse=True)
+        total = 0
+        for _, size, file_path in files:
+            total += size
+            if self.max_disk_size is not None and total > self.max_disk_size:
+                _remove(file_path)
+
+    def _remember(self, key, entry):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _file(self, key):
+        return os.path.join(self.path, *key.split('-', 1))
+
+    def _load(self, key, now):
+        path = self._file(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline().decode('utf-8'))
+                content = f.read()
+        except (IOError, OSError, ValueError):
+            return None
+        if meta['expires'] <= now:
+            _remove(path)
+            return None
+        return meta['expires'], http.BufferedResponse(meta['status_code'], content, meta['headers'], meta['url'])
+
+    def _store(self, key, expires, response):
+        meta = {'expires': expires, 'status_code': response.status_code, 'headers': response.headers,
+                'url': response.url}
+        content = json.dumps(meta).encode('utf-8') + b'\n' + response.content
+        path = self._file(key)
+        try:
+            atomic_write(path, content)
+            os.utime(path, (expires, expires))
+        except (IOError, OSError) as e:
+            logger.warning('Could not write the response cache: %s', e)
+            return
+        with self._lock:
+            self._unswept -= len(content)
+            sweep = self._unswept <= 0
+            if sweep:
+                self._unswept = (self.max_disk_size or const.RESPONSE_CACHE_DISK_SIZE) * const.RESPONSE_CACHE_SWEEP
+        if sweep:
+            self.sweep()
+
+
+class PartialFile(object):
+    """
+    A download in progress, written to "<path>.part" and renamed to path once complete.
+
+    The part file is kept when the download fails, so it can be resumed later with a Range request
+    starting at offset. When an analysis is given, the content already in the part file is fed to it on
+    open, and the LocalHandle writing the download feeds it the rest.
+
+    The part file is locked while open. If another job is already downloading to it, this one writes to
+    a temporary file of its own instead, which is not resumed later.
+    """
+    def __init__(self, path, analysis=None):
+        self.path = path
+        self.part_path = path + '.part'
+        self.analysis = analysis
+        self.handle = _open_binary(self.part_path)
+        self.resumable = lock_file(self.handle, blocking=False)
+        if not self.resumable:
+            self.handle.close()
+            logger.info('%s is being downloaded by another job, downloading to a temporary file', self.part_path)
+            fd, self.part_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                                  prefix='.tmp-{}-'.format(os.path.basename(path)), suffix='.part')
+            self.handle = os.fdopen(fd, 'rb+')
+        else:
+            self._cut_to_written()
+        if self.analysis is not None:
+            for chunk in iter(lambda: self.handle.read(const.DOWNLOAD_CHUNK_SIZE), b''):
+                self.analysis.update(chunk)
+        self.handle.seek(0, os.SEEK_END)
+        self.offset = self.handle.tell()
+        # size of the complete body and its ETag, once known from the response headers
+        self.total = None
+        self.etag = None
+        self._request = None
+
+    @property
+    def written_path(self):
+        """Path of the file holding how many bytes at the start of the part file were actually downloaded."""
+        return self.part_path + '.written'
+
+    def _cut_to_written(self):
+        # a segmented download interrupted before it could cut the part file back to what it wrote
+        try:
+            with open(self.written_path, 'rb') as f:
+                written = int(f.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return
+        logger.info('Cutting %s back to the %s bytes downloaded', self.part_path, written)
+        self.handle.truncate(written)
+        _remove(self.written_path)
+
+    def resume(self, request):
+        """Prepare the download request to continue from offset. The response is checked on the first write."""
+        if self.offset:
+            request.request_parameters.setdefault('headers', {})['Range'] = 'bytes={}-'.format(self.offset)
+        self._request = request
+
+    def start(self):
+        """Check the response to the last request, starting over if the server ignored the Range."""
+        request, self._request = self._request, None
+        if request is None:
+            return
+        headers = request.raw_result.headers if request.raw_result is not None else {}
+        self.etag = headers.get('ETag') or self.etag
+        if request.status_code == 206:
+            content_range = headers.get('Content-Range', '')
+            if not content_range.startswith('bytes {}-'.format(self.offset)):
+                raise exceptions.RequestException(request, 'Unexpected Content-Range: {}'.format(content_range))
+            total = content_range.rpartition('/')[2]
+            self.total = int(total) if total.isdigit() else None
+        else:
+            if self.offset:
+                logger.info('Range not honored, restarting the download of %s', self.path)
+                self.restart()
+            length = headers.get('Content-Length')
+            self.total = int(length) if length and length.isdigit() else None
+
+    def satisfied(self, request):
+        """
+        Whether the part file holds the whole body, after the server answered 416 to resuming it.
+
+        Only true when the size of the body the server announces is offset, the content itself still has to
+        be checked against the hash or ETag. Otherwise the part file is started over.
+        """
+        headers = request.raw_result.headers if request.raw_result is not None else {}
+        total = headers.get('Content-Range', '').rpartition('/')[2]
+        if total.isdigit() and int(total) == self.offset:
+            self.total = self.offset
+            self.etag = headers.get('ETag') or self.etag
+            return True
+        logger.info('Part file of %s does not match the size of %s bytes, restarting the download', self.path, total)
+        self.restart()
+        return False
+
+    def restart(self):
+        """Drop the content of the part file, to download it again from the start."""
+        self.handle.seek(0)
+        self.handle.truncate()
+        self.offset = 0
+        if self.analysis is not None:
+            self.analysis.reset()
+
+    def write(self, data):
+        if self._request is not None:
+            self.start()
+        self.handle.write(data)
+        self.offset += len(data)
+
+    @property
+    def complete(self):
+        return self.total is None or self.offset >= self.total
+
+    def check(self):
+        """Check the part file has the size and, for a plain S3 ETag, the md5 the server announced."""
+        self.handle.flush()
+        check_download(self.handle.fileno(), self.path, self.total, self.etag)
+
+    def close(self):
+        self.handle.close()
+
+    def commit(self):
+        """Rename the complete part file to its final path."""
+        self.close()
+        _replace(self.part_path, self.path)
+
+    def discard(self):
+        self.close()
+        os.remove(self.part_path)
+
+    def abandon(self):
+        """Close the part file after a failed download, removing it when there is nothing to resume."""
+        self.close()
+        if not self.offset or not self.resumable:
+            _remove(self.part_path)
+
+
+class SegmentedFile(object):
+    """
+    The rest of a PartialFile fetched as byte ranges over concurrent requests.
+
+    The part file is extended to its final size up front and every segment writes its range in place
+    with positional writes, so segments never wait on each other. It is written through the locked
+    handle of the PartialFile, which stays open until the download is done.
+
+    Used as a context manager. When the download fails the part file is cut back to the bytes written
+    from its start without a gap, so it is resumed from there. Until then the size it had is kept in the
+    written_path file of the PartialFile, so a process dying in between never leaves a part file
+    looking complete.
+    """
+    def __init__(self, part, total):
+        self.part = part
+        self.path = part.path
+        self.offset = part.offset
+        self.total = total
+        self._segments = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if self.part.resumable:
+            atomic_write(self.part.written_path, str(self.offset).encode('utf-8'))
+        self.part.handle.flush()
+        self._fd = self.part.handle.fileno()
+        os.ftruncate(self._fd, self.total)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            written = self.offset
+            for segment in self._segments:
+                written = segment.offset
+                if not segment.complete:
+                    break
+            os.ftruncate(self._fd, written)
+            self.part.handle.seek(written)
+            self.part.offset = written
+        _remove(self.part.written_path)
+
+    def segments(self, count):
+        """Split the bytes from offset to total in at most count Segment of about the same size."""
+        remaining = self.total - self.offset
+        count = max(1, min(count, remaining))
+        bounds = [self.offset + remaining * i // count for i in range(count + 1)]
+        self._segments = [Segment(self, start, end) for start, end in zip(bounds, bounds[1:])]
+        return self._segments
+
+    def pwrite(self, data, offset):
+        data = memoryview(data)
+        while data:
+            if hasattr(os, 'pwrite'):
+                written = os.pwrite(self._fd, data, offset)
+            else:
+                with self._lock:
+                    os.lseek(self._fd, offset, os.SEEK_SET)
+                    written = os.write(self._fd, data)
+            data = data[written:]
+            offset += written
+
+
+class Segment(object):
+    """
+    The byte range [start, end) of a SegmentedFile, with the PartialFile interface used to resume downloads.
+    """
+    def __init__(self, file, start, end):
+        self.file = file
+        self.path = file.path
+        self.offset = start
+        self.total = end
+        self._request = None
+
+    def resume(self, request):
+        """Prepare the download request for the part of the range not written yet."""
+        request.request_parameters.setdefault('headers', {})['Range'] = 'bytes={}-{}'.format(
+            self.offset, self.total - 1)
+        self._request = request
+
+    def start(self):
+        """Check the response holds the requested range."""
+        request, self._request = self._request, None
+        if request is None:
+            return
+        content_range = request.raw_result.headers.get('Content-Range', '')
+        if request.status_code != 206 or not content_range.startswith('bytes {}-{}/'.format(self.offset,
+                                                                                           self.total - 1)):
+            raise exceptions.RequestException(request, 'Unexpected Content-Range: {}'.format(content_range))
+
+    def write(self, data):
+        if self._request is not None:
+            self.start()
+        if self.offset + len(data) > self.total:
+            raise exceptions.RequestException(None, 'Segment of {} overflows at byte {}'.format(self.path,
+                                                                                               self.total))
+        self.file.pwrite(data, self.offset)
+        self.offset += len(data)
+
+    def satisfied(self, request):
+        raise exceptions.RequestException(request, 'Segment {}-{} of {} is past the end of the body'.format(
+            self.offset, self.total - 1, self.path))
+
+    @property
+    def complete(self):
+        return self.offset >= self.total
+
+
+class ArtifactStore(object):
+    """
+    Directory of artifacts named after their hash, as written by PolyswarmAPI.download.
+
+    Files are only ever seen complete and verified: downloads go to a temporary file, are hashed while
+    written and renamed into place once the hash matches. When max_size or max_age are set the least
+    recently used artifacts are removed after each download, so one store can be shared by many jobs.
+    """
+    def __init__(self, path, max_size=None, max_age=None):
+        """
+        :param path: Directory holding the artifacts.
+        :param max_size: Maximum total size of the artifacts in bytes.
+        :param max_age: Maximum number of seconds since an artifact was last downloaded or used.
+        """
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def path_for(self, hash_):
+        return os.path.join(self.path, hash_.hash)
+
+    def lookup(self, hash_, analysis=None):
+        """
+        Return the path of the artifact if a copy matching its hash is stored, None otherwise.
+
+        :param analysis: ContentAnalysis fed with the stored copy while it is verified.
+        """
+        path = self.path_for(hash_)
+        if not os.path.isfile(path):
+            return None
+        if analysis is None:
+            analysis = resources.ContentAnalysis(algorithms=(functools.partial(hashlib.new, hash_.hash_type),))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(const.DOWNLOAD_CHUNK_SIZE), b''):
+                analysis.update(chunk)
+        if analysis.hexdigest(hash_.hash_type) != hash_.hash.lower():
+            logger.warning('Stored artifact %s does not match its hash, downloading it again', path)
+            return None
+        # mark it as recently used for eviction
+        os.utime(path, None)
+        return path
+
+    @contextmanager
+    def writer(self, hash_):
+        """
+        Yield the PartialFile to write the artifact to, stored under its hash once the block exits.
+
+        A failed download is kept as "<hash>.part" and resumed by the next writer of the same artifact.
+        Raises ChecksumMismatchException, leaving nothing behind, if the content does not match the hash.
+        The ContentAnalysis of the part has to be fed with everything written, see LocalHandle.
+        """
+        makedirs(self.path)
+        part = PartialFile(self.path_for(hash_), resources.ContentAnalysis())
+        try:
+            yield part
+        except BaseException:
+            part.abandon()
+            raise
+        finally:
+            part.close()
+        digest = part.analysis.hexdigest(hash_.hash_type)
+        if digest != hash_.hash.lower():
+            part.discard()
+            raise exceptions.ChecksumMismatchException(
+                'Downloaded content has {} {}, expected {}'.format(hash_.hash_type, digest, hash_.hash))
+        part.commit()
+        self.evict(keep=part.path)
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used artifacts beyond max_age and max_size.
+
+        :param keep: Path of an artifact never removed, such as the one just stored, even if larger than max_size.
+        """
+        if self.max_size is None and self.max_age is None:
+            return
+        artifacts = []
+        for name in os.listdir(self.path):
+            if resources.Hash.get_hash_type(name) is None:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            artifacts.append((stat.st_mtime, stat.st_size, name))
+        artifacts.sort(reverse=True)
+        now = time.time()
+        total = 0
+        for mtime, size, name in artifacts:
+            total += size
+            if keep is not None and os.path.join(self.path, name) == keep:
+                continue
+            if (self.max_age is not None and now - mtime > self.max_age) or \
+                    (self.max_size is not None and total > self.max_size):
+                logger.debug('Evicting %s from the artifact store', name)
+                _remove(os.path.join(self.path, name))
@@ -9,19 +9,65 @@ DEFAULT_COMMUNITY = 'default'
 DEFAULT_SCAN_TIMEOUT = 60*15
 RESULT_CHUNK_SIZE = 100
 POLL_FREQUENCY = 1
+# adaptive polling
+EXPECTED_SCAN_WINDOW = 20
+POLL_NEAR_WINDOW_DELAY = 0.5
+POLL_MAX_DELAY = 15
 
 # HTTP settings
 DEFAULT_HTTP_TIMEOUT = 30
 DEFAULT_RETRIES = 0
 DEFAULT_BACKOFF = 1
 DEFAULT_RETRY_CODES = (502, 504)
+# requests per second ratelimit.RateLimiter allows each endpoint family, and the endpoints in each family
+RATE_LIMITS = {
+    'submission': 10,
+    'search': 20,
+    'hunt': 10,
+    'download': 20,
+}
+RATE_LIMIT_FAMILIES = {
+    '/consumer/submission': 'submission',
+    '/search': 'search',
+    '/hunt': 'hunt',
+    '/download': 'download',
+    '/consumer/download': 'download',
+}
+# times a request answered with 429 is sent again, and seconds paused when the response does not say how long
+RATE_LIMIT_RETRIES = 5
+RATE_LIMIT_BACKOFF = 1
+# longest pause asked by the server a request waits out, UsageLimitsExceededException is raised instead beyond it
+RATE_LIMIT_MAX_WAIT = 5*60
+# fraction of the configured rate regained every second after a 429, and the lowest rate requests slow down to
+RATE_LIMIT_RECOVERY = 0.05
+RATE_LIMIT_MIN = 0.1
 DEFAULT_USER_AGENT = 'polyswarm-api/{} ({}-{}-{}-{})'.format(
     _version.__version__, platform.machine(), platform.system(),
     platform.python_implementation(), platform.python_version(),
 )
 
+# seconds an engine list stored on disk is used before asking the server for changes
+ENGINE_CACHE_TTL = 60*60
+# endpoints cached by cache.ResponseCache by default, with the seconds their responses are kept
+RESPONSE_CACHE_TTLS = {
+    '/search/hash': 60*10,
+    '/search/instances': 60*10,
+    '/tags/link': 60,
+    '/tags/family': 60,
+}
+RESPONSE_CACHE_SIZE = 1024
+# bytes of responses kept on disk by cache.ResponseCache, and the fraction of it written between sweeps
+RESPONSE_CACHE_DISK_SIZE = 64*1024*1024
+RESPONSE_CACHE_SWEEP = 0.1
+# response status codes stored by cache.ResponseCache, not found hashes are looked up as often as known ones
+RESPONSE_CACHE_STATUS_CODES = (200, 404)
+
 # concurrent HTTP workers
 DEFAULT_WORKER_COUNT = 8
+# artifacts submit_many(dedup=True) searches ahead of their uploads, per worker
+DEDUP_SEARCH_AHEAD = 4
+# simultaneous connections of the asyncio client
+DEFAULT_ASYNC_CONNECTIONS = 100
 
 # API maximums
 MAX_HUNT_RESULTS = 20000
@@ -29,8 +75,16 @@ MAX_ARTIFACT_BATCH_SIZE = 256
 
 # Filesystem constants
 FILE_CHUNK_SIZE = 8192
+# block size when hashing local files, and the size from which the digests are computed on parallel threads
+HASH_CHUNK_SIZE = 1024*1024*8
+PARALLEL_HASH_MIN_SIZE = 1024*1024*4
 MAX_OPEN_FDS = 256
 # this results in worst case 32MB memory usage during downloads
 DOWNLOAD_CHUNK_SIZE = 1024*1024*4
+# attempts to finish a download with Range requests after the connection drops, and seconds between them
+DOWNLOAD_RESUME_ATTEMPTS = 5
+DOWNLOAD_RESUME_BACKOFF = 1
+# read size when parsing streamed result pages
+JSON_STREAM_CHUNK_SIZE = 1024*64
 
 MAX_SINCE_TIME_STREAM = 2 * 60 * 24
@@ -0,0 +1,186 @@
+import logging
+import os
+import sqlite3
+import stat as stat_
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from . import cache
+from . import const
+from .types import resources
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    sha1 TEXT NOT NULL,
+    md5 TEXT NOT NULL,
+    submitted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+'''
+# rows written between commits
+_COMMIT_EVERY = 1000
+
+CrawledFile = namedtuple('CrawledFile', ['path', 'size', 'sha256', 'sha1', 'md5', 'changed', 'submitted'])
+
+
+def _mtime_ns(stat):
+    # st_mtime_ns is python 3.3+
+    return getattr(stat, 'st_mtime_ns', None) or int(stat.st_mtime * 1e9)
+
+
+class HashIndex(object):
+    """
+    SQLite index of the hashes of local files, keyed by path.
+
+    An entry is only used while the inode, size and mtime of the file match the ones it was hashed with,
+    so a file is hashed again as soon as it changes. Entries also record whether the file was submitted.
+    """
+    def __init__(self, path=None):
+        """
+        :param path: SQLite database file, ~/.cache/polyswarm/hash_index.sqlite3 by default.
+        """
+        self.path = path or os.path.join(cache.default_cache_dir(), 'hash_index.sqlite3')
+        if self.path != ':memory:':
+            cache.makedirs(os.path.dirname(os.path.abspath(self.path)))
+        # crawl generators may be resumed from another thread than the one that created them
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        self._uncommitted = 0
+
+    def get(self, path, stat):
+        """Return the CrawledFile of path if it was indexed with the same inode, size and mtime, None otherwise."""
+        row = self._db.execute('SELECT inode, size, mtime_ns, sha256, sha1, md5, submitted FROM files WHERE path = ?',
+                               (path,)).fetchone()
+        if row is None or tuple(row[:3]) != (stat.st_ino, stat.st_size, _mtime_ns(stat)):
+            return None
+        return CrawledFile(path, row[1], row[3], row[4], row[5], False, bool(row[6]))
+
+    def put(self, path, stat, hashes):
+        """Index the hashes of path, as returned by all_hashes, and return its CrawledFile."""
+        sha256, sha1, md5 = [hash_.hash for hash_ in hashes]
+        self._db.execute('INSERT OR REPLACE INTO files (path, inode, size, mtime_ns, sha256, sha1, md5, submitted) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, 0)',
+                         (path, stat.st_ino, stat.st_size, _mtime_ns(stat), sha256, sha1, md5))
+        self._written()
+        return CrawledFile(path, stat.st_size, sha256, sha1, md5, True, False)
+
+    def submitted(self, sha256):
+        """Whether a file with this sha256 was submitted from any path."""
+        return self._db.execute('SELECT 1 FROM files WHERE sha256 = ? AND submitted = 1 LIMIT 1',
+                                (sha256,)).fetchone() is not None
+
+    def mark_submitted(self, path):
+        self._db.execute('UPDATE files SET submitted = 1 WHERE path = ?', (path,))
+        self._written()
+
+    def prune(self):
+        """Remove the entries of files that no longer exist."""
+        paths = [row[0] for row in self._db.execute('SELECT path FROM files')]
+        missing = [(path,) for path in paths if not os.path.isfile(path)]
+        self._db.executemany('DELETE FROM files WHERE path = ?', missing)
+        self.commit()
+        return len(missing)
+
+    def _written(self):
+        self._uncommitted += 1
+        if self._uncommitted >= _COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self._db.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def walk(root):
+    """Yield (path, stat) for every regular file under root, without following symbolic links."""
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError as e:
+            logger.warning('Skipping directory %s: %s', directory, e)
+            continue
+        subdirectories = []
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.lstat(path)
+            except OSError:
+                # removed since it was listed
+                continue
+            if stat_.S_ISDIR(stat.st_mode):
+                subdirectories.append(path)
+            elif stat_.S_ISREG(stat.st_mode):
+                yield path, stat
+        # walked in name order
+        directories.extend(reversed(subdirectories))
+
+
+def _hash(path):
+    with open(path, 'rb') as f:
+        return resources.all_hashes(f, parallel=False)
+
+
+def crawl(root, index, workers=const.DEFAULT_WORKER_COUNT):
+    """
+    Walk root and yield a CrawledFile for every regular file under it.
+
+    Files whose inode, size and mtime match their entry in the index are not read again. The others are
+    hashed on a pool of threads, with at most min(workers, MAX_OPEN_FDS) of them open at once, and indexed.
+    Unchanged files come first as the walk reaches them, hashed files as their hashing finishes.
+    Files that cannot be read are logged and skipped.
+
+    :param root: Directory to walk.
+    :param index: The HashIndex to read and update.
+    :param workers: Number of files hashed concurrently.
+    """
+    workers = max(1, min(workers, const.MAX_OPEN_FDS))
+    root = os.path.abspath(root)
+
+    def indexed(future):
+        path, stat = pending.pop(future)
+        try:
+            return index.put(path, stat, future.result())
+        except (IOError, OSError) as e:
+            logger.warning('Skipping file %s: %s', path, e)
+            return None
+
+    pending = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, stat in walk(root):
+                crawled = index.get(path, stat)
+                if crawled is not None:
+                    yield crawled
+                    continue
+                if len(pending) >= workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for crawled in filter(None, [indexed(future) for future in done]):
+                        yield crawled
+                pending[executor.submit(_hash, path)] = (path, stat)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for crawled in filter(None, [indexed(future) for future in done]):
+                    yield crawled
+    finally:
+        index.commit()
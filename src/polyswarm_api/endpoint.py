@@ -1,19 +1,23 @@
+import itertools
 import logging
 import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from future.utils import raise_from
 from copy import deepcopy
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 from . import const
 from . import http
 from . import exceptions
+from . import jsonstream
 from .types import resources
 
-try:
-    from json.decoder import JSONDecodeError
-except ImportError:
-    JSONDecodeError = ValueError
-
-
 logger = logging.getLogger(__name__)
 
 
@@ -27,7 +31,8 @@ class RequestParamsEncoder(json.JSONEncoder):
 
 class PolyswarmRequest(object):
     """This class holds a requests-compatible dictionary and extra information we need to parse the response."""
-    def __init__(self, api_instance, request_parameters, key=None, result_parser=None, json_response=True, **kwargs):
+    def __init__(self, api_instance, request_parameters, key=None, result_parser=None, json_response=True,
+                 stream_results=False, **kwargs):
         logger.debug('Creating PolyswarmRequest instance.\nRequest parameters: %s\nResult parser: %s',
                      request_parameters, result_parser.__name__)
         self.api_instance = api_instance
@@ -38,6 +43,8 @@ class PolyswarmRequest(object):
         self.request_parameters = request_parameters
         self.result_parser = result_parser
         self.json_response = json_response
+        # parse the items of a result list one at a time straight from the response stream
+        self.stream_results = stream_results
         self.raw_result = None
         self.status_code = None
         self.status = None
@@ -54,15 +61,81 @@ class PolyswarmRequest(object):
     def execute(self):
         logger.debug('Executing request.')
         self.request_parameters.setdefault('timeout', self.timeout)
-        if not self.json_response:
+        if not self.json_response or self.stream_results:
             self.request_parameters.setdefault('stream', True)
-        self.raw_result = self.session.request(**self.request_parameters)
-        logger.debug('Request returned code %s with content:\n%s',
-                     self.raw_result.status_code, self.raw_result.content)
+        cache_key = self._cache_key()
+        self.raw_result = self.api_instance.response_cache.get(cache_key) if cache_key else None
+        if self.raw_result is None:
+            self.raw_result = self._send()
+            self._cache_response(cache_key)
+        if self.json_response and not self.stream_results:
+            logger.debug('Request returned code %s with content:\n%s',
+                         self.raw_result.status_code, self.raw_result.content)
+        else:
+            # touching content would read the whole streamed body into memory
+            logger.debug('Request returned code %s', self.raw_result.status_code)
         if self.result_parser is not None:
             self.parse_result(self.raw_result)
         return self
 
+    def _send(self):
+        """
+        Send the request, paced by the rate limiter of the api instance if it has one.
+
+        Responses with status 429 are sent again once the rate limiter allows it, up to its number of retries.
+        """
+        rate_limiter = self.api_instance.rate_limiter
+        if rate_limiter is None:
+            return self.session.request(**self.request_parameters)
+        path = self._path()
+        positions = self._file_positions()
+        for attempt in range(rate_limiter.retries + 1):
+            if attempt:
+                self._rewind_files(positions)
+            rate_limiter.acquire(path)
+            response = self.session.request(**self.request_parameters)
+            if not rate_limiter.update(path, response.status_code, response.headers) or \
+                    attempt == rate_limiter.retries:
+                return response
+            logger.debug('Request to %s rate limited, sending it again', path)
+            response.close()
+
+    def _file_positions(self):
+        files = self.request_parameters.get('files') or {}
+        handles = [getattr(value[1], 'handle', value[1]) for value in files.values()]
+        return [(handle, handle.tell()) for handle in handles if hasattr(handle, 'seek')]
+
+    def _rewind_files(self, positions):
+        # the uploaded files were read up to their end by the previous attempt
+        for handle, position in positions:
+            handle.seek(position)
+
+    def _path(self):
+        """The url of this request relative to the api uri."""
+        url = self.request_parameters['url']
+        return url[len(self.api_instance.uri):] if url.startswith(self.api_instance.uri) else url
+
+    def _cache_key(self):
+        """The key the response of this request is cached under, or None if it is not cached."""
+        response_cache = self.api_instance.response_cache
+        if response_cache is None:
+            return None
+        url = self.request_parameters['url']
+        path = self._path()
+        if self.request_parameters['method'].upper() != 'GET':
+            # so that changes made through this client are seen by the next read
+            response_cache.invalidate(path)
+            return None
+        if not self.json_response or self.stream_results:
+            return None
+        authorization = (self.request_parameters.get('headers') or {}).get('Authorization',
+                                                                          self.session.headers.get('Authorization'))
+        return response_cache.key(path, 'GET', url, self.request_parameters.get('params'), authorization)
+
+    def _cache_response(self, cache_key):
+        if cache_key and self.raw_result.status_code in const.RESPONSE_CACHE_STATUS_CODES:
+            self.api_instance.response_cache.put(cache_key, self.raw_result)
+
     def _bad_status_message(self):
         request_parameters = json.dumps(self.request_parameters, indent=4, sort_keys=True, cls=RequestParamsEncoder)
         message = "Error when running the request:\n{}\n" \
@@ -74,112 +147,263 @@ class PolyswarmRequest(object):
             message = '{}\nErrors:\n{}'.format(message, '\n'.join(str(error) for error in self.errors))
         return message
 
+    def _invalid_json(self):
+        if self.status_code == 404:
+            return exceptions.NotFoundException(self, 'The requested endpoint does not exist.')
+        else:
+            return exceptions.RequestException(self, 'Server returned non-JSON response.')
+
     def _extract_json_body(self, result):
-        self.json = result.json()
+        try:
+            self.json = self.api_instance.json_decoder(result.content)
+        except ValueError as e:
+            raise raise_from(self._invalid_json(), e)
         self.result = self.json.get('result')
         self.status = self.json.get('status')
         self.errors = self.json.get('errors')
 
+    def _extract_streamed_body(self, result):
+        """
+        Decode the body up to the result list and return the stream left at its first item.
+
+        If the result is not a list the whole body is decoded and None is returned.
+        """
+        stream = jsonstream.ObjectStream(result.iter_content(const.JSON_STREAM_CHUNK_SIZE),
+                                         loads=self.api_instance.json_decoder)
+        try:
+            self.json = stream.read_until(('result', 'results'))
+        except ValueError as e:
+            raise raise_from(self._invalid_json(), e)
+        self.result = self.json.get('result')
+        self.status = self.json.get('status')
+        self.errors = self.json.get('errors')
+        return stream if stream.key is not None else None
+
+    def _streamed_results(self, stream, response):
+        try:
+            for item in stream.items():
+                yield self.result_parser.parse_result(self.api_instance, item, **self.parser_kwargs)
+            # the members after the result list, the api usually sends them first
+            self.json.update(stream.read_until(()))
+        except jsonstream.JSONStreamError as e:
+            raise raise_from(self._invalid_json(), e)
+        finally:
+            response.close()
+        self.status = self.json.get('status')
+        self.errors = self.json.get('errors')
+        self._read_page_fields()
+
+    def _read_page_fields(self):
+        self.total = self.json.get('total')
+        self.limit = self.json.get('limit')
+        self.offset = self.json.get('offset')
+        self.order_by = self.json.get('order_by')
+        self.direction = self.json.get('direction')
+        self.has_more = self.json.get('has_more')
+
     def parse_result(self, result):
         logger.debug('Parsing request results.')
         self.status_code = result.status_code
-        try:
-            if self.status_code // 100 != 2:
-                self._extract_json_body(result)
-                if self.status_code == 429:
-                    message = '{} This may mean you need to purchase a ' \
-                              'larger package, or that you have exceeded ' \
-                              'rate limits. If you continue to have issues, ' \
-                              'please contact us at info@polyswarm.io.'.format(self.result)
-                    raise exceptions.UsageLimitsExceededException(self, message)
-                if self.status_code == 404:
-                    raise exceptions.NotFoundException(self, self.result)
-                raise exceptions.RequestException(self, self._bad_status_message())
-            elif self.status_code == 204:
-                raise exceptions.NoResultsException(self, 'The request returned no results.')
-            elif self.json_response:
+        if self.status_code == 304:
+            raise exceptions.NotModifiedException(self, 'The resource was not modified.')
+        elif self.status_code // 100 != 2:
+            self._extract_json_body(result)
+            if self.status_code == 429:
+                message = '{} This may mean you need to purchase a ' \
+                          'larger package, or that you have exceeded ' \
+                          'rate limits. If you continue to have issues, ' \
+                          'please contact us at info@polyswarm.io.'.format(self.result)
+                raise exceptions.UsageLimitsExceededException(self, message)
+            if self.status_code == 404:
+                raise exceptions.NotFoundException(self, self.result)
+            raise exceptions.RequestException(self, self._bad_status_message())
+        elif self.status_code == 204:
+            raise exceptions.NoResultsException(self, 'The request returned no results.')
+        elif self.json_response:
+            stream = None
+            if self.stream_results:
+                stream = self._extract_streamed_body(result)
+            else:
                 self._extract_json_body(result)
-                self.total = self.json.get('total')
-                self.limit = self.json.get('limit')
-                self.offset = self.json.get('offset')
-                self.order_by = self.json.get('order_by')
-                self.direction = self.json.get('direction')
-                self.has_more = self.json.get('has_more')
-                if 'result' in self.json:
-                    result = self.json['result']
-                elif 'results' in self.json:
-                    result = self.json['results']
-                else:
-                    raise exceptions.RequestException(
-                        self,
-                        'The response standard must contain either the "result" or "results" key.'
-                    )
-                if isinstance(result, list):
-                    self.result = self.result_parser.parse_result_list(self.api_instance, result, **self.parser_kwargs)
-                else:
-                    self.result = self.result_parser.parse_result(self.api_instance, result, **self.parser_kwargs)
+            self._read_page_fields()
+            if stream is not None:
+                # page fields sent after the results are only known once they are consumed
+                self.result = self._streamed_results(stream, result)
+                return
+            if 'result' in self.json:
+                result = self.json['result']
+            elif 'results' in self.json:
+                result = self.json['results']
             else:
-                self.result = self.result_parser.parse_result(self.api_instance,
-                                                              result.iter_content(const.DOWNLOAD_CHUNK_SIZE),
-                                                              **self.parser_kwargs)
-        except JSONDecodeError as e:
-            if self.status_code == 404:
-                raise raise_from(exceptions.NotFoundException(self, 'The requested endpoint does not exist.'), e)
+                raise exceptions.RequestException(
+                    self,
+                    'The response standard must contain either the "result" or "results" key.'
+                )
+            if isinstance(result, list):
+                self.result = self.result_parser.parse_result_list(self.api_instance, result, **self.parser_kwargs)
             else:
-                raise raise_from(exceptions.RequestException(self, 'Server returned non-JSON response.'), e)
+                self.result = self.result_parser.parse_result(self.api_instance, result, **self.parser_kwargs)
+        else:
+            self.result = self.result_parser.parse_result(self.api_instance,
+                                                          result.iter_content(const.DOWNLOAD_CHUNK_SIZE),
+                                                          **self.parser_kwargs)
 
     def __iter__(self):
         return self.consume_results()
 
-    def consume_results(self):
+    def consume_results(self, prefetch=None, workers=None, ordered=True):
+        """
+        Yield the results of this request, fetching the following pages as needed.
+
+        :param prefetch: Number of pages to fetch ahead on a background thread while the current page is consumed.
+            Defaults to the prefetch setting of the api instance, 0 fetches pages only when they are reached.
+        :param workers: When the response carries the total number of results, fetch all remaining pages
+            concurrently with this many workers instead of walking them one after another.
+        :param ordered: When fetching pages concurrently, yield results in page order (True)
+            or as soon as each page arrives (False).
+
+        Streamed results are always fetched one page after another, since prefetching or fetching
+        pages concurrently would hold whole pages in memory again.
+        """
+        if prefetch is None:
+            prefetch = self.api_instance.prefetch
+        if self.stream_results:
+            pages = self._pages()
+        elif workers and workers > 1 and self._page_windows() is not None:
+            pages = self._parallel_pages(workers, ordered)
+        elif prefetch:
+            pages = self._prefetched_pages(prefetch)
+        else:
+            pages = self._pages()
         # StopIteration is deprecated
         # As per https://www.python.org/dev/peps/pep-0479/
         # We simply return upon termination condition
-        request = self
-        while True:
+        for request in pages:
             # consume items items from list if iterable
             # of yield the single result if not
             try:
-                for result in request.result:
-                    yield result
+                results = iter(request.result)
             except TypeError:
                 yield request.result
                 # if the result is not a list, there is not next page
                 return
+            for result in results:
+                yield result
 
+    def _pages(self):
+        request = self
+        while True:
+            yield request
             # if the server indicates that there are no more results, return
             if not request.has_more:
                 return
             # try to get the next page and execute the request
             request = request.next_page().execute()
 
+    def _prefetched_pages(self, depth):
+        # at most `depth` executed pages wait in the buffer, bounding memory usage
+        pages = queue.Queue(maxsize=depth)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def fetch():
+            try:
+                request = self
+                while request.has_more and not stop.is_set():
+                    request = request.next_page().execute()
+                    put(request)
+            except Exception as e:
+                put(e)
+            finally:
+                put(None)
+
+        if not self.has_more:
+            yield self
+            return
+        fetcher = threading.Thread(target=fetch, name='polyswarm-prefetch')
+        fetcher.daemon = True
+        fetcher.start()
+        try:
+            yield self
+            while True:
+                page = pages.get()
+                if page is None:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            # also stops the fetcher when the consumer abandons the generator early
+            stop.set()
+
+    def _page_windows(self):
+        """The offsets of all the remaining pages, or None if they can not be computed up front."""
+        if not self.has_more:
+            return None
+        try:
+            return range(int(self.offset), int(self.total), int(self.limit))
+        except (TypeError, ValueError):
+            return None
+
+    def _parallel_pages(self, workers, ordered):
+        # results may shift between requests if new entries arrive while we fetch
+        offsets = iter(self._page_windows())
+        yield self
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # keep at most `workers` pages in flight or waiting to be consumed
+            futures = deque(executor.submit(self._page_at(offset, self.limit).execute)
+                            for offset in itertools.islice(offsets, workers))
+            while futures:
+                if ordered:
+                    future = futures.popleft()
+                else:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    future = done.pop()
+                    futures.remove(future)
+                page = future.result()
+                for offset in itertools.islice(offsets, 1):
+                    futures.append(executor.submit(self._page_at(offset, self.limit).execute))
+                yield page
+
     def next_page(self):
+        return self._page_at(self.offset, self.limit)
+
+    def _page_at(self, offset, limit):
         new_parameters = deepcopy(self.request_parameters)
         params = new_parameters.setdefault('params', {})
         if isinstance(params, dict):
-            params['offset'] = self.offset
-            params['limit'] = self.limit
+            params['offset'] = offset
+            params['limit'] = limit
         else:
             params = [p for p in params if p[0] != 'offset' and p[0] != 'limit']
-            params.extend([('offset', self.offset), ('limit', self.limit)])
+            params.extend([('offset', offset), ('limit', limit)])
             new_parameters['params'] = params
-        return PolyswarmRequest(
+        return type(self)(
             self.api_instance,
             new_parameters,
             result_parser=self.result_parser,
+            stream_results=self.stream_results,
         )
 
 
 class PolyswarmRequestGenerator(object):
     """ This class will return PolyswarmRequests"""
-    def __init__(self, api_instance):
+    def __init__(self, api_instance, request_class=PolyswarmRequest):
         logger.debug('Creating PolyswarmRequestGenerator instance')
         self.api_instance = api_instance
+        self.request_class = request_class
         self.uri = api_instance.uri
         self.community = api_instance.community
 
-    def download(self, hash_value, hash_type, handle=None):
-        return PolyswarmRequest(
+    def download(self, hash_value, hash_type, handle=None, analysis=None):
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -189,11 +413,12 @@ class PolyswarmRequestGenerator(object):
             json_response=False,
             result_parser=resources.LocalHandle,
             handle=handle,
+            analysis=analysis,
         )
 
     def download_archive(self, u, handle=None):
         """ This method is special, in that it is simply for downloading from S3 """
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -207,7 +432,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def stream(self, since=const.MAX_SINCE_TIME_STREAM):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -218,7 +443,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def search_hash(self, hash_value, hash_type):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -228,10 +453,11 @@ class PolyswarmRequestGenerator(object):
                 },
             },
             result_parser=resources.ArtifactInstance,
+            stream_results=self.api_instance.stream_results,
         )
 
     def search_url(self, url):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -241,10 +467,11 @@ class PolyswarmRequestGenerator(object):
                 },
             },
             result_parser=resources.ArtifactInstance,
+            stream_results=self.api_instance.stream_results,
         )
 
     def list_scans(self, hash_value):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -257,7 +484,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def search_metadata(self, query):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -267,25 +494,29 @@ class PolyswarmRequestGenerator(object):
                 },
             },
             result_parser=resources.Metadata,
+            stream_results=self.api_instance.stream_results,
         )
 
-    def submit(self, artifact, artifact_name, artifact_type):
-        return PolyswarmRequest(
-            self.api_instance,
-            {
-                'method': 'POST',
-                'url': '{}/consumer/submission/{}'.format(self.uri, self.community),
-                'files': {
-                    'file': (artifact_name, artifact),
-                },
-                # very oddly, when included in files parameter this errors out
-                'data': {'artifact-type': artifact_type}
+    def submit(self, artifact, artifact_name, artifact_type, progress=None):
+        parameters = {
+            'method': 'POST',
+            'url': '{}/consumer/submission/{}'.format(self.uri, self.community),
+            'files': {
+                'file': (artifact_name, artifact),
             },
+            # very oddly, when included in files parameter this errors out
+            'data': {'artifact-type': artifact_type}
+        }
+        if progress is not None:
+            parameters['progress'] = progress
+        return self.request_class(
+            self.api_instance,
+            parameters,
             result_parser=resources.ArtifactInstance,
         )
 
     def rescan(self, hash_value, hash_type):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'POST',
@@ -295,7 +526,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def rescanid(self, submission_id):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'POST',
@@ -305,7 +536,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def lookup_uuid(self, submission_id):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -314,13 +545,13 @@ class PolyswarmRequestGenerator(object):
             result_parser=resources.ArtifactInstance,
         )
 
-    def get_engines(self):
-        return PolyswarmRequest(
+    def get_engines(self, etag=None):
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
                 'url': '{}/microengines/list'.format(self.uri),
-                'headers': {'Authorization': None},
+                'headers': {'Authorization': None, 'If-None-Match': etag},
             },
             result_parser=resources.Engine,
         )
@@ -337,14 +568,14 @@ class PolyswarmRequestGenerator(object):
             parameters['json']['yara'] = rule
         if rule_id:
             parameters['json']['rule_id'] = str(int(rule_id))
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.Hunt,
         )
 
     def get_live_hunt(self, hunt_id=None):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -355,7 +586,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def update_live_hunt(self, hunt_id=None, active=False):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'PUT',
@@ -367,7 +598,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def delete_live_hunt(self, hunt_id):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'DELETE',
@@ -387,7 +618,7 @@ class PolyswarmRequestGenerator(object):
             parameters['params']['since'] = since
         if all_ is not None:
             parameters['params']['all'] = int(all_)
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.Hunt,
@@ -406,10 +637,11 @@ class PolyswarmRequestGenerator(object):
             req['params']['tag'] = tag
         if rule_name is not None:
             req['params']['rule_name'] = rule_name
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             req,
             result_parser=resources.HuntResult,
+            stream_results=self.api_instance.stream_results,
         )
 
     def create_historical_hunt(self, rule=None, rule_id=None, ruleset_name=None):
@@ -424,14 +656,14 @@ class PolyswarmRequestGenerator(object):
             parameters['json']['yara'] = rule
         if rule_id:
             parameters['json']['rule_id'] = str(int(rule_id))
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.Hunt,
         )
 
     def get_historical_hunt(self, hunt_id):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -442,7 +674,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def delete_historical_hunt(self, hunt_id):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'DELETE',
@@ -460,7 +692,7 @@ class PolyswarmRequestGenerator(object):
         }
         if since is not None:
             parameters['params']['since'] = since
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.Hunt,
@@ -476,10 +708,11 @@ class PolyswarmRequestGenerator(object):
             req['params']['tag'] = tag
         if rule_name is not None:
             req['params']['rule_name'] = rule_name
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             req,
             result_parser=resources.HuntResult,
+            stream_results=self.api_instance.stream_results,
         )
 
     def create_tag_link(self, sha256, tags=None, families=None):
@@ -492,14 +725,14 @@ class PolyswarmRequestGenerator(object):
             parameters['json']['tags'] = tags
         if families:
             parameters['json']['families'] = families
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.TagLink,
         )
 
     def get_tag_link(self, sha256):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -520,14 +753,14 @@ class PolyswarmRequestGenerator(object):
             parameters['json']['tags'] = tags
         if families:
             parameters['json']['families'] = families
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.TagLink,
         )
 
     def delete_tag_link(self, sha256):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'DELETE',
@@ -551,7 +784,7 @@ class PolyswarmRequestGenerator(object):
             parameters['params'].extend(('or_tag', p) for p in or_tags)
         if or_families:
             parameters['params'].extend(('or_family', p) for p in or_families)
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.TagLink,
@@ -563,14 +796,14 @@ class PolyswarmRequestGenerator(object):
             'url': '{}/tags/tag'.format(self.uri),
             'json': {'name': name},
         }
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.Tag,
         )
 
     def get_tag(self, name):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -581,7 +814,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def delete_tag(self, name):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'DELETE',
@@ -592,7 +825,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def list_tag(self):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -607,14 +840,14 @@ class PolyswarmRequestGenerator(object):
             'url': '{}/tags/family'.format(self.uri),
             'json': {'name': name},
         }
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.MalwareFamily,
         )
 
     def get_family(self, name):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -625,7 +858,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def delete_family(self, name):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'DELETE',
@@ -636,7 +869,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def update_family(self, family_name, emerging=True):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'PUT',
@@ -650,7 +883,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def list_family(self):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -670,14 +903,14 @@ class PolyswarmRequestGenerator(object):
         }
         if description:
             parameters['json']['description'] = description
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.YaraRuleset,
         )
 
     def get_ruleset(self, ruleset_id=None):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -700,14 +933,14 @@ class PolyswarmRequestGenerator(object):
             parameters['json']['yara'] = rules
         if description:
             parameters['json']['description'] = description
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.YaraRuleset,
         )
 
     def delete_ruleset(self, ruleset_id):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'DELETE',
@@ -718,7 +951,7 @@ class PolyswarmRequestGenerator(object):
         )
 
     def list_ruleset(self):
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             {
                 'method': 'GET',
@@ -737,7 +970,7 @@ class PolyswarmRequestGenerator(object):
             parameters['json']['analyses'] = analyses
         if skip_es:
             parameters['json']['skip_es'] = skip_es
-        return PolyswarmRequest(
+        return self.request_class(
             self.api_instance,
             parameters,
             result_parser=resources.ArtifactInstance,
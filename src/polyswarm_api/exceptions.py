@@ -14,6 +14,10 @@ class TimeoutException(PolyswarmAPIException):
     pass
 
 
+class ChecksumMismatchException(PolyswarmAPIException):
+    pass
+
+
 #########################################
 # Request layer exceptions
 #########################################
@@ -36,6 +40,10 @@ class NoResultsException(RequestException):
     pass
 
 
+class NotModifiedException(RequestException):
+    pass
+
+
 #########################################
 # Types layer exceptions
 #########################################
@@ -1,13 +1,46 @@
+import json
 import logging
+import sys
 import requests
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 
 from . import const
+from . import multipart
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
 
 logger = logging.getLogger(__name__)
 
 
+def _stdlib_loads(content):
+    # json.loads only accepts bytes from python 3.6 on
+    if isinstance(content, bytes) and (3, 0) <= sys.version_info < (3, 6):
+        content = content.decode('utf-8')
+    return json.loads(content)
+
+
+def default_json_decoder():
+    """
+    Return the fastest json decoder installed, falling back to the standard library.
+
+    Decoders take the raw bytes of a response body and raise ValueError on invalid json.
+    """
+    if orjson is not None:
+        return orjson.loads
+    if ujson is not None:
+        return ujson.loads
+    return _stdlib_loads
+
+
 class PolyswarmHTTP(requests.Session):
     def __init__(self, key, retries, user_agent=const.DEFAULT_USER_AGENT):
         super(PolyswarmHTTP, self).__init__()
@@ -33,6 +66,28 @@ class PolyswarmHTTP(requests.Session):
         self.mount('http://', adapter)
         self.mount('https://', adapter)
 
+    def request(self, method, url, params=None, data=None, headers=None, cookies=None, files=None, **kwargs):
+        """
+        Send a request like requests.Session.request, with multipart bodies streamed as they are sent.
+
+        requests encodes files in memory before sending anything, so form fields and files are handed
+        to a MultipartEncoder instead. Takes the arguments of requests.Session.request, plus:
+
+        :param progress: Callable called with (bytes sent, total bytes) while a multipart body is sent.
+        """
+        progress = kwargs.pop('progress', None)
+        if files:
+            encoder = multipart.MultipartEncoder(data, files, progress=progress)
+            headers = dict(headers or {})
+            headers['Content-Type'] = encoder.content_type
+            data = encoder
+        try:
+            return super(PolyswarmHTTP, self).request(method, url, params=params, data=data, headers=headers,
+                                                      cookies=cookies, **kwargs)
+        finally:
+            if files:
+                encoder.close()
+
     def set_auth(self, key):
         if key:
             self.headers.update({'Authorization': key})
@@ -44,3 +99,19 @@ class PolyswarmHTTP(requests.Session):
             self.headers.update({'User-Agent': ua})
         else:
             self.headers.pop('User-Agent', None)
+
+
+class BufferedResponse(object):
+    """A minimal stand-in for requests.Response, built from a body that was already read."""
+    def __init__(self, status_code, content, headers=None, url=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.url = url
+
+    def json(self):
+        return _stdlib_loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
@@ -0,0 +1,186 @@
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# the rest of a string after its opening quote, the characters that open or close a nested value
+# and a number or literal, used to find where an item ends before handing it to the decoder
+_STRING_END = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_SCALAR_END = re.compile(r'[^ \t\n\r,\]}]*')
+_decoder = json.JSONDecoder()
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+class ObjectStream(object):
+    """
+    Incrementally parse a json object from an iterable of byte chunks.
+
+    Members are decoded one at a time and the items of an array member can be streamed one by one,
+    so only the chunk being read and the value being decoded are held in memory.
+    """
+    def __init__(self, chunks, loads=None):
+        """
+        :param chunks: Iterable of the bytes of the json object.
+        :param loads: Callable decoding the items of an array member from bytes. Defaults to the stdlib json.
+        """
+        self._chunks = iter(chunks)
+        self._loads = loads
+        self._decode = codecs.getincrementaldecoder('utf-8')().decode
+        self._buffer = u''
+        self._pos = 0
+        self._eof = False
+        self._first = True
+        self._closed = False
+        # the key of the array member the stream stopped at in read_until
+        self.key = None
+        self._expect(u'{')
+
+    def read_until(self, keys):
+        """
+        Decode members into a dict until reaching an array member under one of the given keys.
+
+        If such a member is found its key is set in self.key and the stream is left at its first item,
+        otherwise the whole object is read and self.key is None.
+        """
+        members = {}
+        self.key = None
+        key = self._next_key()
+        while key is not None:
+            if key in keys and self._skip() == u'[':
+                self.key = key
+                return members
+            members[key] = self._value()
+            key = self._next_key()
+        return members
+
+    def items(self):
+        """Yield the items of the array the stream stopped at, one at a time."""
+        self._expect(u'[')
+        if self._skip() == u']':
+            self._pos += 1
+            return
+        while True:
+            yield self._item() if self._loads is not None else self._value()
+            if self._expect(u',]') == u']':
+                return
+
+    def _next_key(self):
+        if self._closed:
+            return None
+        if self._first:
+            self._first = False
+            if self._skip() == u'}':
+                self._pos += 1
+                self._closed = True
+                return None
+        elif self._expect(u',}') == u'}':
+            self._closed = True
+            return None
+        if self._skip() != u'"':
+            raise JSONStreamError('Expecting property name at char {}'.format(self._pos))
+        key = self._value()
+        self._expect(u':')
+        return key
+
+    def _fill(self, size=1):
+        """Read at least size more characters, or up to the end of the stream."""
+        if self._eof:
+            return False
+        chunks = []
+        read = 0
+        while read < size:
+            try:
+                chunk = self._decode(next(self._chunks))
+            except StopIteration:
+                self._eof = True
+                chunk = self._decode(b'', True)
+                size = 0
+            chunks.append(chunk)
+            read += len(chunk)
+        # drop what was already parsed, so the buffer never holds more than the current value
+        self._buffer = self._buffer[self._pos:] + u''.join(chunks)
+        self._pos = 0
+        return True
+
+    def _skip(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise JSONStreamError('Unexpected end of json stream')
+
+    def _expect(self, chars):
+        char = self._skip()
+        if char not in chars:
+            raise JSONStreamError('Expecting {!r} at char {}, got {!r}'.format(chars, self._pos, char))
+        self._pos += 1
+        return char
+
+    def _value(self):
+        if self._skip() not in u'"[{':
+            # a number may be cut anywhere, even right after its '.' or 'e', where it would still decode.
+            # Read on until its end is in the buffer before decoding it
+            while _value_end(self._buffer, self._pos) is None and self._fill(len(self._buffer) - self._pos):
+                pass
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except ValueError as e:
+                # most likely the value is cut at the end of the buffer. Read at least as much again
+                # before retrying, so a value spread over many small chunks is not decoded over and over
+                if not self._fill(len(self._buffer) - self._pos):
+                    raise JSONStreamError(str(e))
+                continue
+            self._pos = end
+            return value
+
+    def _item(self):
+        self._skip()
+        while True:
+            end = _value_end(self._buffer, self._pos)
+            if end is not None:
+                break
+            # cut at the end of the buffer, read at least as much again before scanning it again
+            if not self._fill(len(self._buffer) - self._pos):
+                end = len(self._buffer)
+                break
+        try:
+            value = self._loads(self._buffer[self._pos:end].encode('utf-8'))
+        except ValueError as e:
+            raise JSONStreamError(str(e))
+        self._pos = end
+        return value
+
+
+def _value_end(buffer, pos):
+    """Index right after the json value starting at pos, or None if it may continue past the end of buffer."""
+    char = buffer[pos]
+    if char == u'"':
+        match = _STRING_END.match(buffer, pos + 1)
+        return match.end() if match else None
+    if char not in u'[{':
+        end = _SCALAR_END.match(buffer, pos).end()
+        return end if end < len(buffer) else None
+    depth = 0
+    while True:
+        match = _STRUCTURE.search(buffer, pos)
+        if match is None:
+            return None
+        char = match.group()
+        pos = match.end()
+        if char == u'"':
+            match = _STRING_END.match(buffer, pos)
+            if match is None:
+                return None
+            pos = match.end()
+        elif char in u'[{':
+            depth += 1
+        else:
+            depth -= 1
+            if not depth:
+                return pos
@@ -0,0 +1,167 @@
+import binascii
+import io
+import mmap
+import os
+
+from urllib3.fields import RequestField
+
+
+def _headers(name, filename=None, content_type=None):
+    field = RequestField(name, b'', filename=filename)
+    field.make_multipart(content_type=content_type)
+    return field.render_headers().encode('utf-8')
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+
+class _BufferPart(object):
+    """Content already in memory, sent as slices of a memoryview so it is never copied."""
+    def __init__(self, view):
+        self.view = view
+        self.length = len(view)
+
+    def read(self, offset, size):
+        return self.view[offset:offset + size]
+
+    def close(self):
+        if hasattr(self.view, 'release'):
+            self.view.release()
+
+
+class _FilePart(object):
+    """Content of a file handle, from its position when encoding starts, read only as it is sent."""
+    def __init__(self, handle):
+        self.handle = handle
+        try:
+            self.start = handle.tell()
+            handle.seek(0, os.SEEK_END)
+            self.length = handle.tell() - self.start
+            handle.seek(self.start)
+        except (AttributeError, IOError, OSError, ValueError):
+            # not seekable, the body is sent with chunked transfer encoding
+            self.start = None
+            self.length = None
+
+    def read(self, offset, size):
+        if self.start is not None:
+            self.handle.seek(self.start + offset)
+            size = min(size, self.length - offset)
+        return self.handle.read(size)
+
+    def close(self):
+        pass
+
+
+def _source_part(source):
+    # LocalArtifact and LocalHandle wrap the actual file
+    source = getattr(source, 'handle', source)
+    getbuffer = getattr(source, 'getbuffer', None)
+    if getbuffer is not None:
+        return _BufferPart(getbuffer()[source.tell():])
+    if not hasattr(source, 'read'):
+        # bytes, bytearray or memoryview
+        return _BufferPart(memoryview(source))
+    if isinstance(source, mmap.mmap):
+        try:
+            return _BufferPart(memoryview(source))
+        except TypeError:
+            # python 2 mmaps do not expose the buffer interface memoryview needs
+            pass
+    return _FilePart(source)
+
+
+class MultipartEncoder(object):
+    """
+    A multipart/form-data body read as it is sent, instead of being built in memory beforehand.
+
+    Files are read from their handles a block at a time as the connection asks for them. In memory sources
+    (bytes, memoryview, mmap or BytesIO) are sent as slices of a memoryview without being copied. The encoding
+    is the one requests and urllib3 produce, fields first and files next.
+    """
+    def __init__(self, fields=None, files=None, boundary=None, progress=None):
+        """
+        :param fields: Dict of form field names to values.
+        :param files: Dict of form field names to (file_name, source) or (file_name, source, content_type) tuples.
+            A source is a file-like, a LocalArtifact, or bytes, memoryview and mmap objects.
+        :param boundary: Multipart boundary, random by default.
+        :param progress: Callable called with (bytes sent, total bytes) as the body is read. The total is None
+            when a source is not seekable.
+        """
+        self.boundary = boundary or binascii.hexlify(os.urandom(16)).decode('ascii')
+        self.content_type = 'multipart/form-data; boundary={}'.format(self.boundary)
+        self.progress = progress
+        self._parts = []
+        for name, value in (fields or {}).items():
+            self._add_bytes(_headers(name) + _to_bytes(value) + b'\r\n')
+        for name, value in (files or {}).items():
+            file_name, source = value[0], value[1]
+            content_type = value[2] if len(value) > 2 else None
+            self._add_bytes(_headers(name, file_name, content_type))
+            self._parts.append(_source_part(source))
+            self._parts.append(_BufferPart(memoryview(b'\r\n')))
+        self._parts.append(_BufferPart(memoryview('--{}--\r\n'.format(self.boundary).encode('latin-1'))))
+        lengths = [part.length for part in self._parts]
+        # requests reads the body size from this attribute, and falls back to chunked encoding when it is None
+        self.len = None if None in lengths else sum(lengths)
+        self._index = 0
+        self._part_offset = 0
+        self._position = 0
+
+    def _add_bytes(self, content):
+        self._parts.append(_BufferPart(memoryview('--{}\r\n'.format(self.boundary).encode('latin-1') + content)))
+
+    def read(self, size=-1):
+        """
+        Read the next block of the body, at most size bytes and never more than one part at a time.
+
+        Blocks of in memory parts are memoryview slices, reading everything at once with size=-1 copies them.
+        """
+        if size is None or size < 0:
+            blocks = iter(lambda: self.read(io.DEFAULT_BUFFER_SIZE), b'')
+            return b''.join(memoryview(block).tobytes() for block in blocks)
+        while size and self._index < len(self._parts):
+            block = self._parts[self._index].read(self._part_offset, size)
+            if len(block):
+                self._part_offset += len(block)
+                self._position += len(block)
+                if self.progress is not None:
+                    self.progress(self._position, self.len)
+                return block
+            self._index += 1
+            self._part_offset = 0
+        return b''
+
+    def __iter__(self):
+        """
+        Yield the blocks of the body.
+
+        requests sends iterable bodies without a length, those of sources that are not seekable, with chunked
+        transfer encoding. Without this it would announce an empty body.
+        """
+        return iter(lambda: self.read(io.DEFAULT_BUFFER_SIZE), b'')
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """Move to an absolute position, so the body can be sent again when a request is retried or redirected."""
+        if whence != os.SEEK_SET or self.len is None:
+            raise io.UnsupportedOperation('MultipartEncoder only seeks to absolute positions of seekable sources')
+        self._position = offset
+        for self._index, part in enumerate(self._parts):
+            if offset < part.length:
+                break
+            offset -= part.length
+        else:
+            self._index = len(self._parts)
+        self._part_offset = offset
+        return self._position
+
+    def close(self):
+        """Release the views over in memory sources, a BytesIO cannot be resized while they exist."""
+        for part in self._parts:
+            part.close()
@@ -0,0 +1,68 @@
+import abc
+import logging
+import random
+
+from future.utils import with_metaclass
+
+from . import const
+
+logger = logging.getLogger(__name__)
+
+
+class PollPolicy(with_metaclass(abc.ABCMeta, object)):
+    """Decides how long to sleep before looking up a pending scan again."""
+
+    @abc.abstractmethod
+    def delay(self, attempt, elapsed):
+        """
+        :param attempt: Number of lookups already made for the scan (at least 1)
+        :param elapsed: Seconds since the first lookup of the scan
+        :return: Seconds to sleep before the next lookup
+        """
+
+
+class FixedPollPolicy(PollPolicy):
+    """Poll at a fixed frequency, the historical behavior of wait_for."""
+
+    def __init__(self, frequency=None):
+        self.frequency = frequency
+
+    def delay(self, attempt, elapsed):
+        return self.frequency if self.frequency is not None else const.POLL_FREQUENCY
+
+
+class AdaptivePollPolicy(PollPolicy):
+    """
+    Poll around the time the assertion window is expected to close.
+
+    The first delay skips most of the expected window, polls are then `near_delay` apart while the
+    window is closing, and once the scan is overdue each delay is a `backoff` fraction of the time
+    it has been overdue, so delays grow exponentially up to `max_delay`. Delays get a random jitter
+    of up to `jitter` so concurrent waiters do not poll in lockstep.
+    """
+
+    def __init__(self, window=const.EXPECTED_SCAN_WINDOW, near_delay=const.POLL_NEAR_WINDOW_DELAY,
+                 max_delay=const.POLL_MAX_DELAY, backoff=0.5, jitter=0.1):
+        """
+        :param window: Expected number of seconds until the assertion window of a new scan closes
+        :param near_delay: Delay between polls while the window is expected to be closing
+        :param max_delay: Upper bound of the delay between polls
+        :param backoff: Fraction of the overdue time to sleep once the window should have closed
+        :param jitter: Maximum relative random variation applied to every delay
+        """
+        self.window = window
+        self.near_delay = near_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+
+    def delay(self, attempt, elapsed):
+        until_close = self.window - elapsed
+        if until_close > self.near_delay:
+            # nothing will change before the window closes, wait until it is about to
+            # only jitter downwards here, overshooting would add latency after the close
+            return (until_close - self.near_delay) * random.uniform(1 - self.jitter, 1)
+        elif until_close > -self.near_delay:
+            return self.near_delay * random.uniform(1 - self.jitter, 1)
+        delay = min(self.max_delay, max(self.near_delay, -until_close * self.backoff))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
@@ -0,0 +1,250 @@
+import calendar
+import email.utils
+import logging
+import threading
+import time
+
+from . import const
+from . import exceptions
+
+logger = logging.getLogger(__name__)
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    # python 2
+    _monotonic = time.time
+
+_REMAINING_HEADERS = ('RateLimit-Remaining', 'X-RateLimit-Remaining')
+_RESET_HEADERS = ('RateLimit-Reset', 'X-RateLimit-Reset')
+# reset values above this are unix timestamps rather than seconds from now
+_EPOCH_THRESHOLD = 10**9
+
+
+def _header(headers, names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                logger.debug('Ignoring invalid %s header: %s', name, value)
+    return None
+
+
+def retry_after(headers):
+    """Seconds the Retry-After header asks to wait, given either as seconds or as an http date, or None."""
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    date = email.utils.parsedate_tz(value)
+    if date is None:
+        logger.debug('Ignoring invalid Retry-After header: %s', value)
+        return None
+    return max(0.0, email.utils.mktime_tz(date) - calendar.timegm(time.gmtime()))
+
+
+def quota(headers):
+    """(remaining requests, seconds until the quota resets) from the rate limit headers, or None."""
+    remaining = _header(headers, _REMAINING_HEADERS)
+    reset = _header(headers, _RESET_HEADERS)
+    if remaining is None or reset is None:
+        return None
+    if reset > _EPOCH_THRESHOLD:
+        reset -= time.time()
+    return max(0.0, remaining), max(0.0, reset)
+
+
+class TokenBucket(object):
+    """
+    Paces the requests of an endpoint family, shared by every thread and task using it.
+
+    Requests take a token each, tokens are added at `rate` per second up to `burst`. The rate halves
+    when the server answers 429 and climbs back to max_rate over about 1 / recovery seconds. It is also
+    kept below what the rate limit headers say is left of the quota until it resets. A rate of None
+    does not pace requests, but they still wait while the server asked to pause.
+    """
+    def __init__(self, rate, burst=None, recovery=const.RATE_LIMIT_RECOVERY, min_rate=const.RATE_LIMIT_MIN):
+        """
+        :param rate: Highest number of requests per second.
+        :param burst: Tokens that can be saved up while idle, one second worth of requests by default.
+        :param recovery: Fraction of the highest rate regained every second after being throttled.
+        :param min_rate: Lowest rate requests are slowed down to.
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 0)
+        self.recovery = recovery
+        self.min_rate = min_rate
+        self.throttled = 0
+        self._tokens = self.burst
+        # tokens are added from this time on, it is in the future while requests are paused
+        self._updated = _monotonic()
+        # the rate allowed by the last quota the server sent, and until when
+        self._ceiling = None
+        self._ceiling_until = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now <= self._updated:
+            return
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rate is None:
+            return
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        ceiling = self.max_rate
+        if self._ceiling is not None and now < self._ceiling_until:
+            ceiling = min(ceiling, self._ceiling)
+        if self.rate < ceiling:
+            self.rate = min(ceiling, self.rate + self.max_rate * self.recovery * elapsed)
+
+    def reserve(self, max_wait=None):
+        """
+        Take a token and return the seconds to wait before sending the request it is for.
+
+        :param max_wait: Raise UsageLimitsExceededException instead if requests are paused for longer.
+        """
+        with self._lock:
+            now = _monotonic()
+            self._refill(now)
+            wait = max(0.0, self._updated - now)
+            if max_wait is not None and wait > max_wait:
+                raise exceptions.UsageLimitsExceededException(
+                    None, 'Rate limited by the server for {:.0f} more seconds, longer than the {} seconds '
+                          'requests wait at most'.format(wait, max_wait))
+            if self.rate is None:
+                return wait
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait += -self._tokens / self.rate
+            return wait
+
+    def acquire(self, max_wait=None):
+        """Block until a request can be sent."""
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Hold every request for seconds, tokens saved up so far are dropped."""
+        with self._lock:
+            now = _monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0)
+            self._updated = max(self._updated, now + seconds)
+
+    def throttle(self, seconds):
+        """
+        Slow down after the server answered 429, and pause for seconds.
+
+        Responses already in flight when the pause started arrive while it lasts, they do not slow down
+        the rate again.
+        """
+        with self._lock:
+            now = _monotonic()
+            paused = self._updated > now
+            self._refill(now)
+            if not paused:
+                self.throttled += 1
+                if self.rate is not None:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                logger.warning('Rate limited by the server, slowing down to %s requests per second for %s seconds',
+                               self.rate, seconds)
+            self._tokens = min(self._tokens, 0)
+            self._updated = max(self._updated, now + seconds)
+
+    def limit(self, remaining, reset):
+        """Keep the rate below what is left of the quota, remaining requests over the next reset seconds."""
+        if not remaining:
+            self.pause(reset)
+            return
+        if self.rate is None or not reset:
+            return
+        with self._lock:
+            now = _monotonic()
+            self._refill(now)
+            self._ceiling = max(self.min_rate, remaining / reset)
+            self._ceiling_until = now + reset
+            self.rate = min(self.rate, self._ceiling)
+
+
+class RateLimiter(object):
+    """
+    Client side rate limiting of the requests to each endpoint family, shared by every worker of an api instance.
+
+    Requests are paced by a TokenBucket per family. Requests answered with 429 are sent again once the
+    server allows it, after waiting out their Retry-After header and slowing the whole family down.
+    Requests to endpoints outside of any family are not paced, but still wait for Retry-After. When the
+    server asks to wait longer than max_wait, requests of the family raise UsageLimitsExceededException
+    until the pause is over instead.
+    """
+    def __init__(self, rates=None, families=None, retries=const.RATE_LIMIT_RETRIES,
+                 max_wait=const.RATE_LIMIT_MAX_WAIT):
+        """
+        :param rates: Dict of family name to highest number of requests per second, None to not pace a family.
+            Defaults to const.RATE_LIMITS, missing families use their default.
+        :param families: Dict of endpoint path, relative to the api uri, to the family of its requests.
+            Paths also match the endpoints below them. Defaults to const.RATE_LIMIT_FAMILIES.
+        :param retries: Number of times a request answered with 429 is sent again before
+            UsageLimitsExceededException is raised.
+        :param max_wait: Longest pause, asked with Retry-After or an exhausted quota, that requests wait out.
+            None waits however long the server asks.
+        """
+        self.families = const.RATE_LIMIT_FAMILIES if families is None else families
+        self.retries = retries
+        self.max_wait = max_wait
+        rates_ = dict(const.RATE_LIMITS)
+        rates_.update(rates or {})
+        self._buckets = dict((family, TokenBucket(rate)) for family, rate in rates_.items())
+        self._buckets.setdefault(None, TokenBucket(None))
+
+    def family(self, path):
+        # the longest matching path wins, /consumer/download is not a submission
+        matches = [endpoint for endpoint in self.families if path == endpoint or path.startswith(endpoint + '/')]
+        if not matches:
+            return None
+        return self.families[max(matches, key=len)]
+
+    def bucket(self, path):
+        return self._buckets.get(self.family(path)) or self._buckets[None]
+
+    @property
+    def rates(self):
+        """The current number of requests per second of every family, None when it is not paced."""
+        return dict((family, bucket.rate) for family, bucket in self._buckets.items() if family is not None)
+
+    def rate(self, family):
+        return self._buckets[family].rate
+
+    def reserve(self, path):
+        """Take a token of the family of path and return the seconds to wait before sending its request."""
+        return self.bucket(path).reserve(self.max_wait)
+
+    def acquire(self, path):
+        """Block until a request to path can be sent."""
+        return self.bucket(path).acquire(self.max_wait)
+
+    def update(self, path, status_code, headers):
+        """
+        Adjust the family of path to the response of one of its requests.
+
+        :return: Whether the request was rate limited and should be sent again, False when the server asked
+            to wait longer than max_wait.
+        """
+        bucket = self.bucket(path)
+        quota_ = quota(headers)
+        if status_code == 429:
+            delay = retry_after(headers)
+            if delay is None:
+                delay = quota_[1] if quota_ else const.RATE_LIMIT_BACKOFF
+            bucket.throttle(delay)
+            return self.max_wait is None or delay <= self.max_wait
+        if quota_ is not None:
+            bucket.limit(*quota_)
+        return False
@@ -1,18 +1,105 @@
+import itertools
 import logging
+import sys
+import threading
 
-from jsonschema import validate, ValidationError
+from jsonschema.validators import validator_for
 
 from .. import exceptions
 
 logger = logging.getLogger(__name__)
 
+try:
+    _intern = sys.intern
+except AttributeError:
+    # python 2 builtin, which only interns byte strings
+    _intern = intern  # noqa: F821
+
+# names of the lazy_property fields of each resource class
+_lazy_fields = {}
+# compiled validators, keyed by id() of the schema they were built from
+_validators = {}
+# validators of whole pages, keyed by resource class
+_page_validators = {}
+# counts objects eligible for validation, used to sample one in validate_sample of them
+_validation_count = itertools.count()
+# ids of the page entries being parsed, whose validation was already handled with the whole page
+_local = threading.local()
+
+
+def _validator(schema):
+    entry = _validators.get(id(schema))
+    if entry is None or entry[0] is not schema:
+        cls = validator_for(schema)
+        cls.check_schema(schema)
+        entry = _validators[id(schema)] = (schema, cls(schema))
+    return entry[1]
+
+
+def intern_string(value):
+    """
+    Return the interned copy of value, so equal strings repeated in many resources are stored once.
+
+    Interned strings are freed by the interpreter once no resource uses them anymore.
+    """
+    if value is None:
+        return None
+    try:
+        return _intern(value)
+    except TypeError:
+        # unicode on python 2, or a str subclass
+        return value
+
+
+def _in_page(json):
+    return id(json) in (getattr(_local, 'page', None) or ())
+
+
+def _sampled(polyswarm):
+    """Whether the next object parsed for this api instance should be validated."""
+    if not (polyswarm and polyswarm.validate):
+        return False
+    sample = polyswarm.validate_sample
+    return sample <= 1 or next(_validation_count) % sample == 0
+
+
+class lazy_property(object):
+    """
+    A property computed on first access and then cached on the instance under "_<name>".
+
+    Works both for instances with a __dict__ and for __slots__ classes declaring the "_<name>" slot.
+    """
+    def __init__(self, func):
+        self.func = func
+        self.attribute = '_' + func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return getattr(instance, self.attribute)
+        except AttributeError:
+            value = self.func(instance)
+            setattr(instance, self.attribute, value)
+            return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.attribute, value)
+
 
 class BasePSType(object):
+    # the base classes declare __slots__ so that subclasses declaring their own
+    # __slots__ get compact instances without a per-instance __dict__
+    __slots__ = ('polyswarm',)
+
     def __init__(self, polyswarm=None):
         self.polyswarm = polyswarm
 
 
 class BasePSResourceType(BasePSType):
+    __slots__ = ()
+
     @classmethod
     def parse_result(cls, api_instance, result, **kwargs):
         logger.debug('Parsing resource %s', cls.__name__)
@@ -24,9 +111,13 @@ class BasePSResourceType(BasePSType):
 
 
 class BasePSJSONType(BasePSResourceType):
+    __slots__ = ('_json',)
+
     SCHEMA = {
         'type': ['object', 'array']
     }
+    # resources only built from the json of a parent resource, which is validated with them
+    NESTED = False
 
     def __init__(self, json=None, polyswarm=None):
         super(BasePSJSONType, self).__init__(polyswarm=polyswarm)
@@ -34,6 +125,58 @@ class BasePSJSONType(BasePSResourceType):
         if json is not None:
             self.json = json
 
+    @classmethod
+    def parse_result(cls, api_instance, result, **kwargs):
+        resource = super(BasePSJSONType, cls).parse_result(api_instance, result, **kwargs)
+        if api_instance and not api_instance.keep_json:
+            resource.discard_json()
+        return resource
+
+    @classmethod
+    def parse_result_list(cls, api_instance, json_data, **kwargs):
+        if not (api_instance and api_instance.validate):
+            return super(BasePSJSONType, cls).parse_result_list(api_instance, json_data, **kwargs)
+        # validate the sampled entries of the page in a single pass instead of one object at a time
+        cls._validate_page([entry for entry in json_data if _sampled(api_instance)])
+        page, _local.page = getattr(_local, 'page', None), set(id(entry) for entry in json_data)
+        try:
+            return super(BasePSJSONType, cls).parse_result_list(api_instance, json_data, **kwargs)
+        finally:
+            _local.page = page
+
+    @classmethod
+    def _validate_page(cls, json_data):
+        validator = _page_validators.get(cls)
+        if validator is None or validator.schema['items'] is not cls.SCHEMA:
+            validator = _page_validators[cls] = _validator({'type': 'array', 'items': cls.SCHEMA})
+        error = next(validator.iter_errors(json_data), None)
+        if error is not None:
+            json = json_data[error.path[0]] if error.path else json_data
+            raise exceptions.InvalidJSONResponseException("Failed to validate json against schema", json, cls.SCHEMA)
+
+    @property
+    def _lazy(self):
+        """Whether lazy_property fields are left to be computed on first access."""
+        return bool(self.polyswarm and self.polyswarm.lazy)
+
+    def materialize(self):
+        """Compute all lazy_property fields now."""
+        cls = type(self)
+        fields = _lazy_fields.get(cls)
+        if fields is None:
+            fields = _lazy_fields[cls] = [name for name in dir(cls) if isinstance(getattr(cls, name), lazy_property)]
+        for name in fields:
+            getattr(self, name)
+
+    def discard_json(self):
+        """
+        Drop the raw json once every field is parsed, so the data is not held in memory twice.
+
+        Lazy fields are computed first. The json property returns None afterwards.
+        """
+        self.materialize()
+        self._json = None
+
     @property
     def json(self):
         return self._json
@@ -42,7 +185,7 @@ class BasePSJSONType(BasePSResourceType):
     def json(self, value):
         # this is expensive on thousands of objects
         # avoid if disabled
-        if self.polyswarm and self.polyswarm.validate:
+        if not self.NESTED and not _in_page(value) and _sampled(self.polyswarm):
             self._validate(value)
         self._json = value
 
@@ -50,14 +193,14 @@ class BasePSJSONType(BasePSResourceType):
         if not schema:
             schema = self.SCHEMA
 
-        try:
-            validate(json, schema)
-        except ValidationError:
+        if not _validator(schema).is_valid(json):
             raise exceptions.InvalidJSONResponseException("Failed to validate json against schema", json, self.SCHEMA)
 
 
 # TODO better way to do this with ABC?
-class Hashable:
+class Hashable(object):
+    __slots__ = ()
+
     @property
     def hash(self):
         return self.sha256
@@ -70,6 +213,8 @@ class Hashable:
         return self.hash == other
 
 
-class AsInteger:
+class AsInteger(object):
+    __slots__ = ()
+
     def __int__(self):
         return int(self.id)
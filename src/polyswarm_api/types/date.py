@@ -1,9 +1,45 @@
-from dateutil import parser
+import re
+from datetime import datetime
+
+from dateutil import parser, tz
+
+# the formats emitted by the API, e.g. 2019-12-03T14:53:46.097963, 2020-01-14T17:48:55.854940+00:00
+# or 2019-11-01T21:27:47.109Z. Anything else goes through dateutil.
+_API_FORMAT = re.compile(r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?(Z|[+-]\d{2}:\d{2})?$')
+_CACHE_SIZE = 4096
+_cache = {}
+
+
+def _parse_api_format(date_string):
+    match = _API_FORMAT.match(date_string)
+    if not match:
+        return None
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    if offset is None:
+        tzinfo = None
+    elif offset == 'Z' or offset in ('+00:00', '-00:00'):
+        tzinfo = tz.UTC
+    else:
+        seconds = int(offset[1:3]) * 3600 + int(offset[4:6]) * 60
+        tzinfo = tz.tzoffset(None, -seconds if offset[0] == '-' else seconds)
+    microsecond = int(fraction.ljust(6, '0')) if fraction else 0
+    try:
+        return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond, tzinfo)
+    except ValueError:
+        # out of range for datetime but maybe still valid, e.g. 24:00:00 for the end of the day
+        return None
 
 
 def parse_isoformat(date_string):
     """ Parses the current date format version """
     if date_string:
-        return parser.isoparse(date_string)
+        # datetimes are immutable, so repeated strings can share the parsed value
+        parsed = _cache.get(date_string)
+        if parsed is None:
+            parsed = _parse_api_format(date_string) or parser.isoparse(date_string)
+            if len(_cache) >= _CACHE_SIZE:
+                _cache.clear()
+            _cache[date_string] = parsed
+        return parsed
     else:
         return None
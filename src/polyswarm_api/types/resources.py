@@ -1,8 +1,11 @@
 import logging
+import mmap
 import os
+import stat
 import io
 import functools
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from binascii import unhexlify
 from enum import Enum
 from hashlib import sha256 as _sha256, sha1 as _sha1, md5 as _md5
@@ -18,6 +21,7 @@ except ImportError:
 
 from polyswarm_api import exceptions
 from polyswarm_api import const
+from polyswarm_api import utils
 from . import base
 from . import schemas
 from . import date
@@ -30,10 +34,12 @@ logger = logging.getLogger(__name__)
 #####################################################################
 
 class Engine(base.BasePSJSONType):
+    __slots__ = ('address', 'name')
+
     def __init__(self, json, polyswarm=None):
         super(Engine, self).__init__(json=json, polyswarm=polyswarm)
-        self.address = json['address'].lower()
-        self.name = json.get('name')
+        self.address = base.intern_string(json['address'].lower())
+        self.name = base.intern_string(json.get('name'))
 
 
 class Metadata(base.BasePSJSONType, base.AsInteger):
@@ -68,6 +74,10 @@ class Metadata(base.BasePSJSONType, base.AsInteger):
     def __contains__(self, item):
         return item in self.json
 
+    def discard_json(self):
+        # the json is the data of this resource, it can not be discarded
+        pass
+
     def __getattr__(self, name):
         try:
             return self.json[name]
@@ -78,7 +88,12 @@ class Metadata(base.BasePSJSONType, base.AsInteger):
 
 
 class ArtifactInstance(base.BasePSJSONType, base.Hashable, base.AsInteger):
-    SCHEMA = schemas.artifact_instance_schema
+    # assertions and votes are validated along with their artifact instance
+    SCHEMA = dict(schemas.artifact_instance_schema, properties=dict(
+        schemas.artifact_instance_schema['properties'],
+        assertions={'type': 'array', 'items': schemas.assertion_schema},
+        votes={'type': 'array', 'items': schemas.vote_schema},
+    ))
 
     def __init__(self, json, polyswarm=None):
         super(ArtifactInstance, self).__init__(json=json, polyswarm=polyswarm)
@@ -90,31 +105,61 @@ class ArtifactInstance(base.BasePSJSONType, base.Hashable, base.AsInteger):
         self.mimetype = json['mimetype']
         self.size = json['size']
         self.extended_type = json['extended_type']
-        self.first_seen = date.parse_isoformat(json['first_seen'])
-        self.last_seen = date.parse_isoformat(json['last_seen'])
-        metadata_json = json.get('metadata') or []
-        metadata = {metadata['tool']: metadata['tool_metadata'] for metadata in metadata_json}
-        self.metadata = Metadata(metadata, polyswarm)
 
         # ArtifactInstance fields
         self.id = json.get('id')
-        self.assertions = [Assertion(self, a, polyswarm) for a in json.get('assertions', [])]
         self.country = json.get('country')
         self.community = json.get('community')
-        self.created = date.parse_isoformat(json.get('created'))
         self.failed = json.get('failed')
         self.filename = json.get('filename')
         self.result = json.get('result')
         self.type = json.get('type')
-        self.votes = [Vote(self, v, polyswarm) for v in json.get('votes', [])]
         self.window_closed = json.get('window_closed')
         self.polyscore = float(json['polyscore']) if json.get('polyscore') is not None else None
-        self.permalink = const.DEFAULT_PERMALINK_BASE + '/' + str(self.hash)
 
         self._malicious_assertions = None
         self._benign_assertions = None
         self._valid_assertions = None
 
+        # dates and nested resources are built on first access in lazy mode
+        if not self._lazy:
+            self.materialize()
+
+    @base.lazy_property
+    def first_seen(self):
+        return date.parse_isoformat(self.json['first_seen'])
+
+    @base.lazy_property
+    def last_seen(self):
+        return date.parse_isoformat(self.json['last_seen'])
+
+    @base.lazy_property
+    def created(self):
+        return date.parse_isoformat(self.json.get('created'))
+
+    @base.lazy_property
+    def metadata(self):
+        metadata_json = self.json.get('metadata') or []
+        metadata = {metadata['tool']: metadata['tool_metadata'] for metadata in metadata_json}
+        return Metadata(metadata, self.polyswarm)
+
+    @base.lazy_property
+    def assertions(self):
+        return [Assertion(self, a, self.polyswarm) for a in self.json.get('assertions', [])]
+
+    @base.lazy_property
+    def votes(self):
+        return [Vote(self, v, self.polyswarm) for v in self.json.get('votes', [])]
+
+    @base.lazy_property
+    def permalink(self):
+        return const.DEFAULT_PERMALINK_BASE + '/' + str(self.hash)
+
+    def discard_json(self):
+        super(ArtifactInstance, self).discard_json()
+        for nested in self.assertions + self.votes:
+            nested.discard_json()
+
     def __str__(self):
         return "ArtifactInstance-<%s>" % self.hash
 
@@ -168,6 +213,8 @@ class Hunt(base.BasePSJSONType, base.AsInteger):
 
 
 class HuntResult(base.BasePSJSONType, base.AsInteger):
+    __slots__ = ('id', 'rule_name', 'tags', 'sha256', 'historicalscan_id', 'livescan_id', '_created', '_artifact')
+
     SCHEMA = schemas.hunt_result
 
     def __init__(self, json, polyswarm=None):
@@ -175,11 +222,25 @@ class HuntResult(base.BasePSJSONType, base.AsInteger):
         self.id = json['id']
         self.rule_name = json['rule_name']
         self.tags = json['tags']
-        self.created = date.parse_isoformat(json['created'])
         self.sha256 = json['sha256']
         self.historicalscan_id = json['historicalscan_id']
         self.livescan_id = json['livescan_id']
-        self.artifact = ArtifactInstance(json['artifact'], polyswarm)
+
+        # dates and nested resources are built on first access in lazy mode
+        if not self._lazy:
+            self.materialize()
+
+    @base.lazy_property
+    def created(self):
+        return date.parse_isoformat(self.json['created'])
+
+    @base.lazy_property
+    def artifact(self):
+        return ArtifactInstance(self.json['artifact'], self.polyswarm)
+
+    def discard_json(self):
+        super(HuntResult, self).discard_json()
+        self.artifact.discard_json()
 
 
 def _read_chunks(file_handle):
@@ -190,19 +251,211 @@ def _read_chunks(file_handle):
         yield data
 
 
-def all_hashes(file_handle, algorithms=(_sha256, _sha1, _md5)):
+# filesystems whose files can be truncated by other hosts while mapped, the process then dies of SIGBUS
+_REMOTE_FILESYSTEMS = ('nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ceph', 'glusterfs', 'lustre', 'afs', '9p', 'fuse')
+# device number of each mount to its filesystem type, from /proc/self/mountinfo
+_filesystems = {}
+
+
+def _filesystem(device):
+    if device not in _filesystems:
+        try:
+            with open('/proc/self/mountinfo') as f:
+                for line in f:
+                    # the fields after the optional ones start with the filesystem type
+                    fields = line.split()
+                    major, minor = fields[2].split(':')
+                    _filesystems[os.makedev(int(major), int(minor))] = fields[fields.index('-') + 1]
+        except (IOError, OSError, ValueError, IndexError, AttributeError):
+            pass
+        # not read again for files on an unknown device
+        _filesystems.setdefault(device, None)
+    return _filesystems[device]
+
+
+def _mappable(fd):
+    """
+    Whether the file open as fd is safe to map in memory, a regular file on local storage.
+
+    Windows does not let mapped files be truncated. Elsewhere a file truncated while mapped kills the
+    process with SIGBUS, so only files on a filesystem known to be local are mapped, which is only known
+    on linux.
+    """
+    status = os.fstat(fd)
+    if not stat.S_ISREG(status.st_mode):
+        return False
+    if os.name == 'nt':
+        return True
+    filesystem = _filesystem(status.st_dev)
+    return filesystem is not None and filesystem.split('.')[0] not in _REMOTE_FILESYSTEMS
+
+
+def _content_view(file_handle):
+    """
+    Return a memoryview over the content of file_handle from its position on, and the mmap backing it if any.
+
+    Returns (None, None) when the content can only be read, e.g. from sockets, pipes or remote files.
+    """
+    getbuffer = getattr(file_handle, 'getbuffer', None)
+    if getbuffer is not None:
+        view = getbuffer()[file_handle.tell():]
+        file_handle.seek(0, os.SEEK_END)
+        return view, None
+    try:
+        position = file_handle.tell()
+        if not _mappable(file_handle.fileno()):
+            return None, None
+        # the mapping only sees what was flushed to the file
+        file_handle.flush()
+        mapped = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, IOError, OSError, ValueError):
+        # not a file, an empty file or a file opened write only
+        return None, None
+    try:
+        view = memoryview(mapped)
+    except TypeError:
+        # python 2 mmaps do not expose the buffer interface memoryview needs
+        mapped.close()
+        return None, None
+    # leave the handle where reading it to the end would
+    file_handle.seek(0, os.SEEK_END)
+    return view[position:], mapped
+
+
+def _update(hasher, view):
+    # hashlib releases the GIL while hashing large buffers, so hashers on different threads run in parallel
+    for offset in range(0, len(view), const.HASH_CHUNK_SIZE):
+        hasher.update(view[offset:offset + const.HASH_CHUNK_SIZE])
+
+
+def _update_all(hashers, data, executor):
+    if executor is None:
+        for hasher in hashers:
+            _update(hasher, data)
+    else:
+        futures = [executor.submit(_update, hasher, data) for hasher in hashers[1:]]
+        _update(hashers[0], data)
+        for future in futures:
+            future.result()
+
+
+def all_hashes(file_handle, algorithms=(_sha256, _sha1, _md5), parallel=True):
+    """
+    Hash the content of file_handle from its current position to its end.
+
+    Files are mapped in memory and BytesIO buffers are used in place, other handles are read in
+    HASH_CHUNK_SIZE blocks. Content larger than PARALLEL_HASH_MIN_SIZE is given to each hasher on its
+    own thread when parallel is True.
+
+    :return: The list of Hash objects, in the order of algorithms
+    """
     hashers = [alg() for alg in algorithms]
-    for data in _read_chunks(file_handle):
-        [h.update(data) for h in hashers]
+    view, mapped = _content_view(file_handle)
+    try:
+        if view is not None:
+            parallel = parallel and len(view) >= const.PARALLEL_HASH_MIN_SIZE
+            chunks = [view]
+        else:
+            chunks = iter(lambda: file_handle.read(const.HASH_CHUNK_SIZE), b'')
+        executor = ThreadPoolExecutor(max_workers=len(hashers) - 1) if parallel and len(hashers) > 1 else None
+        try:
+            for data in chunks:
+                _update_all(hashers, data, executor if len(data) >= const.PARALLEL_HASH_MIN_SIZE else None)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    finally:
+        if view is not None:
+            view.release()
+        if mapped is not None:
+            mapped.close()
     return [Hash(h.hexdigest()) for h in hashers]
 
 
+def _hash_file(path, algorithms):
+    with open(path, 'rb') as f:
+        return all_hashes(f, algorithms, parallel=False)
+
+
+def hash_files(paths, algorithms=(_sha256, _sha1, _md5), workers=const.DEFAULT_WORKER_COUNT):
+    """
+    Hash many files on a thread pool, one file per thread.
+
+    Paths are pulled lazily, so at most `workers` files are open at the same time.
+
+    :return: Generator of (path, result) tuples in completion order, where result is either the list of
+        Hash objects of all_hashes or the exception raised while hashing that file
+    """
+    return utils.as_completed(lambda path: _hash_file(path, algorithms), paths, workers)
+
+
+# analyzer factories by name, run over the content of every analyzed LocalArtifact
+_analyzers = {}
+
+
+def register_analyzer(name, factory):
+    """
+    Run an analyzer over the content of every LocalArtifact analyzed from now on.
+
+    :param name: Key of the analyzer result in LocalArtifact.analyses.
+    :param factory: Callable returning a new analyzer, an object whose update(data) method is called with
+        each chunk of content and whose result() method is called once the whole content was seen.
+    """
+    _analyzers[name] = factory
+
+
+class ContentAnalysis(object):
+    """
+    Hashes and registered analyzers of content fed a chunk at a time, so content can be analyzed
+    while it is written instead of being read back afterwards.
+    """
+    def __init__(self, algorithms=(_sha256, _sha1, _md5)):
+        self._algorithms = algorithms
+        self.reset()
+
+    def reset(self):
+        """Start over, discarding the content seen so far."""
+        self.size = 0
+        self._hashers = [alg() for alg in self._algorithms]
+        self._analyzers = dict((name, factory()) for name, factory in _analyzers.items())
+
+    def update(self, data):
+        for hasher in self._hashers:
+            hasher.update(data)
+        for analyzer in self._analyzers.values():
+            analyzer.update(data)
+        self.size += len(data)
+
+    def hashes(self):
+        return [Hash(hasher.hexdigest()) for hasher in self._hashers]
+
+    def hexdigest(self, hash_type):
+        for hasher in self._hashers:
+            if hasher.name == hash_type:
+                return hasher.hexdigest()
+        raise exceptions.InvalidValueException('{} is not computed by this analysis'.format(hash_type))
+
+    def results(self):
+        return dict((name, analyzer.result()) for name, analyzer in self._analyzers.items())
+
+
 class LocalHandle(base.BasePSResourceType):
-    def __init__(self, contents, polyswarm=None, handle=None):
+    def __init__(self, contents, polyswarm=None, handle=None, analysis=None):
+        """
+        :param contents: Iterable of chunks written to the handle.
+        :param handle: File-like object to write to, a BytesIO by default.
+        :param analysis: ContentAnalysis fed with everything written.
+        """
         super(LocalHandle, self).__init__(polyswarm=polyswarm)
         self.handle = handle or io.BytesIO()
+        self.analysis = analysis
         for chunk in contents:
-            self.handle.write(chunk)
+            self.write(chunk)
+
+    def write(self, data):
+        self.handle.write(data)
+        if self.analysis is not None:
+            self.analysis.update(data)
 
     # Inspired by
     # https://github.com/python/cpython/blob/29500737d45cbca9604d9ce845fb2acc3f531401/Lib/tempfile.py#L461
@@ -226,7 +479,7 @@ class LocalHandle(base.BasePSResourceType):
 
 class LocalArtifact(LocalHandle, base.Hashable):
     """ Artifact for which we have local content """
-    def __init__(self, handle, artifact_name=None, artifact_type=None, polyswarm=None, analyze=True):
+    def __init__(self, handle, artifact_name=None, artifact_type=None, polyswarm=None, analyze=True, analysis=None):
         """
         A representation of an artifact we have locally
 
@@ -234,6 +487,7 @@ class LocalArtifact(LocalHandle, base.Hashable):
         :param artifact_type: Type of artifact
         :param polyswarm: PolyswarmAPI instance
         :param analyze: Boolean, if True will run analyses on artifact on startup (Note: this may still run later if False)
+        :param analysis: ContentAnalysis already computed over the whole content, used instead of reading it again
         """
         # create the LocalHandle with the given handle and don't write anything to it
         super(LocalArtifact, self).__init__(b'', polyswarm=polyswarm, handle=handle)
@@ -243,12 +497,19 @@ class LocalArtifact(LocalHandle, base.Hashable):
         self.sha256 = None
         self.sha1 = None
         self.md5 = None
+        self.size = None
+        self.analyses = {}
         self.analyzed = False
-        if analyze:
+        if analysis is not None:
+            self.sha256, self.sha1, self.md5 = analysis.hashes()
+            self.size = analysis.size
+            self.analyses = analysis.results()
+            self.analyzed = True
+        elif analyze:
             self.analyze_artifact()
 
     @classmethod
-    def from_path(cls, api, path, artifact_type=None, analyze=False, create=False, **kwargs):
+    def from_path(cls, api, path, artifact_type=None, analyze=False, create=False, analysis=None, **kwargs):
         if not isinstance(path, string_types):
             raise exceptions.InvalidValueException('Path should be a string')
         folder, file_name = os.path.split(path)
@@ -265,7 +526,8 @@ class LocalArtifact(LocalHandle, base.Hashable):
 
         mode = kwargs.pop('mode', 'wb+' if create else 'rb')
         handler = open(path, mode=mode, **kwargs)
-        return cls(handler, artifact_name=file_name, artifact_type=artifact_type, analyze=analyze, polyswarm=api)
+        return cls(handler, artifact_name=file_name, artifact_type=artifact_type, analyze=analyze, polyswarm=api,
+                   analysis=analysis)
 
     @classmethod
     def from_content(cls, api, content, artifact_name=None, artifact_type=None, analyze=False):
@@ -283,6 +545,7 @@ class LocalArtifact(LocalHandle, base.Hashable):
         if not self.analyzed or force:
             self.handle.seek(0)
             self._calc_hashes(self.handle)
+            self.size = self.handle.tell()
             self.handle.seek(0)
             self._run_analyzers(self.handle)
             self.analyzed = True
@@ -291,8 +554,13 @@ class LocalArtifact(LocalHandle, base.Hashable):
         self.sha256, self.sha1, self.md5 = all_hashes(fh)
 
     def _run_analyzers(self, fh):
-        # TODO implement custom analyzer support, so users can implement plugins here.
-        return {}
+        if not _analyzers:
+            return self.analyses
+        analysis = ContentAnalysis(algorithms=())
+        for data in _read_chunks(fh):
+            analysis.update(data)
+        self.analyses = analysis.results()
+        return self.analyses
 
     def __str__(self):
         return "Artifact <%s>" % self.hash
@@ -325,6 +593,8 @@ class YaraRuleset(base.BasePSJSONType, base.AsInteger):
 
 
 class TagLink(base.BasePSJSONType, base.AsInteger):
+    __slots__ = ('id', 'sha256', 'created', 'updated', 'first_seen', 'tags', 'families')
+
     def __init__(self, json, polyswarm=None):
         super(TagLink, self).__init__(json, polyswarm)
         self.id = json.get('id')
@@ -361,14 +631,17 @@ class Tag(base.BasePSJSONType, base.AsInteger):
 
 
 class Assertion(base.BasePSJSONType):
+    __slots__ = ('scanfile', 'author', 'author_name', 'engine_name', 'bid', 'mask', 'metadata', 'verdict')
+
     SCHEMA = schemas.assertion_schema
+    NESTED = True
 
     def __init__(self, scanfile, json, polyswarm=None):
         super(Assertion, self).__init__(json=json, polyswarm=polyswarm)
         self.scanfile = scanfile
-        self.author = json['author']
-        self.author_name = json['author_name']
-        self.engine_name = json['engine'].get('name')
+        self.author = base.intern_string(json['author'])
+        self.author_name = base.intern_string(json['author_name'])
+        self.engine_name = base.intern_string(json['engine'].get('name'))
         self.bid = int(json['bid'])
         self.mask = json['mask']
         # deal with metadata being a string instead of null
@@ -380,7 +653,10 @@ class Assertion(base.BasePSJSONType):
 
 
 class Vote(base.BasePSJSONType):
+    __slots__ = ('scanfile', 'arbiter', 'vote')
+
     SCHEMA = schemas.vote_schema
+    NESTED = True
 
     def __init__(self, scanfile, json, polyswarm=None):
         super(Vote, self).__init__(json=json, polyswarm=polyswarm)
@@ -0,0 +1,26 @@
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def as_completed(func, items, workers, window=None):
+    """
+    Run func over items on a bounded thread pool and yield (item, result) tuples as calls finish.
+
+    Items are pulled lazily, so at most `window` of them, `workers` by default, are queued or in flight
+    at any time. An exception raised by func is yielded as the result of that item instead of aborting
+    the whole batch.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(func, item): item for item in itertools.islice(items, window or workers)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                for next_item in itertools.islice(items, 1):
+                    pending[executor.submit(func, next_item)] = next_item
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                yield item, result
@@ -0,0 +1,171 @@
+import asyncio
+import os
+from unittest import TestCase, mock
+
+import pytest
+
+from polyswarm_api import exceptions, ratelimit
+
+from .client_concurrency_test import artifact_instance, EICAR_SHA256
+from .client_download_test import served_sha256, assert_served_body
+from .client_scan_test import temp_dir
+from ..utils.http_server import StandInServer
+
+web = pytest.importorskip('aiohttp.web')
+aioapi = pytest.importorskip('polyswarm_api.aioapi')
+
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+# lookups answered with 429 once
+RATE_LIMITED = []
+
+
+async def lookup(request):
+    scan = int(request.match_info['scan'])
+    if scan == 404:
+        return web.json_response({'result': 'Not Found', 'status': 'NOT_FOUND'}, status=404)
+    if scan == 429 and not RATE_LIMITED:
+        RATE_LIMITED.append(scan)
+        return web.json_response({'result': 'Too Many Requests', 'status': 'error'}, status=429,
+                                 headers={'Retry-After': '0.1'})
+    await asyncio.sleep(0.05)
+    return web.json_response({'result': artifact_instance(id=scan, window_closed=True), 'status': 'OK'})
+
+
+async def search_hash(request):
+    assert request.headers['Authorization'] == 'key'
+    if request.query['hash'] == 'a' * 64:
+        return web.json_response({'result': 'Not Found', 'status': 'NOT_FOUND'}, status=404)
+    offset = int(request.query.get('offset', 0))
+    return web.json_response({'has_more': offset < 2, 'limit': 1, 'offset': offset + 1,
+                              'result': [artifact_instance(id=offset)], 'status': 'OK'})
+
+
+async def submit(request):
+    form = await request.post()
+    assert form['artifact-type'] == 'FILE'
+    assert form['file'].file.read() == EICAR
+    return web.json_response({'result': artifact_instance(filename=form['file'].filename), 'status': 'OK'})
+
+
+async def rescan(request):
+    return web.json_response({'result': artifact_instance(sha256=request.match_info['hash']), 'status': 'OK'})
+
+
+async def download(request):
+    return web.Response(body=EICAR)
+
+
+async def tag(request):
+    name = request.query.get('name') or (await request.json())['name']
+    return web.json_response({'result': {'id': 1, 'name': name, 'created': '2019-12-02T23:45:06.203139',
+                                         'updated': '2019-12-02T23:45:06.203139'}, 'status': 'OK'})
+
+
+class AsyncClientTestCaseV2(TestCase):
+    def run_with_server(self, test, **kwargs):
+        async def run():
+            app = web.Application()
+            app.router.add_get('/v2/consumer/submission/gamma/{scan}', lookup)
+            app.router.add_post('/v2/consumer/submission/gamma', submit)
+            app.router.add_post('/v2/consumer/submission/gamma/rescan/sha256/{hash}', rescan)
+            app.router.add_get('/v2/search/hash/sha256', search_hash)
+            app.router.add_get('/v2/download/sha256/{hash}', download)
+            app.router.add_get('/v2/tags/tag', tag)
+            app.router.add_post('/v2/tags/tag', tag)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            try:
+                async with aioapi.AsyncPolyswarmAPI('key', uri='http://127.0.0.1:{}/v2'.format(port),
+                                                    community='gamma', **kwargs) as api:
+                    await test(api)
+            finally:
+                await runner.cleanup()
+        asyncio.run(run())
+
+    def test_concurrent_lookups(self):
+        async def test(api):
+            start = asyncio.get_event_loop().time()
+            results = await asyncio.gather(*[api.lookup(scan) for scan in range(400)])
+            assert [int(result) for result in results] == list(range(400))
+            # the requests overlap in a single thread instead of taking 400 * 50ms
+            assert asyncio.get_event_loop().time() - start < 10
+            with pytest.raises(exceptions.NotFoundException):
+                await api.lookup(404)
+            assert int(await api.wait_for(1)) == 1
+        self.run_with_server(test)
+
+    def test_search_pages(self):
+        async def test(api):
+            results = [result async for result in api.search(EICAR_SHA256)]
+            assert [int(result) for result in results] == [0, 1, 2]
+        self.run_with_server(test)
+
+    def test_submit_and_download(self):
+        async def test(api):
+            with temp_dir({'malicious': EICAR}) as (path, files):
+                result = await api.submit(files[0])
+                assert result.filename == 'malicious'
+                artifact = await api.download(path, EICAR_SHA256)
+                with open(os.path.join(path, EICAR_SHA256), 'rb') as f:
+                    assert f.read() == EICAR
+                assert artifact.artifact_name == EICAR_SHA256
+        self.run_with_server(test)
+
+    def test_submit_dedup(self):
+        async def test(api):
+            with temp_dir({'malicious': EICAR}) as (path, files):
+                # the search server knows every hash
+                result = await api.submit(files[0], dedup=True)
+                assert result.sha256 == EICAR_SHA256
+        self.run_with_server(test)
+
+    def test_rate_limited(self):
+        limiter = ratelimit.RateLimiter()
+
+        async def test(api):
+            start = asyncio.get_event_loop().time()
+            assert int(await api.lookup(429)) == 429
+            assert asyncio.get_event_loop().time() - start >= 0.1
+            assert limiter.bucket('/consumer/submission/gamma').throttled == 1
+        del RATE_LIMITED[:]
+        self.run_with_server(test, rate_limiter=limiter)
+
+    def test_bulk(self):
+        async def test(api):
+            hashes = [EICAR_SHA256, EICAR_SHA256.upper(), 'a' * 64, 'malformed']
+            results = dict([(getattr(hash_, 'hash', hash_).lower(), result)
+                            async for hash_, result in api.search_hashes(hashes, workers=2)])
+            assert sorted(results) == sorted([EICAR_SHA256, 'a' * 64, 'malformed'])
+            # every page of the search
+            assert [int(result) for result in results[EICAR_SHA256]] == [0, 1, 2]
+            assert isinstance(results['a' * 64], exceptions.NotFoundException)
+            assert isinstance(results['malformed'], exceptions.InvalidValueException)
+            with temp_dir({'malicious': EICAR, 'missing': EICAR}) as (path, files):
+                os.remove(files[1])
+                results = dict([result async for result in api.submit_many(files, workers=2)])
+                assert results[files[0]].filename == 'malicious'
+                assert isinstance(results[files[1]], Exception)
+            assert (await api.tag_create('trojan')).name == 'trojan'
+            assert (await api.tag_get('trojan')).name == 'trojan'
+        self.run_with_server(test)
+
+    @mock.patch('polyswarm_api.const.DOWNLOAD_RESUME_ATTEMPTS', 10)
+    @mock.patch('polyswarm_api.const.DOWNLOAD_RESUME_BACKOFF', 0)
+    def test_download_resume(self):
+        size = 1000000
+        sha256 = served_sha256(size)
+
+        async def download(url, path):
+            async with aioapi.AsyncPolyswarmAPI('key', uri=url + '/v2', community='gamma') as api:
+                return await api.download(path, sha256)
+
+        with StandInServer(size, drop_after=300000) as server, temp_dir({}) as (path, _):
+            artifact = asyncio.run(download(server.url, path))
+            assert artifact.sha256 == sha256
+            assert_served_body(os.path.join(path, sha256), size)
+            # aiohttp drops what it buffered of the cut response, each request still continues the previous one
+            offsets = [int(range_[len('bytes='):-1]) for range_ in server.requested[1:]]
+            assert server.requested[0] is None and offsets == sorted(offsets) and offsets[0] > 0
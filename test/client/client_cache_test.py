@@ -0,0 +1,187 @@
+import os
+import time
+from unittest import TestCase
+
+import pytest
+import responses
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import cache, exceptions
+
+from .client_concurrency_test import artifact_instance, EICAR_SHA256
+from .client_scan_test import temp_dir
+
+ENGINES_URL = 'http://localhost:9696/v2/microengines/list'
+ENGINE_ADDRESS = '0x05328f171b8c1463eaFDACCA478D9EE6a1d923F8'
+SEARCH_URL = 'http://localhost:9696/v2/search/hash/sha256'
+TAG_LINK_URL = 'http://localhost:9696/v2/tags/link'
+LOOKUP_URL = 'http://localhost:9696/v2/consumer/submission/gamma/1'
+
+
+def engines_callback(etags, requests):
+    """Serve a single engine named after the current etag, answering 304 when the client already has it."""
+    def callback(request):
+        requests.append(request.headers.get('If-None-Match'))
+        etag = etags[-1]
+        if request.headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, ''
+        body = '{{"result": [{{"address": "{}", "name": "{}"}}], "status": "OK"}}'.format(ENGINE_ADDRESS, etag)
+        return 200, {'ETag': etag}, body
+    return callback
+
+
+class CacheTestCaseV2(TestCase):
+    def __init__(self, *args, **kwargs):
+        super(CacheTestCaseV2, self).__init__(*args, **kwargs)
+        self.test_api_key = '11111111111111111111111111111111'
+
+    def api(self, **kwargs):
+        return PolyswarmAPI(self.test_api_key, uri='http://localhost:9696/v2', community='gamma', **kwargs)
+
+    @responses.activate
+    def test_engine_cache(self):
+        etags, requests = ['Eicar'], []
+        responses.add_callback(responses.GET, ENGINES_URL, callback=engines_callback(etags, requests))
+        with temp_dir({}) as (path, _):
+            engine_cache = cache.EngineCache(path)
+            assert self.api(engine_cache=engine_cache).resolve_engine_name(ENGINE_ADDRESS) == 'eicar'
+            # other processes sharing the directory use the stored list
+            assert self.api(engine_cache=engine_cache).resolve_engine_name(ENGINE_ADDRESS.lower()) == 'eicar'
+            assert requests == [None]
+            assert [name for name in os.listdir(path) if name.startswith('.tmp')] == []
+            # once stale the list is only downloaded again if it changed
+            engine_cache.ttl = 0
+            assert self.api(engine_cache=engine_cache).resolve_engine_name(ENGINE_ADDRESS) == 'eicar'
+            etags.append('Other')
+            assert self.api(engine_cache=engine_cache).resolve_engine_name(ENGINE_ADDRESS) == 'other'
+            assert requests == [None, 'Eicar', 'Eicar']
+            assert engine_cache.load('http://localhost:9696/v2')['etag'] == 'Other'
+            # while another process refreshes the list the stale copy is used
+            with engine_cache.lock('http://localhost:9696/v2') as locked:
+                assert locked
+                etags.append('Third')
+                assert self.api(engine_cache=engine_cache).resolve_engine_name(ENGINE_ADDRESS) == 'other'
+                with engine_cache.lock('http://localhost:9696/v2', blocking=False) as locked:
+                    assert not locked
+            assert requests == [None, 'Eicar', 'Eicar']
+            assert self.api(engine_cache=engine_cache).resolve_engine_name(ENGINE_ADDRESS) == 'third'
+            assert engine_cache.load('http://localhost:9696/v3') is None
+
+    @responses.activate
+    def test_resolve_engine_name_interned(self):
+        responses.add_callback(responses.GET, ENGINES_URL, callback=engines_callback(['Eicar'], []))
+        api = self.api()
+        name = api.resolve_engine_name(ENGINE_ADDRESS)
+        assert api.resolve_engine_name(ENGINE_ADDRESS.lower()) is name
+        assert api.resolve_engine_name('0xUNKNOWN') == '0xunknown'
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_response_cache(self):
+        responses.add(responses.GET, SEARCH_URL, json={'result': [artifact_instance()], 'status': 'OK'})
+        responses.add(responses.GET, LOOKUP_URL, json={'result': artifact_instance(), 'status': 'OK'})
+        response_cache = cache.ResponseCache(max_entries=2)
+        api = self.api(response_cache=response_cache)
+        for _ in range(3):
+            assert [r.sha256 for r in api.search(EICAR_SHA256)] == [EICAR_SHA256]
+        assert (response_cache.hits, response_cache.misses) == (2, 1)
+        # responses are keyed by params and api key
+        list(api.search(EICAR_SHA256.upper()))
+        other_key = PolyswarmAPI('2' * 32, uri='http://localhost:9696/v2', community='gamma',
+                                 response_cache=response_cache)
+        list(other_key.search(EICAR_SHA256))
+        assert (response_cache.hits, response_cache.misses) == (2, 3)
+        # the least recently used responses are dropped
+        list(api.search(EICAR_SHA256))
+        assert (response_cache.hits, response_cache.misses) == (2, 4)
+        # endpoints without a ttl are not cached
+        api.lookup(1)
+        api.lookup(1)
+        assert len([call for call in responses.calls if call.request.url.startswith(SEARCH_URL)]) == 4
+        assert len([call for call in responses.calls if call.request.url == LOOKUP_URL]) == 2
+
+    @responses.activate
+    def test_response_cache_not_found(self):
+        responses.add(responses.GET, SEARCH_URL, json={'result': 'Not Found', 'status': 'NOT_FOUND'}, status=404)
+        api = self.api(response_cache=cache.ResponseCache())
+        for _ in range(2):
+            with pytest.raises(exceptions.NotFoundException):
+                list(api.search(EICAR_SHA256))
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_response_cache_invalidate(self):
+        responses.add(responses.GET, TAG_LINK_URL, json={'result': {'sha256': EICAR_SHA256, 'tags': ['a']}})
+        responses.add(responses.PUT, TAG_LINK_URL, json={'result': {'sha256': EICAR_SHA256, 'tags': ['a', 'b']}})
+        responses.add(responses.GET, TAG_LINK_URL, json={'result': {'sha256': EICAR_SHA256, 'tags': ['a', 'b']}})
+        api = self.api(response_cache=cache.ResponseCache())
+        assert api.tag_link_get(EICAR_SHA256).tags == ['a']
+        assert api.tag_link_get(EICAR_SHA256).tags == ['a']
+        api.tag_link_update(EICAR_SHA256, tags=['b'])
+        assert api.tag_link_get(EICAR_SHA256).tags == ['a', 'b']
+        assert len(responses.calls) == 3
+
+    @responses.activate
+    def test_response_cache_invalidate_disk(self):
+        responses.add(responses.GET, TAG_LINK_URL, json={'result': {'sha256': EICAR_SHA256, 'tags': ['a']}})
+        responses.add(responses.GET, SEARCH_URL, json={'result': [artifact_instance()], 'status': 'OK'})
+        responses.add(responses.PUT, TAG_LINK_URL, json={'result': {'sha256': EICAR_SHA256, 'tags': ['a', 'b']}})
+        with temp_dir({}) as (path, _):
+            api = self.api(response_cache=cache.ResponseCache(path=path))
+            api.tag_link_get(EICAR_SHA256)
+            list(api.search(EICAR_SHA256))
+            assert len(os.listdir(path)) == 2
+            # only the directory of the endpoint is dropped
+            api.tag_link_update(EICAR_SHA256, tags=['b'])
+            assert len(os.listdir(path)) == 1
+            response_cache = cache.ResponseCache(path=path)
+            list(self.api(response_cache=response_cache).search(EICAR_SHA256))
+            assert (response_cache.hits, response_cache.misses) == (1, 0)
+
+    @responses.activate
+    def test_response_cache_sweep(self):
+        responses.add(responses.GET, SEARCH_URL, json={'result': [artifact_instance()], 'status': 'OK'})
+        with temp_dir({}) as (path, _):
+            response_cache = cache.ResponseCache(ttls={'/search/hash': 0.01}, path=path)
+            api = self.api(response_cache=response_cache)
+            list(api.search(EICAR_SHA256))
+            time.sleep(0.02)
+            # expired responses are removed when sweeping
+            response_cache.sweep()
+            assert [os.listdir(os.path.join(path, name)) for name in os.listdir(path)] == [[]]
+            # as are the ones closest to expiring beyond the size limit
+            response_cache = cache.ResponseCache(path=path, max_disk_size=1)
+            api = self.api(response_cache=response_cache)
+            for sha256 in ('a' * 64, 'b' * 64, 'c' * 64):
+                list(api.search(sha256))
+            assert [os.listdir(os.path.join(path, name)) for name in os.listdir(path)] == [[]]
+            response_cache = cache.ResponseCache(path=path)
+            api = self.api(response_cache=response_cache)
+            for sha256 in ('a' * 64, 'b' * 64):
+                list(api.search(sha256))
+            directory, = [os.path.join(path, name) for name in os.listdir(path)]
+            sizes = [os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)]
+            assert len(sizes) == 2
+            response_cache.max_disk_size = max(sizes)
+            response_cache.sweep()
+            assert len(os.listdir(directory)) == 1
+
+    @responses.activate
+    def test_response_cache_disk(self):
+        responses.add(responses.GET, SEARCH_URL, json={'result': [artifact_instance()], 'status': 'OK'})
+        with temp_dir({}) as (path, _):
+            list(self.api(response_cache=cache.ResponseCache(path=path)).search(EICAR_SHA256))
+            # a new process finds the response on disk
+            response_cache = cache.ResponseCache(path=path)
+            assert [r.sha256 for r in self.api(response_cache=response_cache).search(EICAR_SHA256)] == [EICAR_SHA256]
+            assert (response_cache.hits, response_cache.misses) == (1, 0)
+            # but not once it expired
+            path = os.path.join(path, 'short')
+            response_cache = cache.ResponseCache(ttls={'/search/hash': 0.01}, path=path)
+            list(self.api(response_cache=response_cache).search(EICAR_SHA256))
+            assert len(os.listdir(path)) == 1
+            response_cache.clear()
+            time.sleep(0.02)
+            list(self.api(response_cache=response_cache).search(EICAR_SHA256))
+            assert (response_cache.hits, response_cache.misses) == (0, 2)
+        assert len(responses.calls) == 3
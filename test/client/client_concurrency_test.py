@@ -0,0 +1,233 @@
+import hashlib
+import json
+import re
+import threading
+import time
+
+import responses
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import api, exceptions
+from polyswarm_api import polling
+from polyswarm_api.types.resources import Hash
+
+try:
+    from unittest import TestCase, mock
+except ImportError:
+    import mock
+
+from .client_scan_test import temp_dir
+
+
+EICAR_SHA256 = '275a021bbfb6489e54d471899f7db9d1663fc695ec2fe2a2c4538aabf651fd0f'
+
+
+def artifact_instance(**kwargs):
+    json_ = {'account_id': '1', 'artifact_id': '38533123137674971', 'assertions': [], 'community': 'gamma',
+             'country': '', 'created': '2019-12-03T14:53:46.097963', 'extended_type': 'EICAR virus test files',
+             'failed': False, 'filename': 'malicious', 'first_seen': '2019-12-02T23:44:14.864399',
+             'id': 20987685365492783, 'last_seen': '2019-12-03T14:53:46.097963',
+             'md5': '44d88612fea8a8f36de82e1278abb02f', 'metadata': [], 'mimetype': 'text/plain', 'polyscore': None,
+             'result': None, 'sha1': '3395856ce81f2b7382dee72602f798b642f14140', 'sha256': EICAR_SHA256,
+             'size': 68, 'type': 'FILE', 'votes': [], 'window_closed': False}
+    json_.update(kwargs)
+    return json_
+
+
+class ConcurrencyTestCaseV2(TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ConcurrencyTestCaseV2, self).__init__(*args, **kwargs)
+        self.test_api_key = '11111111111111111111111111111111'
+        self.api = PolyswarmAPI(self.test_api_key, uri='http://localhost:9696/v2', community='gamma')
+
+    @responses.activate
+    def test_submit_many(self):
+        in_flight, max_in_flight = [0], [0]
+        lock = threading.Lock()
+        overlapped = threading.Event()
+
+        def callback(request):
+            with lock:
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+                if in_flight[0] > 1:
+                    overlapped.set()
+            # held until another upload is in flight, which only happens if they run concurrently
+            overlapped.wait(5)
+            with lock:
+                in_flight[0] -= 1
+            return 200, {}, json.dumps({'result': artifact_instance(), 'status': 'OK'})
+
+        responses.add_callback(responses.POST, 'http://localhost:9696/v2/consumer/submission/gamma',
+                               callback=callback)
+        with temp_dir({'file{}'.format(i): b'content' for i in range(8)}) as (path, files):
+            results = list(self.api.submit_many(files + ['/does/not/exist'], workers=4))
+        assert len(results) == 9
+        errors = [(artifact, result) for artifact, result in results if isinstance(result, Exception)]
+        assert len(errors) == 1
+        assert errors[0][0] == '/does/not/exist'
+        assert isinstance(errors[0][1], exceptions.ArtifactDeletedException)
+        assert all(result.sha256 == EICAR_SHA256 for _, result in results if not isinstance(result, Exception))
+        assert 1 < max_in_flight[0] <= 4
+
+    @responses.activate
+    def test_submit_many_dedup(self):
+        contents = dict(('file{}'.format(i), 'content {}'.format(i).encode('utf-8') * 100) for i in range(8))
+        known = set(hashlib.sha256(content).hexdigest() for name, content in contents.items() if name < 'file4')
+        searched, uploaded = [], []
+        lock = threading.Lock()
+        all_searched = threading.Event()
+
+        def search(request):
+            with lock:
+                searched.append(request.url)
+                if len(searched) == len(contents):
+                    all_searched.set()
+            if not any(hash_ in request.url for hash_ in known):
+                return 404, {}, json.dumps({'result': 'Not Found', 'status': 'NOT_FOUND'})
+            return 200, {}, json.dumps({'has_more': False, 'limit': 50, 'result': [artifact_instance()],
+                                        'status': 'OK'})
+
+        def upload(request):
+            # held until every file was searched, which only happens if the searches do not wait for the uploads
+            uploaded.append(all_searched.wait(5))
+            return 200, {}, json.dumps({'result': artifact_instance(), 'status': 'OK'})
+
+        responses.add_callback(responses.GET, re.compile(r'http://localhost:9696/v2/search/hash/sha256'),
+                               callback=search)
+        responses.add_callback(responses.POST, 'http://localhost:9696/v2/consumer/submission/gamma', callback=upload)
+        responses.add_callback(responses.POST, re.compile(r'http://localhost:9696/v2/consumer/submission/gamma/'
+                                                          r'rescan/sha256/\w+'),
+                               callback=lambda request: (200, {}, json.dumps({'result': artifact_instance(),
+                                                                              'status': 'OK'})))
+        stats = api.SubmissionStats()
+        with temp_dir(contents) as (path, files):
+            # the 9 artifacts fit in the 12 searched ahead of the uploads
+            results = list(self.api.submit_many(files + ['/does/not/exist'], workers=3, dedup=True, stats=stats))
+        assert len(results) == 9
+        assert uploaded == [True] * 4
+        rescans = [call for call in responses.calls if '/rescan/' in call.request.url]
+        assert sorted(call.request.url.rsplit('/', 1)[1] for call in rescans) == sorted(known)
+        assert (stats.uploaded, stats.rescanned, stats.failed) == (4, 4, 1)
+        assert stats.bytes_uploaded == stats.bytes_saved == 4 * 900
+
+    @responses.activate
+    @mock.patch('polyswarm_api.const.POLL_FREQUENCY', 0.01)
+    def test_wait_for_many(self):
+        lookups = {}
+        lock = threading.Lock()
+
+        def callback(request):
+            scan = int(request.url.rsplit('/', 1)[1])
+            with lock:
+                lookups[scan] = lookups.get(scan, 0) + 1
+                # scan n closes its window on the n-th lookup
+                window_closed = lookups[scan] >= scan
+            return 200, {}, json.dumps({'result': artifact_instance(id=scan, window_closed=window_closed,
+                                                                    failed=scan == 2),
+                                        'status': 'OK'})
+
+        responses.add_callback(responses.GET, re.compile(r'http://localhost:9696/v2/consumer/submission/gamma/\d+'),
+                               callback=callback)
+        results = list(self.api.wait_for_many([3, 1, 5, 2], timeout=10, workers=2))
+        # 1 and 2 are due first and finish on their first lookup, in either order
+        assert sorted(scan for scan, _ in results[:2]) == [1, 2]
+        assert sorted(int(result) for _, result in results) == [1, 2, 3, 5]
+        assert all(scan == int(result) for scan, result in results)
+        assert lookups == {1: 1, 2: 1, 3: 3, 5: 5}
+
+    @responses.activate
+    @mock.patch('polyswarm_api.const.POLL_FREQUENCY', 0.01)
+    def test_wait_for_many_errors(self):
+        lookups = []
+        lock = threading.Lock()
+
+        def callback(request):
+            scan = int(request.url.rsplit('/', 1)[1])
+            with lock:
+                lookups.append(scan)
+                attempt = lookups.count(scan)
+            if scan == 404:
+                return 404, {}, json.dumps({'result': 'Not Found', 'status': 'NOT_FOUND'})
+            if scan == 429 and attempt == 1:
+                return 429, {}, json.dumps({'result': 'Too Many Requests', 'status': 'error'})
+            return 200, {}, json.dumps({'result': artifact_instance(id=scan, window_closed=True), 'status': 'OK'})
+
+        responses.add_callback(responses.GET, re.compile(r'http://localhost:9696/v2/consumer/submission/gamma/\d+'),
+                               callback=callback)
+        results = list(self.api.wait_for_many([404, 429, 1], timeout=10, workers=2))
+        errors = [(scan, result) for scan, result in results if isinstance(result, Exception)]
+        assert len(errors) == 1 and errors[0][0] == 404
+        assert isinstance(errors[0][1], exceptions.NotFoundException)
+        # the rate limited lookup is polled again
+        assert sorted(int(result) for _, result in results if not isinstance(result, Exception)) == [1, 429]
+        assert lookups.count(429) == 2
+
+    @responses.activate
+    @mock.patch('polyswarm_api.const.POLL_FREQUENCY', 0.01)
+    def test_wait_for_many_timeout(self):
+        responses.add(responses.GET, re.compile(r'http://localhost:9696/v2/consumer/submission/gamma/\d+'),
+                      json={'result': artifact_instance(window_closed=False), 'status': 'OK'})
+        with self.assertRaises(exceptions.TimeoutException):
+            list(self.api.wait_for_many([1, 2], timeout=0.1))
+
+    @responses.activate
+    def test_wait_for_deadline(self):
+        responses.add(responses.GET, 'http://localhost:9696/v2/consumer/submission/gamma/1',
+                      json={'result': artifact_instance(window_closed=False), 'status': 'OK'})
+        start = time.time()
+        with self.assertRaises(exceptions.TimeoutException):
+            self.api.wait_for(1, deadline=start + 0.2, poll_policy=polling.FixedPollPolicy(0.05))
+        assert time.time() - start < 1
+        assert 2 < len(responses.calls) < 10
+
+    def test_adaptive_poll_policy(self):
+        policy = polling.AdaptivePollPolicy(window=20, near_delay=0.5, max_delay=15, backoff=0.5, jitter=0)
+        # skip ahead to just before the expected window close
+        assert policy.delay(1, 0) == 19.5
+        # poll fast around the expected close
+        assert policy.delay(2, 19.5) == 0.5
+        assert policy.delay(3, 20.2) == 0.5
+        # then back off exponentially up to the maximum delay
+        assert policy.delay(4, 22) == 1
+        assert policy.delay(5, 30) == 5
+        assert policy.delay(6, 100) == 15
+
+    def test_poll_policy_abstract(self):
+        class NoDelay(polling.PollPolicy):
+            pass
+
+        with self.assertRaises(TypeError):
+            NoDelay()
+
+    @responses.activate
+    def test_search_hashes(self):
+        md5 = '44d88612fea8a8f36de82e1278abb02f'
+        unknown = 'a' * 64
+        def callback(request):
+            if unknown in request.url:
+                return 404, {}, json.dumps({'result': 'Not Found', 'status': 'NOT_FOUND'})
+            return 200, {}, json.dumps({'has_more': False, 'limit': 50, 'result': [artifact_instance()], 'status': 'OK'})
+
+        responses.add_callback(responses.GET, re.compile(r'http://localhost:9696/v2/search/hash/(sha256|md5)'),
+                               callback=callback)
+        hashes = [EICAR_SHA256, md5, ' ' + EICAR_SHA256.upper(), 'malformed', 42, None, unknown, Hash(md5)]
+        results = {}
+        for hash_, result in self.api.search_hashes(hashes):
+            hash_ = getattr(hash_, 'hash', hash_)
+            results[hash_.lower() if isinstance(hash_, str) else hash_] = result
+        assert len(responses.calls) == 3
+        # a malformed hash, or a value that is not a hash at all, does not abort the others
+        for hash_ in ('malformed', 42, None):
+            assert isinstance(results[hash_], exceptions.InvalidValueException)
+        assert [result.sha256 for result in results[EICAR_SHA256]] == [EICAR_SHA256]
+        assert [result.md5 for result in results[md5]] == [md5]
+        assert isinstance(results[unknown], exceptions.NotFoundException)
+
+    @responses.activate
+    def test_hash_search(self):
+        responses.add(responses.GET, 'http://localhost:9696/v2/search/hash/sha256',
+                      json={'has_more': False, 'limit': 50, 'result': [artifact_instance()], 'status': 'OK'})
+        [(hash_, results)] = list(Hash(EICAR_SHA256, polyswarm=self.api).search())
+        assert hash_.hash == EICAR_SHA256
+        assert results[0].sha256 == EICAR_SHA256
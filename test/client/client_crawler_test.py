@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+
+import responses
+
+try:
+    from unittest import TestCase, mock
+except ImportError:
+    from unittest import TestCase
+    import mock
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import crawler
+
+from .client_concurrency_test import artifact_instance
+from .client_scan_test import temp_dir
+
+SUBMISSION_URL = 'http://localhost:9696/v2/consumer/submission/gamma'
+
+
+def crawled(root, index):
+    return dict((os.path.relpath(result.path, root), result) for result in crawler.crawl(root, index, workers=3))
+
+
+class CrawlerTestCaseV2(TestCase):
+    def __init__(self, *args, **kwargs):
+        super(CrawlerTestCaseV2, self).__init__(*args, **kwargs)
+        self.test_api_key = '11111111111111111111111111111111'
+
+    def test_crawl_incremental(self):
+        with temp_dir({'a': b'a', 'b': b'b'}) as (root, _), temp_dir({}) as (index_dir, _):
+            os.makedirs(os.path.join(root, 'sub', 'dir'))
+            with open(os.path.join(root, 'sub', 'dir', 'c'), 'wb') as f:
+                f.write(b'c')
+            os.symlink(os.path.join(root, 'a'), os.path.join(root, 'link'))
+            index_path = os.path.join(index_dir, 'index.sqlite3')
+            with crawler.HashIndex(index_path) as index:
+                results = crawled(root, index)
+                assert sorted(results) == ['a', 'b', os.path.join('sub', 'dir', 'c')]
+                assert all(result.changed for result in results.values())
+                assert results['a'].sha256 == hashlib.sha256(b'a').hexdigest()
+                assert results['b'].md5 == hashlib.md5(b'b').hexdigest()
+            # a new run only reads the files that changed
+            with open(os.path.join(root, 'b'), 'wb') as f:
+                f.write(b'changed')
+            os.utime(os.path.join(root, 'b'), (0, 0))
+            with crawler.HashIndex(index_path) as index, \
+                    mock.patch('polyswarm_api.crawler._hash', wraps=crawler._hash) as hash_:
+                results = crawled(root, index)
+                assert hash_.call_count == 1
+                assert [name for name, result in results.items() if result.changed] == ['b']
+                assert results['b'].sha256 == hashlib.sha256(b'changed').hexdigest()
+                assert results['a'].sha256 == hashlib.sha256(b'a').hexdigest()
+                os.remove(os.path.join(root, 'a'))
+                assert index.prune() == 1
+                assert crawled(root, index)['b'].changed is False
+
+    @responses.activate
+    def test_submit_directory(self):
+        uploads = []
+        lock = threading.Lock()
+        fail = [os.path.join('sub', 'fail')]
+
+        def callback(request):
+            content = request.body
+            with lock:
+                uploads.append(content)
+            if b'fail' in content and fail:
+                return 500, {}, json.dumps({'result': 'error', 'status': 'error'})
+            return 200, {}, json.dumps({'result': artifact_instance(), 'status': 'OK'})
+
+        responses.add_callback(responses.POST, SUBMISSION_URL, callback=callback)
+        files = {'one': b'one', 'two': b'two', 'copy_of_one': b'one'}
+        with temp_dir(files) as (root, _), temp_dir({}) as (index_dir, _):
+            os.makedirs(os.path.join(root, 'sub'))
+            with open(os.path.join(root, *fail), 'wb') as f:
+                f.write(b'fail')
+            with crawler.HashIndex(os.path.join(index_dir, 'index.sqlite3')) as index:
+                api = PolyswarmAPI(self.test_api_key, uri='http://localhost:9696/v2', community='gamma')
+                results = dict((os.path.relpath(path, root), result)
+                               for path, result in api.submit_directory(root, index, workers=2))
+                # the same content is only uploaded once
+                assert len(uploads) == 3
+                assert len(results) == 3 and 'two' in results and fail[0] in results
+                assert ('one' in results) != ('copy_of_one' in results)
+                assert isinstance(results[fail[0]], Exception)
+                # only the failed upload is tried again
+                del uploads[:]
+                fail.pop()
+                results = list(api.submit_directory(root, index))
+                assert [os.path.relpath(path, root) for path, _ in results] == [os.path.join('sub', 'fail')]
+                assert len(uploads) == 1
+                with open(os.path.join(root, 'three'), 'wb') as f:
+                    f.write(b'three')
+                del uploads[:]
+                results = list(api.submit_directory(root, index))
+                assert [os.path.relpath(path, root) for path, _ in results] == ['three']
+                assert len(uploads) == 1
@@ -0,0 +1,64 @@
+import json
+from unittest import TestCase
+
+import pytest
+import responses
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import exceptions, http
+
+from .client_pagination_test import HUNT_RESULTS_URL, hunt_result
+
+
+class DecoderTestCaseV2(TestCase):
+    def __init__(self, *args, **kwargs):
+        super(DecoderTestCaseV2, self).__init__(*args, **kwargs)
+        self.test_api_key = '11111111111111111111111111111111'
+
+    def api(self, **kwargs):
+        return PolyswarmAPI(self.test_api_key, uri='http://localhost:9696/v2', community='gamma', **kwargs)
+
+    def test_default_decoder(self):
+        decoder = http.default_json_decoder()
+        if http.orjson is not None:
+            assert decoder is http.orjson.loads
+        content = u'{"result": [1, "\xe9"]}'.encode('utf-8')
+        assert decoder(content) == http._stdlib_loads(content) == {'result': [1, u'\xe9']}
+
+    @responses.activate
+    def test_custom_decoder(self):
+        bodies = []
+
+        def decoder(content):
+            bodies.append(content)
+            return json.loads(content.decode('utf-8'))
+        body = {'has_more': False, 'limit': 1, 'offset': 1, 'result': [hunt_result(0)], 'status': 'OK'}
+        responses.add(responses.GET, HUNT_RESULTS_URL, json=body)
+        results = list(self.api(json_decoder=decoder).historical_results(hunt=1))
+        assert [int(result) for result in results] == [0]
+        # the decoder gets the raw bytes of the body
+        assert [json.loads(content.decode('utf-8')) for content in bodies] == [body]
+
+    @responses.activate
+    def test_custom_decoder_streamed(self):
+        bodies = []
+
+        def decoder(content):
+            bodies.append(content)
+            return json.loads(content.decode('utf-8'))
+        body = {'has_more': False, 'limit': 2, 'offset': 2, 'result': [hunt_result(0), hunt_result(1)], 'status': 'OK'}
+        responses.add(responses.GET, HUNT_RESULTS_URL, json=body)
+        results = list(self.api(json_decoder=decoder, stream_results=True).historical_results(hunt=1))
+        assert [int(result) for result in results] == [0, 1]
+        # each streamed item is decoded from its own bytes
+        assert [json.loads(content.decode('utf-8')) for content in bodies] == body['result']
+
+    @responses.activate
+    def test_invalid_json(self):
+        responses.add(responses.GET, HUNT_RESULTS_URL, body='<html>Bad Gateway</html>', status=200)
+        responses.add(responses.GET, HUNT_RESULTS_URL, body='<html>Not Found</html>', status=404)
+        with pytest.raises(exceptions.RequestException) as e:
+            list(self.api().historical_results(hunt=1))
+        assert 'non-JSON' in str(e.value)
+        with pytest.raises(exceptions.NotFoundException):
+            list(self.api().historical_results(hunt=1))
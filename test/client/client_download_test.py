@@ -0,0 +1,303 @@
+import hashlib
+import os
+try:
+    from unittest import TestCase, mock
+except ImportError:
+    from unittest import TestCase
+    import mock
+
+import pytest
+import responses
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import cache, const, exceptions
+from polyswarm_api.types import resources
+
+from .client_concurrency_test import EICAR_SHA256
+from .client_scan_test import temp_dir
+from ..utils.http_server import StandInServer, body
+
+tracemalloc = pytest.importorskip('tracemalloc')
+
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+DOWNLOAD_URL = 'http://localhost:9696/v2/download/sha256/' + EICAR_SHA256
+
+
+def served_sha256(size):
+    hasher = hashlib.sha256()
+    for offset in range(0, size, const.DOWNLOAD_CHUNK_SIZE):
+        hasher.update(body(offset, min(offset + const.DOWNLOAD_CHUNK_SIZE, size)))
+    return hasher.hexdigest()
+
+
+def assert_served_body(path, size):
+    assert os.path.getsize(path) == size
+    with open(path, 'rb') as f:
+        offset = 0
+        for chunk in iter(lambda: f.read(const.DOWNLOAD_CHUNK_SIZE), b''):
+            assert chunk == body(offset, offset + len(chunk))
+            offset += len(chunk)
+
+
+class DownloadTestCaseV2(TestCase):
+    def __init__(self, *args, **kwargs):
+        super(DownloadTestCaseV2, self).__init__(*args, **kwargs)
+        self.test_api_key = '11111111111111111111111111111111'
+
+    def test_download_memory_bound(self):
+        size = 16 * const.DOWNLOAD_CHUNK_SIZE
+        sha256 = served_sha256(size)
+        with StandInServer(size) as server, temp_dir({}) as (path, _):
+            api = PolyswarmAPI(self.test_api_key, uri=server.url + '/v2', community='gamma')
+            downloads = [
+                (lambda: api.download(path, sha256), os.path.join(path, sha256)),
+                (lambda: api.download_archive(path, server.url + '/archive.zip'), os.path.join(path, 'archive.zip')),
+            ]
+            for download, downloaded_path in downloads:
+                tracemalloc.start()
+                try:
+                    download()
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                # the body is streamed to disk a chunk at a time instead of being buffered in memory
+                assert peak < 3 * const.DOWNLOAD_CHUNK_SIZE
+                assert_served_body(downloaded_path, size)
+
+    def api(self):
+        return PolyswarmAPI(self.test_api_key, uri='http://localhost:9696/v2', community='gamma')
+
+    @responses.activate
+    def test_download_stored(self):
+        responses.add(responses.GET, DOWNLOAD_URL, body=EICAR, stream=True)
+        with temp_dir({}) as (path, _):
+            for _ in range(2):
+                artifact = self.api().download(path, EICAR_SHA256)
+                assert artifact.artifact_name == EICAR_SHA256
+            assert len(responses.calls) == 1
+            # a copy not matching its hash is replaced
+            with open(os.path.join(path, EICAR_SHA256), 'wb') as f:
+                f.write(b'corrupt')
+            self.api().download(path, EICAR_SHA256)
+            assert len(responses.calls) == 2
+            with open(os.path.join(path, EICAR_SHA256), 'rb') as f:
+                assert f.read() == EICAR
+
+    @responses.activate
+    def test_download_mismatch(self):
+        responses.add(responses.GET, DOWNLOAD_URL, body=EICAR[:-1], stream=True)
+        with temp_dir({}) as (path, _):
+            with pytest.raises(exceptions.ChecksumMismatchException):
+                self.api().download(path, EICAR_SHA256)
+            # neither the partial file nor the temporary one are left behind
+            assert os.listdir(path) == []
+
+    @responses.activate
+    def test_download_not_found(self):
+        responses.add(responses.GET, 'http://localhost:9696/v2/download/sha256/' + 'a' * 64, status=404,
+                      json={'result': 'Not Found', 'status': 'error'})
+        with temp_dir({}) as (path, _):
+            with pytest.raises(exceptions.NotFoundException):
+                self.api().download(path, 'a' * 64)
+            # no empty partial file to resume
+            assert os.listdir(path) == []
+
+    @responses.activate
+    def test_download_larger_than_store(self):
+        responses.add(responses.GET, DOWNLOAD_URL, body=EICAR, stream=True)
+        with temp_dir({}) as (path, _):
+            store = cache.ArtifactStore(path, max_size=len(EICAR) - 1)
+            # the artifact just stored is kept whatever the limit
+            assert self.api().download(store, EICAR_SHA256).sha256 == EICAR_SHA256
+            assert os.listdir(path) == [EICAR_SHA256]
+
+    @responses.activate
+    def test_download_analyzed(self):
+        class Size(object):
+            def __init__(self):
+                self.size = 0
+
+            def update(self, data):
+                self.size += len(data)
+
+            def result(self):
+                return self.size
+
+        responses.add(responses.GET, DOWNLOAD_URL, body=EICAR, stream=True)
+        with temp_dir({}) as (path, _), mock.patch.dict(resources._analyzers, {'size': Size}), \
+                mock.patch('polyswarm_api.types.resources._read_chunks') as read_chunks, \
+                mock.patch('polyswarm_api.types.resources.all_hashes') as all_hashes:
+            # downloaded, then found in the store
+            for _ in range(2):
+                artifact = self.api().download(path, EICAR_SHA256)
+                assert artifact.analyzed
+                assert artifact.sha256 == EICAR_SHA256
+                assert artifact.sha1 == hashlib.sha1(EICAR).hexdigest()
+                assert artifact.md5 == hashlib.md5(EICAR).hexdigest()
+                assert artifact.analyses == {'size': len(EICAR)}
+            # the file was never read back to analyze it
+            assert not read_chunks.called and not all_hashes.called
+            assert len(responses.calls) == 1
+
+    def test_artifact_store_eviction(self):
+        hashes = [hashlib.sha256(str(i).encode('utf-8')).hexdigest() for i in range(4)]
+        with temp_dir(dict((h, b'x' * 10) for h in hashes + ['notes.txt'])) as (path, _):
+            for age, h in enumerate(hashes):
+                os.utime(os.path.join(path, h), (0, 1000000 - age))
+            cache.ArtifactStore(path, max_size=25).evict()
+            assert sorted(os.listdir(path)) == sorted(hashes[:2] + ['notes.txt'])
+            cache.ArtifactStore(path, max_age=60).evict()
+            assert os.listdir(path) == ['notes.txt']
+
+    # what was read of a chunk when the connection drops is lost, so drops happen at chunk boundaries
+    @mock.patch('polyswarm_api.const.DOWNLOAD_CHUNK_SIZE', 100000)
+    @mock.patch('polyswarm_api.const.DOWNLOAD_RESUME_BACKOFF', 0)
+    def test_download_resume(self):
+        size, drop_after = 1000000, 300000
+        sha256 = served_sha256(size)
+        with StandInServer(size, drop_after=drop_after) as server, temp_dir({}) as (path, _):
+            api = PolyswarmAPI(self.test_api_key, uri=server.url + '/v2', community='gamma')
+            # the content already in the part file is analyzed as well
+            assert api.download(path, sha256).sha256 == sha256
+            api.download_archive(path, server.url + '/archive.zip')
+            for name in (sha256, 'archive.zip'):
+                assert_served_body(os.path.join(path, name), size)
+            assert sorted(os.listdir(path)) == sorted([sha256, 'archive.zip'])
+            # each request continues where the previous one was cut
+            ranges = [None, 'bytes=300000-', 'bytes=600000-', 'bytes=900000-']
+            assert server.requested == ranges + ranges
+
+    @mock.patch('polyswarm_api.const.DOWNLOAD_CHUNK_SIZE', 100000)
+    @mock.patch('polyswarm_api.const.DOWNLOAD_RESUME_BACKOFF', 0)
+    def test_download_resume_later(self):
+        size = 1000000
+        sha256 = served_sha256(size)
+        with temp_dir({}) as (path, _):
+            with StandInServer(size, drop_after=400000) as server:
+                api = PolyswarmAPI(self.test_api_key, uri=server.url + '/v2', community='gamma')
+                with mock.patch('polyswarm_api.const.DOWNLOAD_RESUME_ATTEMPTS', 1):
+                    with pytest.raises(exceptions.RequestException):
+                        api.download(path, sha256)
+            # the partial file is kept for the next attempt
+            assert os.path.getsize(os.path.join(path, sha256 + '.part')) == 400000
+            with StandInServer(size, ranges=False) as server:
+                api = PolyswarmAPI(self.test_api_key, uri=server.url + '/v2', community='gamma')
+                with StandInServer(size) as ranged_server:
+                    ranged_api = PolyswarmAPI(self.test_api_key, uri=ranged_server.url + '/v2', community='gamma')
+                    ranged_api.download(path, sha256)
+                    assert ranged_server.requested == ['bytes=400000-']
+                assert_served_body(os.path.join(path, sha256), size)
+                # a server ignoring the Range header sends the whole body again
+                with open(os.path.join(path, 'archive.zip.part'), 'wb') as f:
+                    f.write(b'stale')
+                api.download_archive(path, server.url + '/archive.zip')
+                assert server.requested == ['bytes=5-']
+                assert_served_body(os.path.join(path, 'archive.zip'), size)
+
+    def test_download_archive_checked(self):
+        size = 100000
+        with temp_dir({}) as (path, _):
+            with StandInServer(size, etag=True) as server:
+                self.api().download_archive(path, server.url + '/archive.zip')
+                assert_served_body(os.path.join(path, 'archive.zip'), size)
+            with StandInServer(size, etag='0' * 32) as server:
+                with pytest.raises(exceptions.ChecksumMismatchException):
+                    self.api().download_archive(path, server.url + '/corrupt.zip')
+            assert os.listdir(path) == ['archive.zip']
+
+    def test_download_complete_part(self):
+        size = 100000
+        with temp_dir({}) as (path, _):
+            # a part file holding the whole body is checked instead of being downloaded again
+            with open(os.path.join(path, 'archive.zip.part'), 'wb') as f:
+                f.write(body(0, size))
+            with StandInServer(size, etag=True) as server:
+                self.api().download_archive(path, server.url + '/archive.zip')
+                assert server.requested == ['bytes=100000-']
+            assert_served_body(os.path.join(path, 'archive.zip'), size)
+            # one of the same size with another content is not committed
+            for segments in (1, 4):
+                with open(os.path.join(path, 'corrupt.zip.part'), 'wb') as f:
+                    f.write(b'\0' * size)
+                with StandInServer(size, etag=True) as server:
+                    with pytest.raises(exceptions.ChecksumMismatchException):
+                        self.api().download_archive(path, server.url + '/corrupt.zip', segments=segments)
+                assert os.listdir(path) == ['archive.zip']
+            # one longer than the body is downloaded again
+            for segments, requested in ((1, ['bytes=100005-', None]), (4, ['bytes=100005-100005', 'bytes=0-0'])):
+                with open(os.path.join(path, 'long.zip.part'), 'wb') as f:
+                    f.write(body(0, size) + b'extra')
+                with StandInServer(size, etag=True) as server:
+                    self.api().download_archive(path, server.url + '/long.zip', segments=segments)
+                    assert server.requested[:2] == requested
+                assert_served_body(os.path.join(path, 'long.zip'), size)
+
+    def test_partial_file_locked(self):
+        with temp_dir({}) as (path, _):
+            first = cache.PartialFile(os.path.join(path, 'archive.zip'))
+            # a second job does not interleave its bytes with the first one
+            second = cache.PartialFile(os.path.join(path, 'archive.zip'))
+            assert first.resumable and not second.resumable
+            assert second.part_path != first.part_path
+            first.write(b'first')
+            second.write(b'second')
+            second.abandon()
+            assert os.listdir(path) == ['archive.zip.part']
+            first.commit()
+            with open(os.path.join(path, 'archive.zip'), 'rb') as f:
+                assert f.read() == b'first'
+
+    @mock.patch('polyswarm_api.const.DOWNLOAD_CHUNK_SIZE', 50000)
+    @mock.patch('polyswarm_api.const.DOWNLOAD_RESUME_BACKOFF', 0)
+    def test_download_segmented(self):
+        size = 1000001
+        with temp_dir({}) as (path, _):
+            with StandInServer(size, etag=True) as server:
+                self.api().download_archive(path, server.url + '/archive.zip', segments=4)
+                assert_served_body(os.path.join(path, 'archive.zip'), size)
+                # the size is learned from the first byte, the rest is split evenly
+                assert server.requested[0] == 'bytes=0-0'
+                assert sorted(server.requested[1:]) == ['bytes=1-250000', 'bytes=250001-500000',
+                                                        'bytes=500001-750000', 'bytes=750001-1000000']
+            # each segment resumes on its own
+            with StandInServer(size, drop_after=100000, etag=True) as server:
+                self.api().download_archive(path, server.url + '/dropped.zip', segments=4)
+                assert_served_body(os.path.join(path, 'dropped.zip'), size)
+                assert 'bytes=100001-250000' in server.requested
+            # without Range support the whole body comes with the first request
+            with StandInServer(size, ranges=False) as server:
+                self.api().download_archive(path, server.url + '/whole.zip', segments=4)
+                assert_served_body(os.path.join(path, 'whole.zip'), size)
+                assert server.requested == ['bytes=0-0']
+            with StandInServer(size, etag='0' * 32) as server:
+                with pytest.raises(exceptions.ChecksumMismatchException):
+                    self.api().download_archive(path, server.url + '/corrupt.zip', segments=4)
+            assert sorted(os.listdir(path)) == ['archive.zip', 'dropped.zip', 'whole.zip']
+
+    @mock.patch('polyswarm_api.const.DOWNLOAD_CHUNK_SIZE', 50000)
+    @mock.patch('polyswarm_api.const.DOWNLOAD_RESUME_BACKOFF', 0)
+    def test_download_segmented_resume(self):
+        size = 1000001
+        with temp_dir({}) as (path, _):
+            part_path = os.path.join(path, 'archive.zip.part')
+            with StandInServer(size, drop_after=100000, etag=True) as server:
+                with mock.patch('polyswarm_api.const.DOWNLOAD_RESUME_ATTEMPTS', 1):
+                    with pytest.raises(exceptions.RequestException):
+                        self.api().download_archive(path, server.url + '/archive.zip', segments=4)
+            # only the bytes written from the start without a gap are kept
+            assert os.listdir(path) == ['archive.zip.part']
+            assert os.path.getsize(part_path) == 100001
+            with StandInServer(size, etag=True) as server:
+                self.api().download_archive(path, server.url + '/archive.zip', segments=4)
+                assert server.requested[0] == 'bytes=100001-100001'
+            assert_served_body(os.path.join(path, 'archive.zip'), size)
+            # a process dying in the middle of a segmented download leaves the part file at its full size
+            with open(part_path, 'wb') as f:
+                f.write(body(0, 1000) + b'\0' * (size - 1000))
+            with open(part_path + '.written', 'wb') as f:
+                f.write(b'1000')
+            with StandInServer(size, etag=True) as server:
+                self.api().download_archive(path, server.url + '/archive.zip', segments=4)
+                assert server.requested[0] == 'bytes=1000-1000'
+            assert_served_body(os.path.join(path, 'archive.zip'), size)
+            assert os.listdir(path) == ['archive.zip']
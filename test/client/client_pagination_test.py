@@ -0,0 +1,135 @@
+import json
+import threading
+import time
+from unittest import TestCase
+
+import pytest
+import responses
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import exceptions
+
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+
+from .client_concurrency_test import artifact_instance
+
+
+HUNT_RESULTS_URL = 'http://localhost:9696/v2/hunt/historical/results'
+
+
+def hunt_result(id_):
+    return {'artifact': artifact_instance(), 'created': '2019-11-14T20:52:13.740679', 'historicalscan_id': '1',
+            'id': str(id_), 'livescan_id': None, 'rule_name': 'eicar', 'sha256': artifact_instance()['sha256'],
+            'tags': ''}
+
+
+def paged_callback(total, limit, delay=0, fail_at=None, requested=None):
+    """Serve `total` hunt results `limit` at a time, tracking the offsets requested."""
+    def callback(request):
+        offset = int(parse_qs(urlparse(request.url).query).get('offset', ['0'])[0])
+        if requested is not None:
+            requested.append(offset)
+        if offset == fail_at:
+            return 500, {}, json.dumps({'result': 'Internal error', 'status': 'ERROR'})
+        time.sleep(delay)
+        end = min(offset + limit, total)
+        body = {'has_more': end < total, 'limit': limit, 'offset': end, 'total': total, 'status': 'OK',
+                'result': [hunt_result(i) for i in range(offset, end)]}
+        return 200, {}, json.dumps(body)
+    return callback
+
+
+class PaginationTestCaseV2(TestCase):
+    def __init__(self, *args, **kwargs):
+        super(PaginationTestCaseV2, self).__init__(*args, **kwargs)
+        self.test_api_key = '11111111111111111111111111111111'
+
+    def api(self, **kwargs):
+        return PolyswarmAPI(self.test_api_key, uri='http://localhost:9696/v2', community='gamma', **kwargs)
+
+    @responses.activate
+    def test_prefetch(self):
+        requested = []
+        serve = paged_callback(50, 10, requested=requested)
+        buffered = threading.Event()
+
+        def callback(request):
+            response = serve(request)
+            # the first page, two buffered ones and the one waiting for room in the buffer
+            if len(requested) == 4:
+                buffered.set()
+            return response
+
+        responses.add_callback(responses.GET, HUNT_RESULTS_URL, callback=callback)
+        results = self.api(prefetch=2).historical_results(hunt=1)
+        assert int(next(results)) == 0
+        # the next pages are fetched in the background, but no further than the buffer allows
+        assert buffered.wait(5)
+        assert requested == [0, 10, 20, 30]
+        assert [int(result) for result in results] == list(range(1, 50))
+        assert requested == [0, 10, 20, 30, 40]
+
+    @responses.activate
+    def test_prefetch_abandoned(self):
+        requested = []
+        responses.add_callback(responses.GET, HUNT_RESULTS_URL,
+                               callback=paged_callback(1000, 10, requested=requested))
+        results = self.api(prefetch=1).historical_results(hunt=1)
+        next(results)
+        fetcher, = [thread for thread in threading.enumerate() if thread.name == 'polyswarm-prefetch']
+        results.close()
+        # the fetcher stops instead of walking the remaining pages
+        fetcher.join(5)
+        assert not fetcher.is_alive()
+        assert len(requested) < 5
+
+    @responses.activate
+    def test_prefetch_error(self):
+        responses.add_callback(responses.GET, HUNT_RESULTS_URL, callback=paged_callback(50, 10, fail_at=20))
+        results = self.api(prefetch=3).historical_results(hunt=1)
+        assert [int(next(results)) for _ in range(20)] == list(range(20))
+        with pytest.raises(exceptions.RequestException):
+            next(results)
+
+    @responses.activate
+    def test_parallel_pages(self):
+        requested = []
+        serve = paged_callback(95, 10, requested=requested)
+        lock = threading.Lock()
+        arrived = []
+        all_arrived = threading.Event()
+
+        def callback(request):
+            if 'offset' in parse_qs(urlparse(request.url).query):
+                # every remaining page is held until all of them were requested
+                with lock:
+                    arrived.append(request.url)
+                    if len(arrived) == 9:
+                        all_arrived.set()
+                all_arrived.wait(5)
+            return serve(request)
+
+        responses.add_callback(responses.GET, HUNT_RESULTS_URL, callback=callback)
+        results = [int(result) for result in self.api().historical_results(hunt=1, workers=10)]
+        # the 9 remaining pages are fetched at the same time instead of one after another
+        assert all_arrived.is_set()
+        assert results == list(range(95))
+        assert sorted(requested) == list(range(0, 95, 10))
+
+    @responses.activate
+    def test_parallel_pages_unordered(self):
+        responses.add_callback(responses.GET, HUNT_RESULTS_URL, callback=paged_callback(95, 10))
+        results = [int(result) for result in self.api().historical_results(hunt=1, workers=4, ordered=False)]
+        assert sorted(results) == list(range(95))
+
+    @responses.activate
+    def test_parallel_pages_without_total(self):
+        responses.add(responses.GET, HUNT_RESULTS_URL,
+                      json={'has_more': True, 'limit': 1, 'offset': 1, 'result': [hunt_result(0)], 'status': 'OK'})
+        responses.add(responses.GET, HUNT_RESULTS_URL,
+                      json={'has_more': False, 'limit': 1, 'offset': 2, 'result': [hunt_result(1)], 'status': 'OK'})
+        results = [int(result) for result in self.api().historical_results(hunt=1, workers=4)]
+        assert results == [0, 1]
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from email.utils import formatdate
+from unittest import TestCase
+
+import pytest
+import responses
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import exceptions, ratelimit
+
+from .client_concurrency_test import artifact_instance, EICAR_SHA256
+from .client_scan_test import temp_dir
+
+SEARCH_URL = 'http://localhost:9696/v2/search/hash/sha256'
+SUBMISSION_URL = 'http://localhost:9696/v2/consumer/submission/gamma'
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+RATE_LIMITED = json.dumps({'result': 'Too Many Requests', 'status': 'error'})
+
+
+def limited_callback(limited, headers, requests):
+    """Answer 429 to the first `limited` requests, then a single artifact."""
+    def callback(request):
+        requests.append(request.body)
+        if len(requests) <= limited:
+            return 429, headers, RATE_LIMITED
+        return 200, {}, json.dumps({'result': [artifact_instance()], 'status': 'OK'})
+    return callback
+
+
+class RateLimitTestCaseV2(TestCase):
+    def __init__(self, *args, **kwargs):
+        super(RateLimitTestCaseV2, self).__init__(*args, **kwargs)
+        self.test_api_key = '11111111111111111111111111111111'
+
+    def api(self, **kwargs):
+        return PolyswarmAPI(self.test_api_key, uri='http://localhost:9696/v2', community='gamma', **kwargs)
+
+    def test_token_bucket(self):
+        bucket = ratelimit.TokenBucket(100, burst=1)
+        start = time.time()
+
+        def acquire():
+            for _ in range(10):
+                bucket.acquire()
+
+        threads = [threading.Thread(target=acquire) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # the threads share the rate, the first token was saved up
+        assert time.time() - start >= 0.38
+        # every thread waits while the server asked to pause
+        bucket.throttle(0.2)
+        assert bucket.rate == 50 and bucket.throttled == 1
+        bucket.throttle(0.2)
+        assert bucket.throttled == 1
+        assert bucket.reserve() >= 0.19
+        # the rate climbs back after the pause
+        time.sleep(0.3)
+        bucket.reserve()
+        assert 50 < bucket.rate < 100
+
+    def test_headers(self):
+        assert ratelimit.retry_after({'Retry-After': '3'}) == 3
+        assert 8 <= ratelimit.retry_after({'Retry-After': formatdate(time.time() + 10, usegmt=True)}) <= 10
+        assert ratelimit.retry_after({'Retry-After': 'soon'}) is None
+        assert ratelimit.quota({'X-RateLimit-Remaining': '5', 'X-RateLimit-Reset': '10'}) == (5, 10)
+        remaining, reset = ratelimit.quota({'RateLimit-Remaining': '5', 'RateLimit-Reset': str(time.time() + 10)})
+        assert remaining == 5 and 9 <= reset <= 10
+        assert ratelimit.quota({'RateLimit-Remaining': '5'}) is None
+        limiter = ratelimit.RateLimiter(rates={'search': 50})
+        assert limiter.family('/search/hash/sha256') == 'search'
+        assert limiter.family('/consumer/download/stream') == 'download'
+        assert limiter.family('/consumer/submission/gamma') == 'submission'
+        assert limiter.family('/tags/link') is None
+        # the rate stays within what is left of the quota
+        assert not limiter.update('/search/hash/sha256', 200, {'X-RateLimit-Remaining': '10', 'X-RateLimit-Reset': '2'})
+        assert limiter.rates['search'] == 5
+        limiter.update('/search/hash/sha256', 200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '0.2'})
+        assert limiter.bucket('/search/hash/sha256').reserve() >= 0.19
+
+    @responses.activate
+    def test_rate_limited(self):
+        requests = []
+        responses.add_callback(responses.GET, SEARCH_URL,
+                               callback=limited_callback(2, {'Retry-After': '0'}, requests))
+        with pytest.raises(exceptions.UsageLimitsExceededException):
+            list(self.api().search(EICAR_SHA256))
+        # sent again once the server allows it
+        del requests[:]
+        limiter = ratelimit.RateLimiter()
+        result, = list(self.api(rate_limiter=limiter).search(EICAR_SHA256))
+        assert result.sha256 == EICAR_SHA256
+        assert len(requests) == 3
+        assert limiter.rate('search') < limiter.bucket('/search').max_rate
+        assert limiter.rates['hunt'] == limiter.bucket('/hunt').max_rate
+        # until it runs out of retries
+        del requests[:]
+        with pytest.raises(exceptions.UsageLimitsExceededException):
+            list(self.api(rate_limiter=ratelimit.RateLimiter(retries=1)).search(EICAR_SHA256))
+        assert len(requests) == 2
+
+    @responses.activate
+    def test_rate_limited_submission(self):
+        requests = []
+        responses.add_callback(responses.POST, SUBMISSION_URL,
+                               callback=limited_callback(1, {'Retry-After': '0.1'}, requests))
+        limiter = ratelimit.RateLimiter()
+        start = time.time()
+        with temp_dir({'eicar': EICAR}) as (_, files):
+            self.api(rate_limiter=limiter).submit(files[0])
+        assert time.time() - start >= 0.1
+        # the file is uploaded whole again, in a body with a new boundary
+        assert len(requests) == 2 and len(requests[0]) == len(requests[1])
+        assert all(EICAR + b'\r\n' in body for body in requests)
+        assert limiter.bucket('/consumer/submission/gamma').throttled == 1
+
+    @responses.activate
+    def test_rate_limited_too_long(self):
+        requests = []
+        responses.add_callback(responses.GET, SEARCH_URL,
+                               callback=limited_callback(1, {'Retry-After': '3600'}, requests))
+        api = self.api(rate_limiter=ratelimit.RateLimiter(max_wait=1))
+        start = time.time()
+        with pytest.raises(exceptions.UsageLimitsExceededException):
+            list(api.search(EICAR_SHA256))
+        # the next requests fail without being sent until the pause is over
+        with pytest.raises(exceptions.UsageLimitsExceededException):
+            list(api.search(EICAR_SHA256))
+        assert time.time() - start < 1
+        assert len(requests) == 1
+        # as when the quota is exhausted for longer
+        limiter = ratelimit.RateLimiter(max_wait=1)
+        limiter.update('/hunt', 200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '3600'})
+        with pytest.raises(exceptions.UsageLimitsExceededException):
+            limiter.acquire('/hunt')
+        limiter.update('/search', 200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '0.1'})
+        assert limiter.acquire('/search') > 0
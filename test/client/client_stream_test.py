@@ -0,0 +1,112 @@
+import json
+import os
+from unittest import TestCase
+
+import pytest
+import responses
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import exceptions, jsonstream
+
+from .client_pagination_test import HUNT_RESULTS_URL, hunt_result
+
+tracemalloc = pytest.importorskip('tracemalloc')
+
+RESOURCES = os.path.join(os.path.dirname(__file__), '..', 'resources')
+
+
+def chunked(content, size):
+    return (content[i:i + size] for i in range(0, len(content), size))
+
+
+def loads(content):
+    return json.loads(content.decode('utf-8'))
+
+
+def stream_page(content, size, loads=None):
+    return read_page(chunked(content, size), loads)
+
+
+def read_page(chunks, loads=None):
+    stream = jsonstream.ObjectStream(chunks, loads=loads)
+    members = stream.read_until(('result',))
+    if stream.key is not None:
+        members[stream.key] = list(stream.items())
+        members.update(stream.read_until(()))
+    return members
+
+
+class StreamTestCaseV2(TestCase):
+    def __init__(self, *args, **kwargs):
+        super(StreamTestCaseV2, self).__init__(*args, **kwargs)
+        self.test_api_key = '11111111111111111111111111111111'
+
+    def api(self, **kwargs):
+        return PolyswarmAPI(self.test_api_key, uri='http://localhost:9696/v2', community='gamma', **kwargs)
+
+    def test_object_stream(self):
+        for name in ('search_hash_page.json', 'hunt_results_page.json', 'metadata_page.json'):
+            with open(os.path.join(RESOURCES, name), 'rb') as f:
+                content = f.read()
+            for size in (1, 7, 4096):
+                assert stream_page(content, size) == json.loads(content.decode('utf-8'))
+                assert stream_page(content, size, loads) == json.loads(content.decode('utf-8'))
+        content = u' { "result" : [ ] , "total": 12345, "name": "éé" } '.encode('utf-8')
+        assert stream_page(content, 1) == {'result': [], 'total': 12345, 'name': u'éé'}
+        assert stream_page(b'{"result": {"id": 1}}', 3) == {'result': {'id': 1}}
+        # items are cut out whole, whatever brackets or escaped quotes their strings hold
+        content = u'{"result": [12, "a\\"]}[", {"b": ["}", 1.5e3]}, true, null, "é"]}'.encode('utf-8')
+        for size in (1, 2, 4096):
+            assert stream_page(content, size, loads) == json.loads(content.decode('utf-8'))
+        for content in (b'{"result": [1, 2', b'{"result": [1 2]}', b'[1, 2]', b'{"result": [1], }',
+                        b'{"result": [{"a": 1]}', b'{"result": ["a]}'):
+            for loads_ in (None, loads):
+                with pytest.raises(jsonstream.JSONStreamError):
+                    stream_page(content, 2, loads_)
+
+    def test_object_stream_split_numbers(self):
+        # a chunk may end right after the '.' or the 'e' of a float, where what was read still decodes
+        content = b'{"total": 325000.5, "result": [1.5, 2.5e3, 7e-1], "score": 1.25e2}'
+        expected = json.loads(content.decode('utf-8'))
+        for mark in (b'.', b'e'):
+            for i in [i for i in range(len(content)) if content[i:i + 1] == mark]:
+                for loads_ in (None, loads):
+                    assert read_page([content[:i + 1], content[i + 1:]], loads_) == expected
+
+    @responses.activate
+    def test_stream_results(self):
+        pages = [[hunt_result(i) for i in range(0, 3)], [hunt_result(i) for i in range(3, 5)]]
+        # the page fields come after the result list, so they are only known once it is consumed
+        bodies = ['{{"result": {}, "has_more": {}, "offset": {}, "limit": 3, "status": "OK"}}'.format(
+            json.dumps(page), json.dumps(i == 0), 3 * (i + 1)) for i, page in enumerate(pages)]
+        for body in bodies:
+            responses.add(responses.GET, HUNT_RESULTS_URL, body=body)
+        results = self.api(stream_results=True).historical_results(hunt=1, workers=4)
+        assert [int(result) for result in results] == list(range(5))
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_stream_results_invalid(self):
+        responses.add(responses.GET, HUNT_RESULTS_URL, body='{"result": [' + json.dumps(hunt_result(0)) + ', <html>')
+        results = self.api(stream_results=True).historical_results(hunt=1)
+        assert int(next(results)) == 0
+        with pytest.raises(exceptions.RequestException):
+            next(results)
+
+    @responses.activate
+    def test_stream_results_memory(self):
+        body = json.dumps({'has_more': False, 'limit': 2000, 'offset': 2000, 'status': 'OK',
+                           'result': [hunt_result(i) for i in range(2000)]}).encode('utf-8')
+        responses.add(responses.GET, HUNT_RESULTS_URL, body=body)
+        api = self.api(stream_results=True, keep_json=False)
+        tracemalloc.start()
+        try:
+            count = 0
+            for _ in api.historical_results(hunt=1):
+                count += 1
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert count == 2000
+        # only one chunk and one result are held at a time instead of the body, its decoded dict and the resources
+        assert peak < len(body) // 4
@@ -0,0 +1,134 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+import threading
+from unittest import TestCase
+
+import pytest
+import responses
+from urllib3.fields import RequestField
+from urllib3.filepost import encode_multipart_formdata
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import http, multipart
+from polyswarm_api.types import resources
+
+from .client_scan_test import temp_dir
+from ..utils.http_server import StandInServer, body
+
+tracemalloc = pytest.importorskip('tracemalloc')
+
+SUBMISSION = {'result': {'account_id': '1', 'artifact_id': '38533123137674971', 'assertions': [], 'community': 'gamma', 'country': '', 'created': '2019-12-02T23:45:06.203139', 'extended_type': 'EICAR virus test files', 'failed': False, 'filename': '275a021bbfb6489e54d471899f7db9d1663fc695ec2fe2a2c4538aabf651fd0f', 'first_seen': '2019-12-02T23:44:14.864399', 'id': 16896128185928037, 'last_seen': '2019-12-02T23:45:06.203139', 'md5': '44d88612fea8a8f36de82e1278abb02f', 'metadata': [], 'mimetype': 'text/plain', 'polyscore': None, 'result': None, 'sha1': '3395856ce81f2b7382dee72602f798b642f14140', 'sha256': '275a021bbfb6489e54d471899f7db9d1663fc695ec2fe2a2c4538aabf651fd0f', 'size': 68, 'type': 'FILE', 'votes': [], 'window_closed': False}, 'status': 'OK'}
+
+
+def read_all(encoder, size):
+    content = b''
+    for block in iter(lambda: encoder.read(size), b''):
+        assert len(block) <= size
+        content += memoryview(block).tobytes()
+    return content
+
+
+class UploadTestCaseV2(TestCase):
+    def __init__(self, *args, **kwargs):
+        super(UploadTestCaseV2, self).__init__(*args, **kwargs)
+        self.test_api_key = '11111111111111111111111111111111'
+
+    def test_encoder_matches_requests(self):
+        content = body(0, 100000)
+        with temp_dir({'sample': content}) as (path, files), open(files[0], 'rb') as f:
+            with open(files[0], 'r+b') as mapped_file:
+                mapped = mmap.mmap(mapped_file.fileno(), 0)
+                sources = [f, io.BytesIO(content), content, memoryview(content), mapped,
+                           resources.LocalArtifact(io.BytesIO(content), artifact_name='sample', analyze=False)]
+                for source in sources:
+                    progress = []
+                    encoder = multipart.MultipartEncoder({'artifact-type': 'FILE'}, {'file': ('s "1".exe', source)},
+                                                         progress=lambda sent, total: progress.append((sent, total)))
+                    # built as requests does
+                    field = RequestField('file', content, filename='s "1".exe')
+                    field.make_multipart()
+                    expected, content_type = encode_multipart_formdata([('artifact-type', 'FILE'), field],
+                                                                       boundary=encoder.boundary)
+                    assert encoder.content_type == content_type
+                    assert encoder.len == len(expected)
+                    assert read_all(encoder, 8192) == expected
+                    assert progress[-1] == (len(expected), len(expected))
+                    # sent again when a request is retried
+                    encoder.seek(0)
+                    assert encoder.read() == expected
+                    encoder.seek(len(expected) - 10)
+                    assert encoder.read() == expected[-10:]
+                    encoder.close()
+                    f.seek(0)
+                mapped.close()
+
+    def test_submit_streamed(self):
+        size = 64 * 1024 * 1024
+        with StandInServer(0, post_response=json.dumps(SUBMISSION).encode('utf-8')) as server, \
+                temp_dir({}) as (path, _):
+            file_path = os.path.join(path, 'installer.exe')
+            with open(file_path, 'wb') as f:
+                for offset in range(0, size, 1024 * 1024):
+                    f.write(body(offset, offset + 1024 * 1024))
+            api = PolyswarmAPI(self.test_api_key, uri=server.url + '/v2', community='gamma')
+            progress = []
+            tracemalloc.start()
+            try:
+                result = api.submit(file_path, progress=lambda sent, total: progress.append((sent, total)))
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            assert result.id == SUBMISSION['result']['id']
+            # the file is read as it is sent instead of being encoded in memory first
+            assert peak < 4 * 1024 * 1024
+            (content_type, length, sha256), = server.posted
+            boundary = content_type.rpartition('boundary=')[2]
+            with open(file_path, 'rb') as f:
+                encoder = multipart.MultipartEncoder({'artifact-type': 'FILE'}, {'file': ('installer.exe', f)},
+                                                     boundary=boundary)
+                hasher = hashlib.sha256()
+                for block in iter(lambda: encoder.read(1024 * 1024), b''):
+                    hasher.update(block)
+            assert (length, sha256) == (encoder.len, hasher.hexdigest())
+            assert progress[-1] == (length, length)
+
+    def test_upload_not_seekable(self):
+        size = 1024 * 1024
+        with StandInServer(0) as server:
+            read_fd, write_fd = os.pipe()
+
+            def write():
+                with os.fdopen(write_fd, 'wb') as pipe:
+                    pipe.write(body(0, size))
+            writer = threading.Thread(target=write)
+            writer.start()
+            progress = []
+            with os.fdopen(read_fd, 'rb') as pipe:
+                session = http.PolyswarmHTTP(self.test_api_key, 0)
+                response = session.request('POST', server.url + '/upload', data={'artifact-type': 'FILE'},
+                                           files={'file': ('installer.exe', pipe)},
+                                           progress=lambda sent, total: progress.append((sent, total)))
+            writer.join()
+            assert response.status_code == 200
+            # the size is unknown, the body is sent chunked
+            assert response.request.headers['Transfer-Encoding'] == 'chunked'
+            (content_type, length, sha256), = server.posted
+            encoder = multipart.MultipartEncoder({'artifact-type': 'FILE'},
+                                                 {'file': ('installer.exe', io.BytesIO(body(0, size)))},
+                                                 boundary=content_type.rpartition('boundary=')[2])
+            assert (length, sha256) == (encoder.len, hashlib.sha256(encoder.read()).hexdigest())
+            assert progress[-1] == (length, None)
+
+    @responses.activate
+    def test_request_arguments(self):
+        # the positional arguments of requests.Session.request keep their meaning
+        responses.add(responses.GET, 'http://localhost:9696/v2/search/hash/sha256', json={'result': []})
+        session = http.PolyswarmHTTP(self.test_api_key, 0)
+        response = session.request('GET', 'http://localhost:9696/v2/search/hash/sha256', {'hash': 'a'}, None,
+                                   {'X-Test': '1'}, {'session': '2'})
+        assert response.request.url == 'http://localhost:9696/v2/search/hash/sha256?hash=a'
+        assert response.request.headers['X-Test'] == '1'
+        assert response.request.headers['Cookie'] == 'session=2'
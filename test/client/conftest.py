@@ -0,0 +1,4 @@
+import sys
+
+# the asyncio client and its tests use python 3.6+ syntax
+collect_ignore = ['client_async_test.py'] if sys.version_info < (3, 6) else []
@@ -0,0 +1,39 @@
+from unittest import TestCase
+
+from dateutil import parser
+
+from polyswarm_api.types import date
+
+
+class DateTestCase(TestCase):
+    def test_parse_isoformat_matches_dateutil(self):
+        dates = [
+            '2019-12-03T14:53:46.097963',
+            '2020-01-14T17:48:55.854940+00:00',
+            '2019-11-01T21:27:47.109Z',
+            '2019-11-01T21:27:47Z',
+            '2019-11-01T21:27:47',
+            '2019-11-01T21:27:47.1+05:30',
+            '2019-11-01T21:27:47.000001-03:00',
+            # not emitted by the API, handled by dateutil
+            '2019-11-01',
+            '2019-11-01T21:27',
+            '20191101T212747',
+            # out of range for datetime, dateutil reads it as midnight the day after
+            '2019-11-01T24:00:00',
+        ]
+        for date_string in dates:
+            expected = parser.isoparse(date_string)
+            parsed = date.parse_isoformat(date_string)
+            assert parsed == expected, date_string
+            assert parsed.utcoffset() == expected.utcoffset(), date_string
+            # repeated strings are served from the cache
+            assert date.parse_isoformat(date_string) is parsed
+
+    def test_parse_isoformat_empty(self):
+        assert date.parse_isoformat(None) is None
+        assert date.parse_isoformat('') is None
+
+    def test_parse_isoformat_invalid(self):
+        with self.assertRaises(ValueError):
+            date.parse_isoformat('2019-13-01T21:27:47')
@@ -0,0 +1,152 @@
+import hashlib
+import io
+import json
+import os
+
+import pytest
+
+try:
+    from unittest import TestCase, mock
+except ImportError:
+    from unittest import TestCase
+    import mock
+
+from polyswarm_api.api import PolyswarmAPI
+from polyswarm_api import exceptions
+from polyswarm_api.types import base, resources
+
+from ..client.client_scan_test import temp_dir
+
+RESOURCES = os.path.join(os.path.dirname(__file__), '..', 'resources')
+
+
+def recorded_page(name):
+    with open(os.path.join(RESOURCES, name)) as f:
+        return json.load(f)['result']
+
+
+class ResourcesTestCase(TestCase):
+    def test_lazy_artifact_instance(self):
+        [page] = recorded_page('search_hash_page.json')[:1]
+        eager = resources.ArtifactInstance(page, PolyswarmAPI('key'))
+        lazy = resources.ArtifactInstance(page, PolyswarmAPI('key', lazy=True))
+        # only cheap fields are set when parsing
+        assert lazy.sha256 == eager.sha256
+        assert lazy.polyscore == eager.polyscore
+        assert not hasattr(lazy, '_assertions') and not hasattr(lazy, '_first_seen')
+        # the rest is computed on first access and cached
+        assert lazy.first_seen == eager.first_seen
+        assert lazy.created == eager.created
+        assert lazy.permalink == eager.permalink
+        assert lazy.metadata.json == eager.metadata.json
+        assert [str(a) for a in lazy.assertions] == [str(a) for a in eager.assertions]
+        assert lazy.assertions is lazy.assertions
+        assert [str(v) for v in lazy.votes] == [str(v) for v in eager.votes]
+        assert [str(a) for a in lazy.malicious_assertions] == [str(a) for a in eager.malicious_assertions]
+
+    def test_lazy_hunt_result(self):
+        page = recorded_page('hunt_results_page.json')
+        api = PolyswarmAPI('key', lazy=True)
+        results = resources.HuntResult.parse_result_list(api, page)
+        assert [r.sha256 for r in results] == [r['sha256'] for r in page]
+        assert not any(hasattr(r, '_artifact') for r in results)
+        assert results[0].artifact.sha256 == page[0]['artifact']['sha256']
+        assert results[0].created == resources.HuntResult(page[0], PolyswarmAPI('key')).created
+
+    def test_compact_resources(self):
+        page = recorded_page('hunt_results_page.json')
+        results = resources.HuntResult.parse_result_list(PolyswarmAPI('key', keep_json=False), page)
+        result = results[0]
+        assertion = result.artifact.assertions[0]
+        for obj in (result, assertion, resources.Vote(result.artifact, {'arbiter': '0x0', 'vote': True}),
+                    resources.Engine({'address': '0xABC', 'name': 'eicar'}), resources.TagLink({'id': 1})):
+            assert not hasattr(obj, '__dict__')
+        # every field was parsed before the raw json was dropped
+        assert result.json is None and result.artifact.json is None and assertion.json is None
+        assert result.sha256 == page[0]['sha256']
+        assert result.created == resources.HuntResult(page[0]).created
+        assert assertion.author == page[0]['artifact']['assertions'][0]['author']
+        assert result.artifact.first_seen is not None
+        # metadata is backed by its json, so it is kept
+        assert result.artifact.metadata.json is not None
+
+    def test_validate_page(self):
+        page = recorded_page('hunt_results_page.json')
+        api = PolyswarmAPI('key', validate_schemas=True, lazy=True)
+        assert base._validator(resources.HuntResult.SCHEMA) is base._validator(resources.HuntResult.SCHEMA)
+        # the whole page is checked at once instead of each object on its own
+        with mock.patch.object(resources.HuntResult, '_validate') as validate:
+            results = resources.HuntResult.parse_result_list(api, page)
+        assert len(results) == len(page) and not validate.called
+        page[7]['tags'] = 1
+        with pytest.raises(exceptions.InvalidJSONResponseException) as e:
+            resources.HuntResult.parse_result_list(api, page)
+        assert e.value.args[1] is page[7]
+        with pytest.raises(exceptions.InvalidJSONResponseException):
+            resources.HuntResult(page[7], api)
+        # nested resources are covered by the schema of their parent
+        assertion = dict(page[0]['artifact']['assertions'][0], mask='yes')
+        assert resources.Assertion(None, assertion, api).mask == 'yes'
+
+    def test_validate_sample(self):
+        page = recorded_page('hunt_results_page.json')
+        api = PolyswarmAPI('key', validate_schemas=True, validate_sample=10, lazy=True)
+        with mock.patch.object(resources.HuntResult, '_validate_page') as validate_page:
+            resources.HuntResult.parse_result_list(api, page)
+        [sampled], _ = validate_page.call_args
+        assert len(sampled) == len(page) // 10
+
+    @mock.patch('polyswarm_api.const.HASH_CHUNK_SIZE', 1000)
+    @mock.patch('polyswarm_api.const.PARALLEL_HASH_MIN_SIZE', 3000)
+    def test_all_hashes(self):
+        class Stream(object):
+            """A handle that can only be read."""
+            def __init__(self, content):
+                self.content = io.BytesIO(content)
+
+            def read(self, size):
+                return self.content.read(size)
+
+        for content in [b'', b'small', os.urandom(10000)]:
+            expected = [hashlib.sha256(content).hexdigest(), hashlib.sha1(content).hexdigest(),
+                        hashlib.md5(content).hexdigest()]
+            with temp_dir({'sample': b'head' + content}) as (_, [path]), open(path, 'rb') as f:
+                for parallel in [True, False]:
+                    # hashed from the current position
+                    f.seek(4)
+                    buffer = io.BytesIO(b'head' + content)
+                    buffer.seek(4)
+                    for handle in [f, buffer, Stream(content)]:
+                        assert resources.all_hashes(handle, parallel=parallel) == expected
+                        # the handle is left at the end, as if it was read
+                        if hasattr(handle, 'tell'):
+                            assert handle.tell() == len(content) + 4
+
+    def test_remote_files_read(self):
+        content = os.urandom(10000)
+        expected = [hashlib.sha256(content).hexdigest(), hashlib.sha1(content).hexdigest(),
+                    hashlib.md5(content).hexdigest()]
+        with temp_dir({'sample': content}) as (_, [path]), open(path, 'rb') as f:
+            if os.name != 'nt':
+                view, mapped = resources._content_view(f)
+                assert mapped is not None
+                view.release()
+                mapped.close()
+                # a file on a network filesystem may be truncated by another host while mapped
+                for filesystem in ('nfs4', 'fuse.sshfs', None):
+                    with mock.patch('polyswarm_api.types.resources._filesystem', return_value=filesystem):
+                        f.seek(0)
+                        assert resources._content_view(f) == (None, None)
+                        f.seek(0)
+                        assert resources.all_hashes(f) == expected
+
+    def test_hash_files(self):
+        contents = dict(('file{}'.format(i), os.urandom(100 * i)) for i in range(10))
+        with temp_dir(contents) as (path, files):
+            results = dict(resources.hash_files(files + ['/does/not/exist'], workers=3))
+        assert len(results) == 11
+        assert isinstance(results.pop('/does/not/exist'), IOError)
+        for file_path, hashes in results.items():
+            content = contents[os.path.basename(file_path)]
+            assert [h.hash for h in hashes] == [hashlib.sha256(content).hexdigest(),
+                                                hashlib.sha1(content).hexdigest(), hashlib.md5(content).hexdigest()]
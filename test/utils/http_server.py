@@ -0,0 +1,157 @@
+import hashlib
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+# every byte of the served bodies is its offset modulo 256, so any slice can be generated and checked
+BLOCK = bytearray(range(256)) * 256
+
+
+def body(start, end):
+    """The bytes served between offsets start and end (exclusive)."""
+    data = bytearray()
+    while start < end:
+        offset = start % len(BLOCK)
+        chunk = BLOCK[offset:offset + end - start]
+        data += chunk
+        start += len(chunk)
+    return bytes(data)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        size = self.server.size
+        start, end = 0, size
+        range_header = self.headers.get('Range')
+        self.server.requested.append(range_header)
+        if range_header and self.server.ranges:
+            first, last = range_header[len('bytes='):].split('-')
+            start = int(first)
+            end = min(size, int(last) + 1) if last else size
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */{}'.format(size))
+                if self.server.etag:
+                    self.send_header('ETag', '"{}"'.format(self.server.etag))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end - 1, size))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start))
+        if self.server.etag:
+            self.send_header('ETag', '"{}"'.format(self.server.etag))
+        self.end_headers()
+        sent = end if self.server.drop_after is None else min(end, start + self.server.drop_after)
+        self._write_body(start, sent)
+        if sent < end:
+            # the client sees the connection drop in the middle of the body
+            self.close_connection = True
+
+    def do_POST(self):
+        # the body is hashed as it arrives, so uploads of any size can be checked without holding them
+        hasher = hashlib.sha256()
+        length = 0
+        for data in self._read_body():
+            hasher.update(data)
+            length += len(data)
+        self.server.posted.append((self.headers.get('Content-Type'), length, hasher.hexdigest()))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.server.post_response)))
+        self.end_headers()
+        self.wfile.write(self.server.post_response)
+
+    def _read_body(self):
+        # bodies of unknown length are sent with chunked transfer encoding
+        if self.headers.get('Content-Length') is not None:
+            sizes = [int(self.headers.get('Content-Length'))]
+        else:
+            sizes = iter(lambda: int(self.rfile.readline().split(b';')[0], 16), 0)
+        for remaining in sizes:
+            while remaining:
+                data = self.rfile.read(min(remaining, len(BLOCK)))
+                yield data
+                remaining -= len(data)
+            if self.headers.get('Content-Length') is None:
+                self.rfile.readline()
+        if self.headers.get('Content-Length') is None:
+            # the empty line after the last chunk
+            self.rfile.readline()
+
+    def _write_body(self, start, end):
+        block = memoryview(BLOCK)
+        began, sent = time.time(), 0
+        while start < end:
+            offset = start % len(BLOCK)
+            count = min(len(BLOCK) - offset, end - start)
+            self.wfile.write(block[offset:offset + count])
+            start += count
+            sent += count
+            if self.server.rate:
+                time.sleep(max(0, began + sent / float(self.server.rate) - time.time()))
+
+
+class StandInServer(object):
+    """
+    A local http server standing in for the PolySwarm API or S3, serving generated bodies of `size` bytes.
+
+    With drop_after, every response is cut after that many bytes of body. Range requests are answered with
+    partial content unless ranges is False. The Range header of every request is kept in `requested`.
+    etag is sent as the ETag header, True sends the md5 of the body like S3 does. rate caps the bytes per second
+    sent on each connection, like the throughput of a single TCP stream over a long distance.
+    POST requests are answered with post_response, and the Content-Type, length and sha256 of their bodies
+    are kept in `posted`.
+    """
+    def __init__(self, size, drop_after=None, ranges=True, etag=None, rate=None, post_response=b'{}'):
+        if etag is True:
+            hasher = hashlib.md5()
+            for offset in range(0, size, len(BLOCK)):
+                hasher.update(body(offset, min(offset + len(BLOCK), size)))
+            etag = hasher.hexdigest()
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.size = size
+        self.server.drop_after = drop_after
+        self.server.ranges = ranges
+        self.server.etag = etag
+        self.server.rate = rate
+        self.server.requested = []
+        self.server.post_response = post_response
+        self.server.posted = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    @property
+    def requested(self):
+        return self.server.requested
+
+    @property
+    def posted(self):
+        return self.server.posted
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()